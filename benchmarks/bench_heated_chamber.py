@@ -0,0 +1,204 @@
+"""Benchmarks for the heated chamber control loop and sensor path.
+
+Everything runs against the simulated chamber and a fake 1-wire directory, so no
+pigpio daemon or 1-wire bus is needed, only OctoPrint and simple-pid. Results are
+written as JSON to compare between releases::
+
+    python benchmarks/bench_heated_chamber.py --output results.json
+"""
+
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from octoprint.util import dict_merge  # noqa: E402
+
+import octoprint_heated_chamber  # noqa: E402
+from octoprint_heated_chamber.temperature import Ds18b20  # noqa: E402
+
+
+class BenchmarkSettings:
+    """The subset of OctoPrint's PluginSettings used by the plugin, backed by a plain dict"""
+
+    def __init__(self, defaults, overrides):
+        self._data = dict_merge(defaults, overrides)
+
+    def get(self, path, merged=True, **kwargs):
+        value = self._data
+        for key in path:
+            value = value[key]
+        return copy.deepcopy(value)
+
+    def get_int(self, path, **kwargs):
+        value = self.get(path)
+        return None if value is None else int(value)
+
+    def get_float(self, path, **kwargs):
+        value = self.get(path)
+        return None if value is None else float(value)
+
+    def get_boolean(self, path, **kwargs):
+        return bool(self.get(path))
+
+    def set(self, path, value, **kwargs):
+        data = self._data
+        for key in path[:-1]:
+            data = data.setdefault(key, {})
+        data[path[-1]] = value
+
+    def get_all_data(self, **kwargs):
+        return copy.deepcopy(self._data)
+
+
+def create_plugin(overrides=None):
+    plugin = octoprint_heated_chamber.HeatedChamberPlugin()
+    plugin._logger = logging.getLogger("octoprint.plugins.heated_chamber")
+    plugin._identifier = "heated_chamber"
+    plugin._plugin_version = "benchmark"
+    settings = dict(simulation=dict(enabled=1, time_scale=60.0), timing=dict(log_interval=0))
+    if overrides:
+        settings = dict_merge(settings, overrides)
+    plugin._settings = BenchmarkSettings(plugin.get_settings_defaults(), settings)
+    return plugin
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    count = len(samples)
+    return dict(
+        iterations=count,
+        mean_us=statistics.mean(samples) * 1e6,
+        p50_us=samples[count // 2] * 1e6,
+        p95_us=samples[min(int(count * 0.95), count - 1)] * 1e6,
+        max_us=samples[-1] * 1e6,
+    )
+
+
+def timed(function, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_startup(plugin, timeout=60.0):
+    start = time.perf_counter()
+    plugin.on_after_startup()
+    returned = time.perf_counter() - start
+    # hardware bring-up and self tests continue in the background
+    while not plugin._ready and time.perf_counter() - start < timeout:
+        time.sleep(0.01)
+    ready = time.perf_counter() - start
+    # give the sensors time to deliver their first samples
+    time.sleep(1.5)
+    return dict(seconds=returned, ready_seconds=ready)
+
+
+def bench_loop_tick(plugin, iterations):
+    plugin.print_in_progress = True
+    plugin.set_target_temperature(60)
+    return summarize(timed(plugin._loop, iterations))
+
+
+def bench_enrich_temperatures(plugin, iterations):
+    stop = threading.Event()
+
+    def ticks():
+        while not stop.is_set():
+            plugin._loop()
+
+    ticker = threading.Thread(target=ticks, daemon=True)
+    ticker.start()
+    try:
+        samples = timed(
+            lambda: plugin.enrich_temperatures(None, {"T0": (210.0, 210.0), "B": (60.0, 60.0)}),
+            iterations,
+        )
+    finally:
+        stop.set()
+        ticker.join()
+    return summarize(samples)
+
+
+def bench_reset(plugin, iterations):
+    return summarize(timed(plugin.reset, iterations))
+
+
+def bench_reconfigure_pid(plugin, iterations):
+    return summarize(timed(lambda: plugin.reconfigure({"pid"}), iterations))
+
+
+def bench_ds18b20(iterations, backend):
+    logger = logging.getLogger("octoprint.plugins.heated_chamber")
+    device_id = "28-000000000001"
+    with tempfile.TemporaryDirectory() as base_dir:
+        os.mkdir(os.path.join(base_dir, device_id))
+        if backend == "sysfs":
+            path, content = "w1_slave", (
+                "72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n72 01 4b 46 7f ff 0e 10 57 t=23125\n"
+            )
+        else:
+            path, content = "temperature", "      23.125"
+        with open(os.path.join(base_dir, device_id, path), "w") as f:
+            f.write(content)
+
+        sensor = Ds18b20(logger, 1.0, device_id, backend, base_dir=base_dir)
+        samples = timed(sensor.get_temperature, iterations)
+
+    result = summarize(samples)
+    result["reads_per_second"] = len(samples) / sum(samples)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    plugin = create_plugin()
+    results = dict(startup=bench_startup(plugin))
+    # drive the loop directly, without the plugin's own timer
+    plugin._timer.cancel()
+    try:
+        results["loop_tick"] = bench_loop_tick(plugin, args.iterations)
+        results["enrich_temperatures"] = bench_enrich_temperatures(plugin, args.iterations)
+        results["reset"] = bench_reset(plugin, max(args.iterations // 100, 5))
+        results["reconfigure_pid"] = bench_reconfigure_pid(plugin, args.iterations)
+        plugin._timer.cancel()
+    finally:
+        plugin.on_shutdown()
+    results["ds18b20_owfs"] = bench_ds18b20(args.iterations, "owfs")
+    results["ds18b20_sysfs"] = bench_ds18b20(args.iterations, "sysfs")
+
+    report = dict(
+        timestamp=time.time(),
+        python=platform.python_version(),
+        machine=platform.machine(),
+        iterations=args.iterations,
+        results=results,
+    )
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,42 @@
 # coding=utf-8
 from __future__ import absolute_import
 from octoprint.events import eventManager, Events
-from octoprint.util import RepeatedTimer, ResettableTimer
+from octoprint.util import RepeatedTimer, ResettableTimer, dict_merge
 import octoprint.plugin
-from simple_pid import PID
-from time import sleep
+from time import sleep, monotonic, time
+import re
 
 import flask
 from flask_login import current_user
 
-from octoprint_heated_chamber.fan import softwarePwmFan, hardwarePwmFan
-from octoprint_heated_chamber.temperature import Ds18b20, list_ds18b20_devices
-from octoprint_heated_chamber.heater import RelayHeater, RelayMode
-from octoprint_heated_chamber.servo import servoVentilation
+from octoprint_heated_chamber.acquisition import SensorAcquisition
+from octoprint_heated_chamber.autotune import RelayAutotune
+from octoprint_heated_chamber.backends import create_device
+from octoprint_heated_chamber.bus import get_bus
+from octoprint_heated_chamber.config import ChamberConfig
+from octoprint_heated_chamber.controller import Feedforward, ScheduledPID
+from octoprint_heated_chamber.discovery import OneWireDiscovery
+from octoprint_heated_chamber.fan import DummyFan
+from octoprint_heated_chamber.filters import create_filter
+from octoprint_heated_chamber.temperature import Ds18b20
+from octoprint_heated_chamber.heater import HeaterGroup, TimeProportionalHeater
+from octoprint_heated_chamber.history import TemperatureHistory
+from octoprint_heated_chamber.i2c import I2C_SENSORS, Ads1115Thermistor
+from octoprint_heated_chamber.metrics import Metrics
+from octoprint_heated_chamber.output import CoalescingOutput
+from octoprint_heated_chamber.protection import ThermalProtection
+from octoprint_heated_chamber.servo import DummyServo
+from octoprint_heated_chamber.simulation import SimulatedDs18b20, ThermalPlant
+from octoprint_heated_chamber.snapshot import ChamberSnapshot
+from octoprint_heated_chamber.timing import LoopTiming
+from octoprint_heated_chamber.zone import ChamberZone
 
 import threading
 
+# seconds before a failed bring-up is tried again, doubled up to the maximum
+BRING_UP_RETRY = 5.0
+BRING_UP_MAX_RETRY = 300.0
+
 class HeatedChamberPlugin(
     octoprint.plugin.StartupPlugin,
     octoprint.plugin.ShutdownPlugin,
@@ -24,73 +45,154 @@ class HeatedChamberPlugin(
     octoprint.plugin.SimpleApiPlugin,
     octoprint.plugin.TemplatePlugin,
     octoprint.plugin.EventHandlerPlugin,
+    octoprint.plugin.BlueprintPlugin,
 ):
     _target_temperature = 0
-    _current_temperature = None
+    _main_zone = None
+    _zones = ()
+    _acquisition = None
+    _snapshot = None
     _timer = None
-    _event_object = threading.Event()
+    _bus = None
+    _plant = None
+    _autotune = None
+    _config = None
+    _metrics = None
+    _ready = False
     print_in_progress = None
 
     ##~~ StartupPlugin mixin
 
     def on_after_startup(self):
-        self._initial = True
-        self._heaterfan = None
-        self._coolerfan = None
-        self._heater = None
+        self._ready = False
+        # zone 0 is the chamber configured by the top level settings, more come from ``zones``
+        self._main_zone = ChamberZone(self._logger, "chamber", ["chamber"])
+        self._zones = [self._main_zone]
+        self._zone_by_role = dict(chamber=self._main_zone)
+        # by zone name, a latched fault survives rebuilding the zones
+        self._protections = {}
         self._temperature_sensor = None
         self._temperature_sensor_amb = None
-        self._pid = None
-        self._output_servoVentilation = None
+        self._acquisition = SensorAcquisition(self._logger)
+        self._acquisition.add_listener(self._on_sample)
+        # by 1-wire backend, started by the first API call listing devices
+        self._discoveries = {}
+        # role -> (1-wire backend, device id) of the real sensors
+        self._sensor_devices = {}
+        try:
+            self._config = self._load_config()
+        except ValueError:
+            # the bring-up fails on the same error, a valid save brings the hardware up
+            self._config = None
+        defaults = self._config or ChamberConfig.from_settings(self.get_settings_defaults())
+        self._last_sample_timestamp = None
+        self._history = TemperatureHistory(defaults.history_size)
+        self._timing = LoopTiming(self._logger, defaults.timing_log_interval)
+        self._metrics = self._create_metrics()
+        self._current_temperature_amb = None
+        self._autotune = None
+        self._autotune_zone = 0
+        self._feedforward = None
+        self._bed = None
 
-        self._frequency = None
-        self._temperature_threshold = None
         self._target_temperature = 0
         self._timer = None
-        self._heaterPWMMode = False
-        self._event_object = threading.Event()
-        self._ventilationState = None
+        self._snapshot = None
+        self._snapshot_stale_reported = False
         self.print_in_progress = None
 
-        self.reset()
+        self._bus = None
+        self._plant = None
+        self._control_lock = threading.RLock()
+        self._restart_lock = threading.Lock()
+        self._restart_thread = None
+        self._stopping = threading.Event()
+        # sample driven mode: the acquisition hands the latest chamber sample to the control thread
+        self._sample_lock = threading.Lock()
+        self._sample_ready = threading.Event()
+        self._pending_sample = None
+        self._control_thread = None
+
+        # bring the hardware up in the background so OctoPrint's startup isn't blocked by the self tests
+        threading.Thread(target=self._bring_up, name="heated-chamber-startup", daemon=True).start()
         return octoprint.plugin.StartupPlugin.on_after_startup(self)
 
+    def _bring_up(self):
+        # retried until it succeeds, e.g. pigpiod may not be up yet at boot
+        delay = BRING_UP_RETRY
+        while not self._ready:
+            try:
+                with self._control_lock:
+                    if self._ready:
+                        # a settings save brought the hardware up meanwhile
+                        return
+                    self.reset(start_timer=False)
+                    self._self_test()
+                    self._setup_timer()
+                    self._ready = True
+                self._logger.info("Heated chamber ready")
+            except Exception as ex:
+                self._logger.error(f"Heated chamber bring-up failed, retrying in {delay:.0f}s: {ex}")
+                if self._stopping.wait(delay):
+                    return
+                delay = min(2 * delay, BRING_UP_MAX_RETRY)
+
+    def _self_test(self):
+        """Sweep the fans and vent servos of every zone, all devices in parallel"""
+        sweeps = []
+        for zone in self._zones:
+            for fan in (zone.heaterfan, zone.coolerfan):
+                if not isinstance(fan.get_device(), DummyFan):
+                    sweeps.append((fan.set_power, (100, 0), fan.idle))
+            if not isinstance(zone.servo.get_device(), DummyServo):
+                sweeps.append(
+                    (zone.servo.set_open, (zone.servo_close_opening, zone.servo_open_opening), zone.servo.idle)
+                )
+
+        def sweep(set_value, values, idle):
+            try:
+                for value in values:
+                    set_value(value)
+                    sleep(2)
+            except Exception as ex:
+                self._logger.warn(f"Self test Exception: {ex}")
+            finally:
+                idle()
+
+        threads = [
+            threading.Thread(target=sweep, args=args, name="heated-chamber-selftest", daemon=True)
+            for args in sweeps
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for zone in self._zones:
+            zone.ventilation_state = "idle"
+
     ##~~ ShutdownPlugin mixin
 
     def on_shutdown(self):
+        self._stopping.set()
+        self._sample_ready.set()
         if self._timer is not None:
             self._timer.cancel()
             self._timer = None
 
-        if self._temperature_sensor is not None:
-            self._temperature_sensor.stop()
-            self._temperature_sensor = None
-            
-        if self._temperature_sensor_amb is not None:
-            self._temperature_sensor_amb.stop()
-            self._temperature_sensor_amb = None
-
-        if self._heaterfan is not None:
-            self._heaterfan.set_power(0)
-            self._heaterfan.destroy()
-        if self._coolerfan is not None:
-            self._coolerfan.set_power(0)
-            self._coolerfan.destroy()
-
-        if self._heater is not None:
-            if not self._heaterPWMMode: ## Relay controlled Heater
-                self._heater.turn_off()
-            else:          ## PWM cotntroled Heater
-                self._heater.set_power(0)         
-                self._heater.destroy()
-
-        if self._pid is not None:
-            self._pid = None
-        
-        if self._output_servoVentilation is not None:
-            self._output_servoVentilation.idle()
-            self._output_servoVentilation.destroy()     
+        if self._acquisition is not None:
+            self._acquisition.stop()
+        for discovery in self._discoveries.values():
+            discovery.stop()
+        self._temperature_sensor = None
+        self._temperature_sensor_amb = None
 
+        # fans and heaters off, vents to idle
+        for zone in self._zones:
+            zone.destroy()
+
+        if self._bus is not None:
+            self._bus.release()
+            self._bus = None
 
         return octoprint.plugin.ShutdownPlugin.on_shutdown(self)
 
@@ -100,26 +202,103 @@ class HeatedChamberPlugin(
         return dict(
             frequency=10.0,
             temperature_threshold=2.5,
-            pid=dict(kp=5, kd=-0.05, ki=0.02, sample_time=10),
-            heaterfan=dict(pwm=dict(pin=24, frequency=25000, idle_power=15, hardware_PWM_enabled=0)),
-            temperature_sensor=dict(ds18b20=dict(frequency=1.0, device_id="28-0000057065d7")),
-            temperature_sensor_amb=dict(ds18b20=dict(frequency=1.0, device_id="28-AA8DB8471401E5")),
-            heater=dict(relay=dict(pin=25, relay_mode=0, heaterPWMMode=0)),
-            coolerfan=dict(pwm=dict(pin=19, frequency=25000, idle_power=15, hardware_PWM_enabled=1)),
+            # heating PID, schedule holds dict(max_temperature, kp, ki, kd) bands of the chamber temperature
+            pid=dict(kp=5, kd=-0.05, ki=0.02, sample_time=10, output_min=0, output_max=100, schedule=[]),
+            # cooling PID, its input is the chamber temperature above ambient
+            pid_cooling=dict(kp=5, kd=-0.05, ki=0.02, sample_time=10, output_min=-100, output_max=0, schedule=[]),
+            heaterfan=dict(
+                pwm=dict(pin=24, frequency=25000, idle_power=15, hardware_PWM_enabled=0, backend="pigpio"),
+                # a stalled heater fan switches the heater off
+                tach=dict(enabled=0, pin=23, pulses_per_revolution=2, min_rpm=300, window=3.0, backend="pigpio"),
+            ),
+            temperature_sensor=dict(
+                # ds18b20, or bme280, sht3x or ads1115 (a thermistor) on the i2c bus
+                type="ds18b20",
+                ds18b20=dict(frequency=1.0, device_id="28-0000057065d7", backend="owfs", bulk_conversion=0),
+                i2c=dict(frequency=0.5, bus=1, address=None),
+                thermistor=dict(
+                    channel=0, supply_voltage=3.3, series_resistance=10000, nominal_resistance=100000,
+                    nominal_temperature=25, beta=3950,
+                ),
+                filter=dict(type="none", window=5, alpha=0.3, process_noise=0.01, measurement_noise=0.1, max_rate=2.0),
+            ),
+            temperature_sensor_amb=dict(
+                # ds18b20, or bme280, sht3x or ads1115 (a thermistor) on the i2c bus
+                type="ds18b20",
+                ds18b20=dict(frequency=1.0, device_id="28-AA8DB8471401E5", backend="owfs", bulk_conversion=0),
+                i2c=dict(frequency=0.5, bus=1, address=None),
+                thermistor=dict(
+                    channel=0, supply_voltage=3.3, series_resistance=10000, nominal_resistance=100000,
+                    nominal_temperature=25, beta=3950,
+                ),
+                filter=dict(type="none", window=5, alpha=0.3, process_noise=0.01, measurement_noise=0.1, max_rate=2.0),
+            ),
+            heater=dict(
+                relay=dict(pin=25, relay_mode=0, heaterPWMMode=0, backend="pigpio"),
+                # a relay heater follows the PID output as on/off windows instead of the threshold
+                time_proportional=dict(enabled=0, window=10.0, min_on=1.0, min_off=1.0),
+            ),
+            coolerfan=dict(
+                pwm=dict(pin=19, frequency=25000, idle_power=15, hardware_PWM_enabled=1, backend="pigpio"),
+                tach=dict(enabled=0, pin=22, pulses_per_revolution=2, min_rpm=300, window=3.0, backend="pigpio"),
+            ),
             ServoVentilation=dict(
                 input=dict(pin=6, close_opening=2500, idle_opening=1500, open_opening=700), 
-                output=dict(pin=7, close_opening=2500, idle_opening=1500, open_opening=700)), 
+                output=dict(pin=7, close_opening=2500, idle_opening=1500, open_opening=700, backend="pigpio")),
+            # every device picks its backend: pigpio, gpiod (GPIO character device) or sysfs_pwm (kernel PWM,
+            # the pin is the channel), these are the devices the last two use
+            gpio=dict(gpiod_chip="/dev/gpiochip0", pwm_chip=0),
+            # percent of heating output per degree target above ambient, minus per degree a powered bed is above the chamber
+            feedforward=dict(enabled=0, ambient_gain=1.5, bed_gain=0.1, max_output=50.0, bed_max_age=30.0),
+            # thermal runaway checks on every sensor sample, a fault keeps the heater off until cleared
+            protection=dict(
+                enabled=1, max_temperature=90.0, watch_period=600.0, watch_increase=1.0,
+                hold_band=5.0, hold_period=300.0, frozen_period=600.0, frozen_power=50.0,
+            ),
+            autotune=dict(hysteresis=0.5, cycles=5, max_overshoot=15.0, timeout=7200.0, rule="classic"),
+            history=dict(size=86400),
+            # additional zones, see ZONE_DEFAULTS for the keys of each entry
+            zones=[],
+            control=dict(mode="timer"),
+            timing=dict(log_interval=300.0),
+            simulation=dict(
+                enabled=0, ambient_temperature=22.0, heater_power=300.0, heat_capacity=20000.0, heat_loss=5.0, time_scale=1.0
+            ),
         )
 
 
     def get_settings_version(self):
-        return 1
+        return 2
+
+    def on_settings_migrate(self, target, current):
+        if current is not None and current >= 2:
+            return
+        stored = (self._settings.get_all_data(merged=False) or {}).get("pid") or {}
+        if not stored:
+            # nothing tuned yet, the defaults apply as labelled
+            return
+        # up to version 1 the loop passed ki as Kd and kd as Ki, keep the gains it actually ran with
+        defaults = self.get_settings_defaults()["pid"]
+        ki, kd = stored.get("kd", defaults["kd"]), stored.get("ki", defaults["ki"])
+        self._settings.set(["pid", "ki"], ki)
+        self._settings.set(["pid", "kd"], kd)
+        self._logger.info(f"Settings migrated: swapped the stored pid gains to ki={ki}, kd={kd}")
 
     def on_settings_save(self, data):
+        before = self._settings.get_all_data()
+        try:
+            ChamberConfig.from_settings(dict_merge(dict_merge(self.get_settings_defaults(), before), data))
+        except ValueError as ex:
+            # keep the last valid settings, the running loop never sees the broken ones
+            self._logger.error(f"Settings rejected: {ex}")
+            return data
         octoprint.plugin.SettingsPlugin.on_settings_save(self, data)
+        after = self._settings.get_all_data()
 
         self._logger.debug(f"Settings saved: {data}")
-        self.reset()
+        changed = {key for key in set(before) | set(after) if before.get(key) != after.get(key)}
+        if changed:
+            self.reconfigure(changed)
 
         return data
 
@@ -154,7 +333,173 @@ class HeatedChamberPlugin(
 
             # deceide if you want the reset function in you settings dialog
             if "listDs18b20Devices" == action:
-                return flask.jsonify(list_ds18b20_devices())
+                discovery = self._get_discovery(request.values.get("backend", "owfs"))
+                return flask.jsonify(
+                    [device["id"] for device in discovery.get_devices("28") if device["present"]]
+                )
+
+            if "listOneWireDevices" == action:
+                discovery = self._get_discovery(request.values.get("backend", "owfs"))
+                return flask.jsonify(discovery.get_devices(request.values.get("family")))
+
+            if "getHistory" == action:
+                start = request.values.get("start", None, type=float)
+                end = request.values.get("end", None, type=float)
+                channels = request.values.get("channels")
+                if channels is not None:
+                    channels = channels.split(",")
+                return flask.jsonify(self._history.get_range(start, end, channels))
+
+            if "getSensors" == action:
+                errors = self._acquisition.get_errors()
+                rejected = self._acquisition.get_rejected()
+                latency = self._acquisition.get_read_latency()
+                sensors = {}
+                for role in ("chamber", "ambient"):
+                    sample = self._acquisition.get_sample(role)
+                    sensors[role] = dict(
+                        value=sample.value if sample is not None else None,
+                        raw=sample.raw if sample is not None else None,
+                        age=sample.age() if sample is not None else None,
+                        errors=errors.get(role, 0),
+                        rejected=rejected.get(role, 0),
+                        read_latency=latency[role].to_dict() if role in latency else None,
+                    )
+                return flask.jsonify(sensors)
+
+            if "getStatus" == action:
+                return flask.jsonify(dict(ready=self._ready))
+
+            if "getLoopTiming" == action:
+                return flask.jsonify(self._timing.get_stats())
+
+            if "getBusLatency" == action:
+                return flask.jsonify(self._bus.get_latency_stats() if self._bus is not None else {})
+
+            if "getAutotune" == action:
+                autotune = self._autotune
+                if autotune is None:
+                    return flask.jsonify(dict(state="idle"))
+                return flask.jsonify(dict(autotune.get_status(), zone=self._autotune_zone))
+
+            if "getOutputStats" == action:
+                return flask.jsonify(
+                    [output.get_stats() for zone in self._zones for output in zone.get_outputs()]
+                )
+
+            if "getZones" == action:
+                return flask.jsonify(
+                    [
+                        dict(
+                            name=zone.name,
+                            sensors=list(zone.sensor_roles),
+                            temperature=zone.current_temperature,
+                            target=zone.target_temperature,
+                            pid_output=zone.pid_output,
+                            feedforward=zone.feedforward,
+                            heater=zone.get_heater_power() if zone.heater is not None else None,
+                            heaterfan=zone.heaterfan.get_power() if zone.heaterfan is not None else None,
+                            coolerfan=zone.coolerfan.get_power() if zone.coolerfan is not None else None,
+                            heaterfan_rpm=zone.get_rpm("heaterfan"),
+                            coolerfan_rpm=zone.get_rpm("coolerfan"),
+                            heaterfan_stalled=zone.heaterfan_tach is not None and zone.heaterfan_tach.stalled,
+                            coolerfan_stalled=zone.coolerfan_tach is not None and zone.coolerfan_tach.stalled,
+                            vent=zone.ventilation_state,
+                        )
+                        for zone in self._zones
+                    ]
+                )
+
+            if "getProtection" == action:
+                return flask.jsonify(
+                    [
+                        dict(
+                            name=zone.name,
+                            enabled=zone.protection is not None,
+                            fault=zone.protection.fault if zone.protection is not None else None,
+                        )
+                        for zone in self._zones
+                    ]
+                )
+
+    def get_api_commands(self):
+        return dict(startAutotune=[], cancelAutotune=[], applyAutotune=[], clearProtection=[])
+
+    def on_api_command(self, command, data):
+        if current_user.is_anonymous():
+            return "Insufficient rights", 403
+
+        if command == "startAutotune":
+            if not self._ready:
+                return flask.make_response("Heated chamber is not ready yet", 409)
+            if self.print_in_progress:
+                return flask.make_response("Autotune is not possible while printing", 409)
+            zone = int(data.get("zone", 0))
+            if not 0 <= zone < len(self._zones):
+                return flask.make_response(f"Unknown zone {zone}", 400)
+            setpoint = float(data.get("setpoint") or self._zones[zone].target_temperature or 60.0)
+            config = self._config.autotune
+            with self._control_lock:
+                self._autotune_zone = zone
+                self._autotune = RelayAutotune(
+                    setpoint,
+                    hysteresis=float(data.get("hysteresis", config.hysteresis)),
+                    cycles=int(data.get("cycles", config.cycles)),
+                    max_overshoot=config.max_overshoot,
+                    timeout=config.timeout,
+                    rule=data.get("rule", config.rule),
+                )
+            self._logger.info(f"AUTOTUNE: started on zone {self._zones[zone].name} around {setpoint}")
+            return flask.jsonify(self._autotune.get_status())
+
+        if command == "cancelAutotune":
+            with self._control_lock:
+                if self._autotune is not None and self._autotune.is_running():
+                    self._autotune.cancel()
+                    self._zones[self._autotune_zone].heater_off()
+            return flask.jsonify(dict(state="cancelled"))
+
+        if command == "applyAutotune":
+            result = self._autotune.get_result() if self._autotune is not None else None
+            if result is None:
+                return flask.make_response("No autotune result to apply", 409)
+            gains = dict(kp=round(result["kp"], 4), ki=round(result["ki"], 4), kd=round(result["kd"], 4))
+            if self._autotune_zone == 0:
+                for key, value in gains.items():
+                    self._settings.set(["pid", key], value)
+                changed = {"pid"}
+            else:
+                zones = self._settings.get(["zones"], merged=True)
+                # the runtime zones leave out the stored ones that failed validation
+                zones[self._config.zones[self._autotune_zone - 1].index].setdefault("pid", {}).update(gains)
+                self._settings.set(["zones"], zones)
+                changed = {"zones"}
+            self._settings.save()
+            self.reconfigure(changed)
+            self._logger.info(f"AUTOTUNE: applied {gains} to zone {self._autotune_zone}")
+            return flask.jsonify(gains)
+
+        if command == "clearProtection":
+            # without a zone every fault is cleared
+            zone = data.get("zone")
+            zones = self._zones if zone is None else self._zones[int(zone) : int(zone) + 1]
+            for zone in zones:
+                if zone.protection is not None and zone.protection.fault is not None:
+                    self._logger.info(f"PROTECTION: fault of zone {zone.name} cleared: {zone.protection.fault}")
+                    zone.protection.clear()
+            return flask.jsonify([zone.name for zone in zones])
+
+    ##~~ BlueprintPlugin mixin
+
+    @octoprint.plugin.BlueprintPlugin.route("/metrics", methods=["GET"])
+    def get_metrics(self):
+        # only formats the values the control loop keeps up to date, never waits for it
+        if self._metrics is None:
+            return flask.make_response("Heated chamber is not started yet", 503)
+        return flask.Response(self._metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    def is_blueprint_csrf_protected(self):
+        return True
 
     ##~~ TemplatePlugin mixin
 
@@ -186,23 +531,30 @@ class HeatedChamberPlugin(
     def enrich_temperatures(self, comm_instance, parsed_temperatures, *args, **kwargs):
         try:
             #self._logger.debug(f"Original parsed_temperatures={parsed_temperatures}")
+            # Runs on the comm thread: only read the published snapshot, never wait for the sensor
+            bed = parsed_temperatures.get("B")
+            if bed is not None:
+                # picked up by the feedforward on the next control tick
+                self._bed = (bed[0], bed[1], monotonic())
+
+            if not self._ready:
+                # still bringing up the hardware, don't report a chamber yet
+                return parsed_temperatures
+
+            snapshot = self._snapshot
             target_temperature = 0  # 0 means off for the preheat plugin
             if self._target_temperature:
                 target_temperature = self._target_temperature
-            #else:
-            #    target_temperature = 0
-            #self._logger.debug(f"Enriched Callback self._temperature_sensor.is_running()={self._temperature_sensor.is_running()}")
-            if self._current_temperature is not None:
-                chamber_temp = self._current_temperature
-            elif self._temperature_sensor.is_running() and self._current_temperature is None:
-                self._event_set = self._event_object.wait(5)
-                if self._event_set:
-                    chamber_temp = self._current_temperature
-                else:                    
-                    return   
-            elif not self._temperature_sensor.is_running():
-                self._logger.debug(f"Enriched Callback self._temperature_sensor running? = {self._temperature_sensor.is_running()}")
-                chamber_temp=-1
+
+            if snapshot is not None and not snapshot.is_stale(self._snapshot_max_age()):
+                chamber_temp = snapshot.value
+                self._snapshot_stale_reported = False
+            else:
+                # -1 tells the UI explicitly that there is no recent chamber reading
+                if not self._snapshot_stale_reported:
+                    self._logger.warn(f"Enrich Callback: chamber temperature stale, snapshot={snapshot}")
+                    self._snapshot_stale_reported = True
+                chamber_temp = -1
                 
             parsed_temperatures["C"] = (
                 chamber_temp,
@@ -211,9 +563,9 @@ class HeatedChamberPlugin(
 
 
             #self._logger.debug(f"Enrich Callback: self._timer={self._timer}")
-            if not self._timer.is_alive():
-                self._logger.warn(f"Enrich Callback: self._timer not alive, timer-reset")
-                self.reset()
+            if not self._control_alive():
+                # resetting takes the control lock and touches the hardware, not on the comm thread
+                self._request_restart("Enrich Callback: control loop not alive")
             
             
 
@@ -252,411 +604,733 @@ class HeatedChamberPlugin(
         *args,
         **kwargs,
     ):
-        # chamber temp can be set either via M141 or M191
+        # chamber temp can be set either via M141 or M191, P selects a single zone
         if gcode and (gcode == "M141" or gcode == "M191"):
-            target_temperature = float(cmd[cmd.index("S") + 1 :])
+            target_temperature = float(re.search(r"S(-?\d+(?:\.\d*)?)", cmd).group(1))
+            zone = re.search(r"P(\d+)", cmd)
+            zone = int(zone.group(1)) if zone is not None else None
 
             # 0 means no target temp
             if target_temperature == 0 and self.print_in_progress:
                 target_temperature = 28
 
-            self._logger.info(f"Detected target_temperature={target_temperature}")
-            self.set_target_temperature(target_temperature)
+            self._logger.info(f"Detected target_temperature={target_temperature}, zone={zone}")
+            self.set_target_temperature(target_temperature, zone)
 
             return None
         
 
     ##~~ Plugin logic
 
-    def _loop(self):
+    def _loop(self, sample=None):
+        # settings changes rebuild devices under the same lock, never in the middle of a tick
+        with self._control_lock:
+            self._control_tick(sample)
+
+    def _on_sample(self, role, sample):
+        device = self._sensor_devices.get(role)
+        if device is not None and device[0] in self._discoveries:
+            self._discoveries[device[0]].note_reading(device[1], sample.raw)
+        zone = self._zone_by_role.get(role)
+        if zone is not None and zone.protect(role, sample):
+            self._logger.error(f"PROTECTION: zone {zone.name} heater latched off, {zone.protection.fault}")
+            # the control tick may be the thing that is stuck
+            self._metrics.set("protection_fault", 1, zone=zone.name)
+        # sample driven mode: every fresh chamber sample runs a control tick, on the control thread
+        # so a slow tick or a settings change holding the lock never delays the sensor reads
+        if role == "chamber" and self._config.control_mode == "sample" and self._ready:
+            with self._sample_lock:
+                self._pending_sample = sample
+                self._sample_ready.set()
+
+    def _sample_loop(self):
+        while not self._stopping.is_set() and self._config.control_mode == "sample":
+            if not self._sample_ready.wait(1.0):
+                continue
+            with self._sample_lock:
+                # samples that arrived during the previous tick are superseded by the latest one
+                sample, self._pending_sample = self._pending_sample, None
+                self._sample_ready.clear()
+            if sample is None:
+                continue
+            try:
+                self._loop(sample)
+            except Exception as ex:
+                self._logger.warn(f"_sample_loop Exception: {ex}")
+
+    def _control_alive(self):
+        if self._config.control_mode == "sample":
+            return (
+                self._acquisition.is_running()
+                and self._control_thread is not None
+                and self._control_thread.is_alive()
+            )
+        return self._timer is not None and self._timer.is_alive()
+
+    def _control_tick(self, sample=None):
+        # one snapshot for the whole tick, a settings change swaps it between ticks
+        config = self._config
+        if sample is not None:
+            # the tick is due as soon as the sample is taken, lateness is the sensor to actuator latency
+            self._timing.begin_tick(None, sample.timestamp)
+        else:
+            self._timing.begin_tick(config.frequency)
+        write_seconds = self._output_write_seconds()
+        zones = self._zones
         try:
             target_temperature = self._target_temperature
-            #self._logger.debug(f"Loop: target_temperature={target_temperature}, self._target_temperature={self._target_temperature}")+
-            self._event_object.clear()
-            self._current_temperature = None
-            self._current_temperature = self._temperature_sensor.get_temperature()
-            self._current_temperature_amb = None
-            self._current_temperature_amb = self._temperature_sensor_amb.get_temperature()
-            self._event_object.set()
+            # one batched pass: read every zone first, then run each zone's controller
+            with self._timing.phase("sensor"):
+                self._current_temperature_amb = self._acquisition.get_temperature("ambient")
+                for zone in zones:
+                    zone.read_temperature(self._acquisition, sample if zone is self._main_zone else None)
+            pid_dt = self._pid_dt(sample)
+            self._publish_snapshot(self._main_zone.current_temperature, target_temperature)
             if self.print_in_progress:
                 self._logger.debug(
-                    f"LOOP: current_temperature={self._current_temperature }, target_temperature={target_temperature}, LOOP: current Printstate={self.print_in_progress },  current Ambient Temberature={self._current_temperature_amb } "
+                    f"LOOP: current_temperature={self._main_zone.current_temperature}, target_temperature={target_temperature}, LOOP: current Printstate={self.print_in_progress },  current Ambient Temberature={self._current_temperature_amb } "
                 )
-                
-            #### Enable Control Logic for HEATING if a target temperatur is set ####
-                           
-            if target_temperature is not None: # Running Heating cooling Logic
-
-                    #### HEATERFAN Control Logic ####
-                if target_temperature > 40:              
-                    new_value = self._pid(self._current_temperature)
-                    self._coolerfan.set_power(0)    
-                    ## close Iris
-                    if self._ventilationState != "close":
-                        self._output_servoVentilation.set_open(self._output_servo_close_opening)
-                        self._ventilationState = "close"
-                    #HeaterFan: Min to Idle, above idle Fanspeed is set by PID result, 0No Heater Fan Off
-                    
-                    if 0 < new_value < self._pwm_heaterfan_idle_power:
-                        self._heaterfan.set_power(self._pwm_heaterfan_idle_power)
-                    elif new_value > self._pwm_heaterfan_idle_power:
-                        self._heaterfan.set_power(new_value)
-                    #elif not self.print_in_progress and self._current_temperature >= 50:
-                    #    self._heaterfan.set_power(self._pwm_heaterfan_idle_power) 
-                    else:
-                        self._heaterfan.set_power(0)
-
-                    #### HEATER Control Logic ####
-                                    
-                    if not self._heaterPWMMode:
-                        if not self._heater.state() and self._current_temperature  < (
-                            target_temperature - self._temperature_threshold
-                        ):
-                            self._heater.turn_on()
-                            #self._pid.set_auto_mode(False)
-                        elif self._heater.state() and self._current_temperature  >= target_temperature:
-                            self._heater.turn_off()
-                            #self._pid.set_auto_mode(True)
-                    else:
-                        ### PWM Heater Control ###
-                        self._heater.set_power(new_value)
-                                
-                        
-                #### COOLERFAN Control Logic ####
-                elif self.print_in_progress and target_temperature <= 25:
-                    new_value = self._pid(self._current_temperature - self._current_temperature_amb)
-                    #self.set_target_temperature(30)
-                    self._logger.debug(f"_loop Cooling new_value= {new_value}")
-                    
-                     
-                    if self._ventilationState !=  "open":
-                        self._output_servoVentilation.set_open(self._output_servo_open_opening)
-                        self._ventilationState = "open"
-                
-                    # Cooling PID Values are negative (-100 to 0)
-                    if new_value < 0:
-                        coolingValue = abs(new_value)
-                        if 0 < coolingValue < self._pwm_coolerfan_idle_power:
-                            self._coolerfan.set_power(self._pwm_coolerfan_idle_power)
-                        elif coolingValue > self._pwm_coolerfan_idle_power:
-                            self._coolerfan.set_power(coolingValue)
-                    else:
-                        self._coolerfan.set_power(0)                      
-
-                else:
-                    if self._heaterfan.get_power() > 0: 
-                        if self._current_temperature > 50: ### Safe Cooling Down Heater element ###
-                            self._heaterfan.set_power(self._pwm_heaterfan_idle_power)
-                        else:
-                            self._heaterfan.set_power(0) 
-                            
-                    if not self._heaterPWMMode: ## Relay controlled Heater
-                        if self._heater.state(): self._heater.turn_off()       
-                    else: 
-                        if self._heater.get_power() > 0: self._heater.set_power(0)
-                        
-                    if self._coolerfan.get_power() > 0: self._coolerfan.set_power(0)
-                    
-                    if self._ventilationState !=  "idle":
-                        self._output_servoVentilation.set_open(self._output_servo_idle_opening)
-                        self._ventilationState = "idle"                 
-                            
-                        
-                              
-            #### disable control logic  and shutting down devices        
-            else:   
-                ## Heater Handling ##
-                if not self._heaterPWMMode: ## Relay controlled Heater
-                    self._heater.turn_off()
-                else:                       ## PWM cotntroled Heater
-                    self._heater.set_power(0)
-                
-                ## cool down chamber and heater ##
-                if self._current_temperature > (self._current_temperature_amb + 30.0): ## let heaterfan running to cool down element before switch off heater fan
-                    self._heaterfan.set_power(20) 
-                    if self._ventilationState !=  "open":
-                        self._output_servoVentilation.set_open(self._output_servo_open_opening)
-                        self._ventilationState = "open"
-                    self._coolerfan.set_power(20) 
-                    
-                    
-                        
-                        
-                elif self._current_temperature <= (self._current_temperature_amb + 10.0): ## let heaterfan running to cool down element before switch off heater fan
-                    self._heaterfan.set_power(0)
-                    ## Servo Handling              
-                    if self._ventilationState !=  "idle":
-                        self._output_servoVentilation.set_open(self._output_servo_idle_opening)
-                        self._ventilationState = "idle"
-                    ## Coolerfan handling ##
-                    self._coolerfan.set_power(0) 
-                
-                else:
-                    self._heaterfan.set_power(0)
-                    
-            if self._heater.state() or self._ventilationState != "idle" or self._coolerfan.get_power() > 0 or self._heaterfan.get_power() > 0:
-                self._logger.info(f"LOOP: Heater State:{self._heater.state()}, HeaterFan Power={self._heaterfan.get_power()}, ServoVentialtion State={self._ventilationState}, Cooling Fan Power={self._coolerfan.get_power()}")
-            
-            
+
+            bed = self._bed
+            if bed is not None and monotonic() - bed[2] > config.feedforward.bed_max_age:
+                bed = None
+            failed = False
+            autotune = self._autotune
+            for index, zone in enumerate(zones):
+                try:
+                    if zone.protection is not None and zone.protection.fault is not None:
+                        # latched by the runaway protection until it is cleared
+                        zone.heater_off(force=True)
+                        zone.pid_output = None
+                        continue
+                    if zone.check_fans():
+                        # without the heater fan the element overheats, whatever the controller wants
+                        zone.heater_off(force=True)
+                        zone.pid_output = None
+                        continue
+                    if autotune is not None and autotune.is_running() and index == self._autotune_zone:
+                        zone.apply_relay(autotune.update(zone.current_temperature, monotonic()))
+                        if not autotune.is_running():
+                            zone.heater_off()
+                            self._logger.info(f"AUTOTUNE: {autotune.state} on zone {zone.name}, {autotune.message}")
+                        continue
+                    feedforward = 0.0
+                    if self._feedforward is not None:
+                        feedforward = self._feedforward.compute(
+                            zone.target_temperature,
+                            self._current_temperature_amb,
+                            zone.current_temperature,
+                            bed[:2] if bed is not None else None,
+                        )
+                    zone.tick(
+                        self._current_temperature_amb,
+                        self.print_in_progress,
+                        pid_dt if zone is self._main_zone else None,
+                        self._timing,
+                        feedforward,
+                    )
+                except Exception as ex:
+                    # a broken zone must not keep the others from being controlled
+                    zone.heater_off(force=True)
+                    self._logger.warn(f"_loop Exception in zone {zone.name}: {ex}")
+                    failed = True
+
+            self._record_history(target_temperature)
+            self._record_metrics()
+            if failed:
+                self._reset_if_dead()
+
         except Exception as ex:
-            if not self._heaterPWMMode: ## Relay controlled Heater
-                self._heater.turn_off()
-            else:                       ## PWM cotntroled Heater
-                self._heater.set_power(0)
+            for zone in zones:
+                zone.heater_off(force=True)
             self._logger.warn(f"_loop Exception: {ex}")
-            if self._timer.is_alive():
-                self._logger.debug(f"_loop Exception: self._timer is alive")
-            else:
-                self._logger.warn(f"_loop Exception: self._temperature_sensor not alive, function-reset")
-                self.reset()
-                
-                
-    def reset(self):
-        ### HeaterFan
-        if self._heaterfan is not None:
-            self._heaterfan.idle()
-            self._heaterfan.destroy()
-                       
-        pwm_heaterfan_pin = self._settings.get_int(["heaterfan", "pwm", "pin"], merged=True)
-        pwm_heaterfan_frequency = self._settings.get_int(
-            ["heaterfan", "pwm", "frequency"], merged=True
-        )  
-        self._pwm_heaterfan_idle_power = self._settings.get_float(
-            ["heaterfan", "pwm", "idle_power"], merged=True
-        )
-        self._pwm_heaterfan_hardware_PWM_enabled = self._settings.get_int(
-            ["heaterfan", "pwm", "hardware_PWM_enabled"], merged=True
-        )
-
-        if self._pwm_heaterfan_hardware_PWM_enabled:
-            self._heaterfan = hardwarePwmFan(
-                self._logger, pwm_heaterfan_pin, pwm_heaterfan_frequency, self._pwm_heaterfan_idle_power
-            )
-        else:
-            self._heaterfan = softwarePwmFan(
-                self._logger, pwm_heaterfan_pin, pwm_heaterfan_frequency, self._pwm_heaterfan_idle_power
+            self._reset_if_dead()
+        finally:
+            self._timing.add("actuator", self._output_write_seconds() - write_seconds)
+            self._timing.end_tick()
+
+    def _request_restart(self, reason):
+        with self._restart_lock:
+            if self._restart_thread is not None and self._restart_thread.is_alive():
+                return
+            self._logger.warn(f"{reason}, restarting it in the background")
+            self._restart_thread = threading.Thread(
+                target=self._restart, name="heated-chamber-restart", daemon=True
             )
-        if self._initial: 
-            self._heaterfan.set_power(100)
-            sleep(2)
-            self._heaterfan.set_power(0)
-            sleep(2)
-
-            
-        self._heaterfan.idle()
+            self._restart_thread.start()
 
+    def _restart(self):
+        try:
+            self.reset()
+        except Exception as ex:
+            self._logger.error(f"Restarting the control loop failed: {ex}")
 
-        ### CoolerFan
-        if self._coolerfan is not None:
-            self._coolerfan.idle()
-            self._coolerfan.destroy()
-            
-        pwm_coolerfan_pin = self._settings.get_int(["coolerfan", "pwm", "pin"], merged=True)
-        pwm_coolerfan_frequency = self._settings.get_int(
-            ["coolerfan", "pwm", "frequency"], merged=True
-        )
-        self._pwm_coolerfan_idle_power = self._settings.get_float(
-            ["coolerfan", "pwm", "idle_power"], merged=True
-        )
-        self._pwm_coolerFan_hardware_PWM_enabled = self._settings.get_int(
-            ["coolerfan", "pwm", "hardware_PWM_enabled"], merged=True
-        )
-        '''
-        self._pwm_coolerfan_cooling_targettemp = self._settings.get_int(
-            ["coolerfan", "pwm", "cooling_targettemp"], merged=True
-        )
-        '''
-        #self.coolerfan.set_power = 25.0
-        
-        
-        if self._pwm_coolerFan_hardware_PWM_enabled:
-            self._coolerfan = hardwarePwmFan(
-                self._logger, pwm_coolerfan_pin, pwm_coolerfan_frequency, self._pwm_coolerfan_idle_power
-            )
+    def _reset_if_dead(self):
+        if self._control_alive():
+            self._logger.debug(f"_loop Exception: control loop is alive")
         else:
-            self._coolerfan = softwarePwmFan(
-                self._logger, pwm_coolerfan_pin, pwm_coolerfan_frequency, self._pwm_coolerfan_idle_power
-            )
-        if self._initial: 
-            self._coolerfan.set_power(100)
-            sleep(2)
-            self._coolerfan.set_power(0)
-            sleep(2)
-
-                        
-        self._coolerfan.idle()
-        
-        
-        ### Servo Ventilation
-        if self._output_servoVentilation is not None:
-            self._output_servoVentilation.idle()
-            self._output_servoVentilation.destroy()
-            
-        
-        output_servo_pin = self._settings.get_int(["ServoVentilation", "output", "pin"], merged=True)
-        
-        self._output_servo_idle_opening = self._settings.get_float(
-            ["ServoVentilation", "output", "idle_opening"], merged=True
-        )
-        self._output_servo_close_opening = self._settings.get_int(
-            ["ServoVentilation", "output", "close_opening"], merged=True
-        )
-        self._output_servo_open_opening = self._settings.get_int(
-            ["ServoVentilation", "output", "open_opening"], merged=True
-        )
-        
+            self._logger.warn(f"_loop Exception: self._temperature_sensor not alive, function-reset")
+            self.reset()
 
-        
-        '''
-        output_servo_pin = 7
-        self._output_servo_idle_opening = 500
-        self._output_servo_close_opening = 2500    
-        self._output_servo_open_opening = 500
-        '''
-        self._output_servoVentilation = servoVentilation(
-            self._logger, output_servo_pin, self._output_servo_idle_opening
-        )
+    def _output_write_seconds(self):
+        return sum(output.get_write_seconds() for zone in self._zones for output in zone.get_outputs())
 
-        #self._output_servoVentilation.idle()   
-    
-        if self._initial: 
-            self._output_servoVentilation.set_open(self._output_servo_close_opening)
-            sleep(2)
-            self._output_servoVentilation.set_open(self._output_servo_open_opening)
-            sleep(2)
+    def _pid_dt(self, sample):
+        """Time between the samples of two ticks in sample driven mode, None lets the PID use its own clock"""
+        if sample is None:
+            self._last_sample_timestamp = None
+            return None
+        previous = self._last_sample_timestamp
+        self._last_sample_timestamp = sample.timestamp
+        if previous is None or sample.timestamp <= previous:
+            return None
+        return sample.timestamp - previous
 
+    def _load_config(self):
+        # settings saved before they were validated may be broken, they never reach the loop
+        data = dict_merge(self.get_settings_defaults(), self._settings.get_all_data())
+        skipped = []
+        try:
+            config = ChamberConfig.from_settings(data, skipped)
+        except ValueError as ex:
+            if self._config is None:
+                # the defaults would drive the default pins, not the ones the chamber is wired to
+                self._logger.error(f"Invalid settings, the hardware stays off until they are fixed: {ex}")
+                raise
+            config = self._config
+            self._logger.error(f"Invalid settings, keeping the previous ones: {ex}")
+        for message in skipped:
+            self._logger.warn(f"RESET: {message}, skipped")
+        return config
+
+    def reset(self, start_timer=True):
+        with self._control_lock:
+            self._config = self._load_config()
+            self._setup_simulation()
+            self._setup_heaterfan()
+            self._setup_coolerfan()
+            self._setup_servo()
+            self._setup_temperature_sensor()
+            self._setup_temperature_sensor_amb()
+            self._acquisition.start()
+            self._setup_heater()
+            self._setup_misc()
+            self._setup_feedforward()
+            self._setup_pid()
+            self._setup_zones()
+            self._setup_protection()
+            if start_timer:
+                self._setup_timer()
+                # also after a failed bring-up, the hardware is up now
+                self._ready = True
+
+    def reconfigure(self, changed):
+        """Rebuild only the subsystems whose top level settings in ``changed`` differ"""
+        self._logger.debug(f"RECONFIGURE: changed settings {sorted(changed)}")
+        if "simulation" in changed or "gpio" in changed or not self._ready:
+            # every device depends on the backend, after a failed bring-up all of it is missing
+            self.reset()
+            return
+
+        with self._control_lock:
+            self._config = self._load_config()
+            if "heaterfan" in changed:
+                self._setup_heaterfan()
+            if "coolerfan" in changed:
+                self._setup_coolerfan()
+            if "ServoVentilation" in changed:
+                self._setup_servo()
+            if "temperature_sensor" in changed:
+                self._setup_temperature_sensor()
+            if "temperature_sensor_amb" in changed:
+                self._setup_temperature_sensor_amb()
+            if "heater" in changed:
+                self._setup_heater()
+            # the loop reads the frequency from the new snapshot, threshold and timing are applied here
+            self._setup_misc()
+            if "feedforward" in changed:
+                self._setup_feedforward()
+            if "pid" in changed or "pid_cooling" in changed or "control" in changed:
+                self._setup_pid()
+            if "zones" in changed or "control" in changed:
+                self._setup_zones()
+            if "protection" in changed or "zones" in changed or "control" in changed:
+                self._setup_protection()
+            if "history" in changed:
+                self._history = TemperatureHistory(self._config.history_size)
+            self._setup_timer()
+
+    def _setup_simulation(self):
+        if self._config.simulation.enabled:
+            if self._plant is None:
+                self._plant = ThermalPlant()
+                self._logger.info("RESET: using the simulated chamber instead of the hardware")
+            self._configure_plant(self._plant)
+        else:
+            self._plant = None
 
-        
-        self._output_servoVentilation.set_open(self._output_servo_idle_opening)
-        self._ventilationState = "idle"
-        
-    
-        # Temperature sensor
-        if self._temperature_sensor is not None:
-            self._temperature_sensor.stop()
+    def _configure_plant(self, plant):
+        simulation = self._config.simulation
+        plant.ambient_temperature = simulation.ambient_temperature
+        plant.heater_power = simulation.heater_power
+        plant.heat_capacity = simulation.heat_capacity
+        plant.heat_loss = simulation.heat_loss
+        plant.time_scale = simulation.time_scale
 
-        temperature_sensor_ds18b20_frequency = self._settings.get_float(
-            ["temperature_sensor", "ds18b20", "frequency"], merged=True
-        )
-        temperature_sensor_ds18b20_device_id = self._settings.get(
-            ["temperature_sensor", "ds18b20", "device_id"], merged=True
-        )
-        self._temperature_sensor = Ds18b20(
-            self._logger,
-            temperature_sensor_ds18b20_frequency,
-            temperature_sensor_ds18b20_device_id,
-        )
-        self._temperature_sensor.start()
+    def _setup_heaterfan(self):
+        ### HeaterFan
+        zone = self._main_zone
+        if zone.heaterfan is not None:
+            zone.heaterfan.idle()
+            zone.heaterfan.destroy()
+        if zone.heaterfan_tach is not None:
+            zone.heaterfan_tach.destroy()
+
+        config = self._config.heaterfan
+        zone.heaterfan_idle_power = config.idle_power
+        zone.heaterfan = self._create_fan("heaterfan", config)
+        zone.heaterfan_tach = self._create_tachometer("heaterfan", config.tach)
+        zone.heaterfan.idle()
+
+    def _setup_coolerfan(self):
+        ### CoolerFan
+        zone = self._main_zone
+        if zone.coolerfan is not None:
+            zone.coolerfan.idle()
+            zone.coolerfan.destroy()
+        if zone.coolerfan_tach is not None:
+            zone.coolerfan_tach.destroy()
+
+        config = self._config.coolerfan
+        zone.coolerfan_idle_power = config.idle_power
+        zone.coolerfan = self._create_fan("coolerfan", config)
+        zone.coolerfan_tach = self._create_tachometer("coolerfan", config.tach)
+        zone.coolerfan.idle()
+
+    def _setup_servo(self):
+        ### Servo Ventilation
+        zone = self._main_zone
+        if zone.servo is not None:
+            zone.servo.idle()
+            zone.servo.destroy()
+
+        config = self._config.servo
+        zone.servo_idle_opening = config.idle_opening
+        zone.servo_close_opening = config.close_opening
+        zone.servo_open_opening = config.open_opening
+        zone.servo = self._create_servo("servo", config)
+        zone.ventilation_state = "idle"
+
+    def _setup_temperature_sensor(self):
+        # Temperature sensor
+        self._temperature_sensor = self._create_sensor("chamber", self._config.temperature_sensor)
 
+    def _setup_temperature_sensor_amb(self):
         # Temperature sensor _Ambient
-        if self._temperature_sensor_amb is not None:
-            self._temperature_sensor_amb.stop()
-
-        temperature_sensor_amb_ds18b20_frequency = self._settings.get_float(
-            ["temperature_sensor_amb", "ds18b20", "frequency"], merged=True
-        )
-        temperature_sensor_amb_ds18b20_device_id = self._settings.get(
-            ["temperature_sensor_amb", "ds18b20", "device_id"], merged=True
+        self._temperature_sensor_amb = self._create_sensor("ambient", self._config.temperature_sensor_amb)
+
+    def _create_sensor(self, role, config, plant=None, plant_role=None):
+        plant = plant or self._plant
+        if plant is not None:
+            sensor = SimulatedDs18b20(self._logger, plant, config.frequency, plant_role or role)
+            self._sensor_devices.pop(role, None)
+        elif config.type == "ds18b20":
+            sensor = Ds18b20(
+                self._logger, config.frequency, config.device_id, config.backend, config.bulk_conversion
+            )
+            self._sensor_devices[role] = (config.backend, config.device_id)
+        elif config.type == "ads1115":
+            thermistor = config.thermistor
+            sensor = Ads1115Thermistor(
+                self._logger,
+                config.frequency,
+                config.i2c.bus,
+                config.i2c.address,
+                channel=thermistor.channel,
+                supply_voltage=thermistor.supply_voltage,
+                series_resistance=thermistor.series_resistance,
+                nominal_resistance=thermistor.nominal_resistance,
+                nominal_temperature=thermistor.nominal_temperature,
+                beta=thermistor.beta,
+            )
+            self._sensor_devices.pop(role, None)
+        else:
+            sensor = I2C_SENSORS[config.type](self._logger, config.frequency, config.i2c.bus, config.i2c.address)
+            self._sensor_devices.pop(role, None)
+        signal_filter = config.filter
+        self._acquisition.add_sensor(
+            role,
+            sensor,
+            config.frequency,
+            create_filter(
+                signal_filter.type,
+                window=signal_filter.window,
+                alpha=signal_filter.alpha,
+                process_noise=signal_filter.process_noise,
+                measurement_noise=signal_filter.measurement_noise,
+                max_rate=signal_filter.max_rate,
+            ),
         )
-        self._temperature_sensor_amb = Ds18b20(
-            self._logger,
-            temperature_sensor_amb_ds18b20_frequency,
-            temperature_sensor_amb_ds18b20_device_id,
+        return sensor
+
+    def _setup_heater(self):
+        zone = self._main_zone
+        if zone.heater is not None:
+            zone.heater_off(force=True)
+            zone.heater.destroy()
+
+        config = self._config
+        heater = self._create_relay(config.heater, config.heater_pwm_mode)
+        heater = self._create_time_proportional(heater, config.heater_pwm_mode, config.time_proportional)
+        # a time proportional relay takes a power like a PWM heater
+        zone.heater_pwm_mode = config.heater_pwm_mode or isinstance(heater, TimeProportionalHeater)
+        zone.heater = CoalescingOutput(self._logger, heater, "heater")
+        zone.heater.turn_off()
+
+    def _create_time_proportional(self, heater, heater_pwm_mode, config):
+        if heater_pwm_mode or not config.enabled:
+            return heater
+        return TimeProportionalHeater(
+            self._logger, heater, window=config.window, min_on=config.min_on, min_off=config.min_off
         )
-        self._temperature_sensor_amb.start()
-        # Heater
 
-        if self._heater is not None:
-            self._heater.turn_off()
-            self._heater.destroy()
+    def _setup_pid(self):
+        self._configure_pid(self._main_zone, self._config.pid, self._config.pid_cooling)
+        self._logger.debug(
+            f"RESET: self._target_temperature={self._target_temperature}"
+        )
 
-        heater_pin = self._settings.get_int(["heater", "relay", "pin"], merged=True)
-        heater_relay_mode = RelayMode(
-            self._settings.get_int(["heater", "relay", "relay_mode"], merged=True)
+    def _configure_pid(self, zone, heating, cooling):
+        zone.heating_pid = self._create_pid(zone.heating_pid, heating)
+        zone.cooling_pid = self._create_pid(zone.cooling_pid, cooling)
+        zone.set_target_temperature(zone.target_temperature)
+
+    def _create_pid(self, pid, config):
+        """Create or update a controller in place from its PidConfig"""
+        sample_time = config.sample_time
+        if self._config.control_mode == "sample":
+            # every call comes with a fresh sample and its real dt
+            sample_time = None
+
+        if pid is None:
+            pid = ScheduledPID(*config.gains(), sample_time=sample_time)
+        pid.configure(
+            config.gains(),
+            (config.output_min, config.output_max),
+            [
+                dict(max_temperature=band.max_temperature, kp=band.kp, ki=band.ki, kd=band.kd)
+                for band in config.schedule
+            ],
+            sample_time,
         )
-        self._heaterPWMMode = self._settings.get_int(
-            ["heater", "relay", "heaterPWMMode"], merged=True
+        return pid
+
+    def _setup_zones(self):
+        """Rebuild the zones listed in the ``zones`` setting, the main chamber always stays zone 0"""
+        if self._autotune is not None and self._autotune_zone > 0:
+            # the zone being tuned is about to be replaced
+            self._autotune.cancel("zones changed")
+        targets = {}
+        for zone in self._zones[1:]:
+            targets[zone.name] = zone.target_temperature
+            for role in zone.sensor_roles:
+                self._acquisition.remove_sensor(role)
+            zone.destroy()
+
+        zones = [self._main_zone]
+        for config in self._config.zones:
+            zone = self._create_zone(config)
+            # M141 without P applies to all zones, so a new zone starts from the chamber target
+            zone.set_target_temperature(targets.get(zone.name, self._target_temperature))
+            zones.append(zone)
+        self._zones = zones
+        # removed zones must not linger in the metrics
+        self._metrics.clear()
+
+    def _create_zone(self, config):
+        name = config.name
+        plant = None
+        if self._plant is not None:
+            # every simulated zone is a chamber of its own
+            plant = ThermalPlant()
+            self._configure_plant(plant)
+
+        roles = []
+        for number, sensor_config in enumerate(config.sensors):
+            role = f"{name}.{number}"
+            self._create_sensor(role, sensor_config, plant, "chamber")
+            roles.append(role)
+
+        zone = ChamberZone(self._logger, name, roles)
+        zone.plant = plant
+        zone.temperature_threshold = config.temperature_threshold
+
+        heaters = [self._create_relay(heater, config.heater_pwm_mode, plant) for heater in config.heaters]
+        heater = heaters[0] if len(heaters) == 1 else HeaterGroup(self._logger, heaters)
+        heater = self._create_time_proportional(heater, config.heater_pwm_mode, config.time_proportional)
+        zone.heater_pwm_mode = config.heater_pwm_mode or isinstance(heater, TimeProportionalHeater)
+        zone.heater = CoalescingOutput(self._logger, heater, f"{name}.heater")
+        zone.heater.turn_off()
+
+        for role in ("heaterfan", "coolerfan"):
+            fan_config = getattr(config, role)
+            setattr(zone, f"{role}_idle_power", fan_config.idle_power)
+            setattr(zone, role, self._create_fan(role, fan_config, plant=plant, name=f"{name}.{role}"))
+            setattr(zone, f"{role}_tach", self._create_tachometer(role, fan_config.tach, plant))
+
+        servo_config = config.servo
+        zone.servo_idle_opening = servo_config.idle_opening
+        zone.servo_close_opening = servo_config.close_opening
+        zone.servo_open_opening = servo_config.open_opening
+        zone.servo = self._create_servo(f"{name}.servo", servo_config, plant=plant)
+        zone.ventilation_state = "idle"
+
+        self._configure_pid(zone, config.pid, config.pid_cooling)
+        self._logger.info(f"RESET: zone {name} with sensors {roles} and {len(heaters)} heater(s)")
+        return zone
+
+    def _setup_misc(self):
+        self._main_zone.temperature_threshold = self._config.temperature_threshold
+        self._timing.set_log_interval(self._config.timing_log_interval)
+
+    def _setup_feedforward(self):
+        config = self._config.feedforward
+        if not config.enabled:
+            self._feedforward = None
+            return
+        self._feedforward = Feedforward(
+            ambient_gain=config.ambient_gain, bed_gain=config.bed_gain, max_output=config.max_output
         )
-        
-        self._heater = RelayHeater(self._logger, heater_pin, heater_relay_mode, self._heaterPWMMode)
-        self._heater.turn_off()
-
-        # PID
-
-        pid_kp = self._settings.get_float(["pid", "kp"], merged=True)
-        pid_kd = self._settings.get_float(["pid", "kd"], merged=True)
-        pid_ki = self._settings.get_float(["pid", "ki"], merged=True)
-        pid_sample_time = self._settings.get_float(["pid", "sample_time"], merged=True)
-
-        if self._pid is not None:
-            self._pid.Kp = pid_kp
-            self._pid.Ki = pid_kd
-            self._pid.Kd = pid_ki
-            self._pid.sample_time = pid_sample_time
-            self._pid.output_limits = (
-                -100,
-                100,
-            )
+
+    def _setup_protection(self):
+        config = self._config.protection
+        protections = {}
+        if not config.enabled:
+            self._logger.warn("RESET: thermal runaway protection is disabled")
         else:
-            self._pid = PID(
-                pid_kp,
-                pid_kd,
-                pid_ki,
-                sample_time=pid_sample_time,
-            )
-            self._pid.output_limits = (
-                -100,
-                100,
-            )
-        self._logger.debug(
-            f"RESET: self._target_temperature={self._target_temperature}"
-        )
-        if self._target_temperature is not None:
-            self._pid.setpoint = self._target_temperature
-            
-            #    self._pid.set_auto_mode(True)
-            #else:
-            #    self._pid.set_auto_mode(True)
+            for zone in self._zones:
+                protection = self._protections.get(zone.name) or ThermalProtection()
+                protection.configure(
+                    config.max_temperature,
+                    config.watch_period,
+                    config.watch_increase,
+                    config.hold_band,
+                    config.hold_period,
+                    config.frozen_period,
+                    config.frozen_power,
+                )
+                protections[zone.name] = protection
+        for zone in self._zones:
+            zone.protection = protections.get(zone.name)
+        self._protections = protections
+        self._zone_by_role = {role: zone for zone in self._zones for role in zone.sensor_roles}
+
+    def _setup_timer(self):
+        if self._config.control_mode == "sample":
+            # ticks are driven by the chamber sensor instead
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._control_thread is None or not self._control_thread.is_alive():
+                self._control_thread = threading.Thread(
+                    target=self._sample_loop, name="heated-chamber-control", daemon=True
+                )
+                self._control_thread.start()
+            return
+
+        if self._timer is not None and self._timer.is_alive():
+            return
 
-        # Timer
-        self._frequency = self._settings.get_float(["frequency"], merged=True)
-        if self._timer:
-            self._timer.cancel()
-            self._timer = None
-            
         self._logger.debug(f"RESET: pre Timer setup self._timer={self._timer}")
-        self._timer = RepeatedTimer(self._frequency, self._loop, args=None, kwargs=None, daemon=True) #, run_first=True , on_reset=self.reset
+        # the interval is re-read before every tick, so frequency changes apply without a restart
+        self._timer = RepeatedTimer(lambda: self._config.frequency, self._loop, args=None, kwargs=None, daemon=True) #, run_first=True , on_reset=self.reset
         self._logger.debug(f"RESET: post Timer setup self._timer={self._timer}")
         self._timer.start()
-        self._logger.debug(f"RESET: pre start timer self._timer={self._timer}")
-
 
-        # Misc
-        self._temperature_threshold = self._settings.get_float(
-            ["temperature_threshold"], merged=True
+    def _record_history(self, target_temperature):
+        zone = self._main_zone
+        chamber_sample = self._acquisition.get_sample("chamber")
+        ambient_sample = self._acquisition.get_sample("ambient")
+
+        self._history.append(
+            time(),
+            chamber=zone.current_temperature,
+            ambient=self._current_temperature_amb,
+            chamber_raw=chamber_sample.raw if chamber_sample is not None else None,
+            ambient_raw=ambient_sample.raw if ambient_sample is not None else None,
+            target=target_temperature,
+            pid_output=zone.pid_output,
+            heater=zone.get_heater_power(),
+            heaterfan=zone.heaterfan.get_power(),
+            coolerfan=zone.coolerfan.get_power(),
+            vent=zone.get_vent_opening(),
+            heaterfan_rpm=zone.get_rpm("heaterfan"),
+            coolerfan_rpm=zone.get_rpm("coolerfan"),
         )
-        
-        self._initial = False
-        
-        
-        
-        
 
-    def set_target_temperature(self, target_temperature):
-        self._target_temperature = target_temperature
+    def _create_metrics(self):
+        metrics = Metrics()
+        metrics.gauge("temperature_celsius", "Zone temperature, the mean of its sensors")
+        metrics.gauge("ambient_temperature_celsius", "Ambient temperature")
+        metrics.gauge("target_temperature_celsius", "Zone target temperature")
+        metrics.gauge("pid_output_percent", "Output of the active PID including the feedforward")
+        metrics.gauge("pid_term", "Proportional, integral and derivative term of the active PID")
+        metrics.gauge("feedforward_percent", "Heating feedforward")
+        metrics.gauge("heater_power_percent", "Heater duty, 0 or 100 for a relay")
+        metrics.gauge("fan_power_percent", "Fan power")
+        metrics.gauge("fan_rpm", "Fan speed from the tachometer")
+        metrics.gauge("vent_opening", "Vent servo position")
+        metrics.gauge("protection_fault", "1 while the runaway protection keeps the heater off")
+        metrics.counter("sensor_errors_total", "Failed or timed out sensor reads")
+        metrics.counter("sensor_rejected_total", "Sensor readings rejected by the filter")
+        metrics.histogram("sensor_read_seconds", "Time a sensor read took")
+        metrics.counter("tick_overruns_total", "Control ticks that took longer than the loop period")
+        metrics.histogram("tick_seconds", "Duration of the control ticks")
+        metrics.gauge("last_tick_timestamp_seconds", "Unix time the last control tick ended")
+        return metrics
+
+    def _record_metrics(self):
+        metrics = self._metrics
+        metrics.set("ambient_temperature_celsius", self._current_temperature_amb)
+        for zone in self._zones:
+            name = zone.name
+            metrics.set("temperature_celsius", zone.current_temperature, zone=name)
+            metrics.set("target_temperature_celsius", zone.target_temperature, zone=name)
+            metrics.set("pid_output_percent", zone.pid_output, zone=name)
+            components = zone.get_pid_components()
+            for term, value in zip(("p", "i", "d"), components or (None, None, None)):
+                metrics.set("pid_term", value, zone=name, term=term)
+            metrics.set("feedforward_percent", zone.feedforward, zone=name)
+            metrics.set("heater_power_percent", zone.get_heater_power(), zone=name)
+            for fan in ("heaterfan", "coolerfan"):
+                metrics.set("fan_power_percent", getattr(zone, fan).get_power(), zone=name, fan=fan)
+                metrics.set("fan_rpm", zone.get_rpm(fan), zone=name, fan=fan)
+            metrics.set("vent_opening", zone.get_vent_opening(), zone=name)
+            fault = zone.protection is not None and zone.protection.fault is not None
+            metrics.set("protection_fault", int(fault), zone=name)
+        errors = self._acquisition.get_errors()
+        rejected = self._acquisition.get_rejected()
+        for role, histogram in self._acquisition.get_read_latency().items():
+            metrics.set("sensor_errors_total", errors.get(role, 0), sensor=role)
+            metrics.set("sensor_rejected_total", rejected.get(role, 0), sensor=role)
+            metrics.set("sensor_read_seconds", histogram, sensor=role)
+        metrics.set("tick_seconds", self._timing.get_histogram("total"))
+        metrics.set("tick_overruns_total", self._timing.get_overruns())
+        metrics.set("last_tick_timestamp_seconds", time())
+
+    def _publish_snapshot(self, temperature, target_temperature):
+        if temperature is not None:
+            self._snapshot = ChamberSnapshot(temperature, target_temperature, monotonic(), False)
+        elif self._snapshot is not None:
+            # keep the last good value, but flag it so readers don't mistake it for a fresh one
+            self._snapshot = self._snapshot._replace(stale=True)
+
+    def _snapshot_max_age(self):
+        # tolerate a couple of missed control ticks before reporting the value as stale
+        return 3 * self._config.frequency
+
+    def _get_discovery(self, backend):
+        backend = "sysfs" if backend == "sysfs" else "owfs"
+        discovery = self._discoveries.get(backend)
+        if discovery is None:
+            discovery = self._discoveries[backend] = OneWireDiscovery(self._logger, backend)
+            # the first caller waits for one search, later ones get the cached list
+            try:
+                discovery.refresh()
+            except OSError as ex:
+                self._logger.warn(f"Discovery: searching the {backend} 1-wire bus failed: {ex}")
+            discovery.start()
+        return discovery
+
+    def _create_device(self, backend, kind, *args, **kwargs):
+        """Create a hardware device of ``kind`` through the backend registry"""
+        if backend == "pigpio" and self._bus is None:
+            # keep the shared pigpio connection open across resets
+            self._bus = get_bus(self._logger)
+        elif backend == "gpiod":
+            kwargs["chip"] = self._config.gpio.gpiod_chip
+        elif backend == "sysfs_pwm":
+            kwargs["chip"] = self._config.gpio.pwm_chip
+        return create_device(backend, kind, self._logger, *args, **kwargs)
+
+    def _create_relay(self, config, heater_pwm_mode, plant=None):
+        plant = plant or self._plant
+        if plant is not None:
+            return create_device("simulated", "relay", self._logger, plant, heater_pwm_mode)
+        return self._create_device(config.backend, "relay", config.pin, config.relay_mode, heater_pwm_mode)
+
+    def _create_fan(self, role, config, plant=None, name=None):
+        plant = plant or self._plant
+        if config.pin is None:
+            # zones without this fan
+            fan = DummyFan(self._logger, config.idle_power)
+        elif plant is not None:
+            fan = create_device("simulated", "fan", self._logger, plant, role, config.idle_power)
+        else:
+            kind = "hardware_fan" if config.hardware_pwm else "fan"
+            fan = self._create_device(config.backend, kind, config.pin, config.frequency, config.idle_power)
+        return CoalescingOutput(self._logger, fan, name or role)
+
+    def _create_tachometer(self, role, config, plant=None):
+        # zones leave the pin empty, the main chamber has an enabled switch
+        if config.pin is None or not config.enabled:
+            return None
+        plant = plant or self._plant
+        kwargs = dict(
+            pulses_per_revolution=config.pulses_per_revolution,
+            window=config.window,
+            min_rpm=config.min_rpm,
+        )
+        if plant is not None:
+            return create_device("simulated", "tachometer", self._logger, plant, role, **kwargs)
+        return self._create_device(config.backend, "tachometer", config.pin, **kwargs)
+
+    def _create_servo(self, name, config, plant=None):
+        plant = plant or self._plant
+        if config.pin is None:
+            # zones without a vent
+            servo = DummyServo(self._logger, config.idle_opening)
+        elif plant is not None:
+            servo = create_device(
+                "simulated",
+                "servo",
+                self._logger,
+                plant,
+                config.idle_opening,
+                config.close_opening,
+                config.open_opening,
+            )
+        else:
+            servo = self._create_device(config.backend, "servo", config.pin, config.idle_opening)
+        servo = CoalescingOutput(self._logger, servo, name)
+        servo.set_open(config.idle_opening)
+        return servo
+
+    def set_target_temperature(self, target_temperature, zone=None):
+        """Set the target of one zone by index, or of the whole chamber when ``zone`` is None"""
+        if zone is None:
+            zones = list(self._zones)
+        elif 0 <= zone < len(self._zones):
+            zones = [self._zones[zone]]
+        else:
+            self._logger.warn(f"Ignoring target temperature for unknown zone {zone}")
+            return
+
+        if zone is None or zone == 0:
+            self._target_temperature = target_temperature
+            snapshot = self._snapshot
+            if snapshot is not None:
+                self._snapshot = snapshot._replace(target=target_temperature)
         self._logger.info(
-            f"Set target chamber temperature to: {self._target_temperature}"
+            f"Set target chamber temperature to: {target_temperature}, zones={[z.name for z in zones]}"
         )
 
-        if self._target_temperature is not None:
-        
-            self._pid.setpoint = self._target_temperature
-            self._logger.debug(
-                f"Set PID Setpoint: {self._target_temperature}"
-                )
-            #    self._pid.set_auto_mode(True)
-            #else:
-            #    self._pid.set_auto_mode(True)
+        # before bring-up finished the setpoint is applied by _configure_pid
+        for target_zone in zones:
+            target_zone.set_target_temperature(target_temperature)
+        self._logger.debug(
+            f"Set PID Setpoint: {target_temperature}"
+            )
 
 
 
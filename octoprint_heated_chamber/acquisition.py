@@ -0,0 +1,247 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from octoprint.util import RepeatedTimer
+
+from octoprint_heated_chamber.timing import Histogram
+
+
+class Sample(namedtuple("Sample", ["value", "timestamp", "raw"], defaults=(None,))):
+    """A single timestamped sensor reading, ``timestamp`` is taken from ``time.monotonic()``.
+
+    ``value`` is the filtered reading, ``raw`` what the sensor returned.
+    """
+
+    __slots__ = ()
+
+    def age(self, now=None) -> float:
+        if now is None:
+            now = time.monotonic()
+        return now - self.timestamp
+
+
+class SensorAcquisition:
+    """Reads all configured temperature sensors from a single scheduler thread.
+
+    Due sensors are read concurrently on a small worker pool, each sensor at its own
+    update period, sensors sharing a bus in one ``read_many()`` batch. Results are published to a shared store as immutable ``Sample``
+    objects, so the control loop can fetch the latest value without waiting.
+    """
+
+    def __init__(self, logger, max_workers=4, read_timeout=5.0):
+        self._logger = logger
+        self._max_workers = max_workers
+        self._read_timeout = read_timeout
+        self._lock = threading.Lock()
+        self._sensors = {}
+        self._next_due = {}
+        self._samples = {}
+        self._errors = {}
+        self._rejected = {}
+        self._read_latency = {}
+        self._filters = {}
+        # roles and bus conversions whose read hasn't returned yet, a hung one holds a worker
+        self._in_flight = set()
+        self._listeners = []
+        self._executor = None
+        self._timer = None
+
+    def add_sensor(self, role, sensor, update_frequency, signal_filter=None) -> None:
+        with self._lock:
+            self._sensors[role] = (sensor, max(float(update_frequency), 0.1))
+            self._filters[role] = signal_filter
+            self._next_due[role] = 0.0
+            self._samples.pop(role, None)
+            self._read_latency.setdefault(role, Histogram())
+        self._logger.debug(f"Acquisition: added sensor role={role}, update_frequency={update_frequency}")
+
+    def remove_sensor(self, role) -> None:
+        with self._lock:
+            self._sensors.pop(role, None)
+            self._filters.pop(role, None)
+            self._next_due.pop(role, None)
+            self._samples.pop(role, None)
+            self._read_latency.pop(role, None)
+
+    def add_listener(self, listener) -> None:
+        """Call ``listener(role, sample)`` on the acquisition thread for every published sample"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="heated-chamber-sensor"
+        )
+        self._timer = RepeatedTimer(self._interval, self._tick, run_first=True, daemon=True)
+        self._timer.start()
+        self._logger.debug("Acquisition started")
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._logger.debug("Acquisition stopped")
+
+    def is_running(self) -> bool:
+        return self._timer is not None and self._timer.is_alive()
+
+    def get_sample(self, role):
+        return self._samples.get(role)
+
+    def get_temperature(self, role, max_age=None):
+        """Latest value for ``role`` or None if there is none or it is older than ``max_age``.
+
+        By default a sample expires after three update periods plus the read timeout.
+        """
+        sample = self._samples.get(role)
+        if sample is None:
+            return None
+        if max_age is None:
+            entry = self._sensors.get(role)
+            if entry is not None:
+                max_age = 3 * entry[1] + self._read_timeout
+        if max_age is not None and sample.age() > max_age:
+            return None
+        return sample.value
+
+    def get_errors(self):
+        return dict(self._errors)
+
+    def get_rejected(self):
+        return dict(self._rejected)
+
+    def get_read_latency(self):
+        """Histogram of the time each sensor read took, by role"""
+        return dict(self._read_latency)
+
+    def _interval(self):
+        with self._lock:
+            periods = [period for _, period in self._sensors.values()]
+            next_due = list(self._next_due.values())
+        if not periods:
+            return 1.0
+        # wake up at the next due time, but never busy loop
+        now = time.monotonic()
+        next_due = min(next_due, default=now)
+        return max(min(min(periods), next_due - now), 0.05)
+
+    def _read(self, batch):
+        start = time.monotonic()
+        try:
+            if len(batch) == 1:
+                return [batch[0][1].get_temperature()]
+            return type(batch[0][1]).read_many([sensor for _, sensor in batch])
+        finally:
+            # a read that timed out is still observed once it returns, a batch counts for each of its roles
+            elapsed = time.monotonic() - start
+            for role, _ in batch:
+                histogram = self._read_latency.get(role)
+                if histogram is not None:
+                    histogram.observe(elapsed)
+
+    def _submit(self, executor, keys, fn, *args):
+        with self._lock:
+            self._in_flight.update(keys)
+        future = executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._finished(keys))
+        return future
+
+    def _finished(self, keys):
+        with self._lock:
+            self._in_flight.difference_update(keys)
+
+    def _tick(self):
+        now = time.monotonic()
+        with self._lock:
+            due = []
+            for role, (sensor, period) in self._sensors.items():
+                if self._next_due.get(role, 0.0) > now:
+                    continue
+                self._next_due[role] = now + period
+                if role in self._in_flight:
+                    # don't queue another read behind a hung one, it would starve the other sensors
+                    self._logger.debug(f"Acquisition: sensor {role} is still being read, skipped")
+                    continue
+                due.append((role, sensor, period))
+
+        executor = self._executor
+        if not due or executor is None:
+            return
+
+        # start one simultaneous conversion per bus instead of converting probe by probe
+        buses = {}
+        for _, sensor, _ in due:
+            bus = getattr(sensor, "conversion_bus", None)
+            if bus is not None and ("convert", id(bus)) not in self._in_flight:
+                buses[id(bus)] = bus
+        if buses:
+            conversions = [
+                self._submit(executor, [("convert", key)], bus.convert) for key, bus in buses.items()
+            ]
+            for conversion in wait(conversions, timeout=self._read_timeout).done:
+                try:
+                    conversion.result()
+                except Exception as ex:
+                    self._logger.warn(f"Acquisition: bulk conversion failed: {ex}")
+
+        # sensors of one class sharing a batch key, e.g. an I2C bus, are read by one read_many()
+        batches = {}
+        for role, sensor, _ in due:
+            key = getattr(sensor, "batch_key", None)
+            batches.setdefault(role if key is None else (type(sensor), key), []).append((role, sensor))
+        futures = {
+            self._submit(executor, [role for role, _ in batch], self._read, batch): batch
+            for batch in batches.values()
+        }
+        done, not_done = wait(futures, timeout=self._read_timeout)
+
+        published = []
+        for future in done:
+            roles = [role for role, _ in futures[future]]
+            try:
+                values = future.result()
+            except Exception as ex:
+                values = [ex] * len(roles)
+            timestamp = time.monotonic()
+            for role, value in zip(roles, values):
+                if isinstance(value, Exception):
+                    self._errors[role] = self._errors.get(role, 0) + 1
+                    self._logger.warn(f"Acquisition: reading sensor {role} failed: {value}")
+                    continue
+                if value is None:
+                    self._errors[role] = self._errors.get(role, 0) + 1
+                    continue
+
+                signal_filter = self._filters.get(role)
+                filtered = value if signal_filter is None else signal_filter.update(value, timestamp)
+                if filtered is None:
+                    self._rejected[role] = self._rejected.get(role, 0) + 1
+                    self._logger.debug(f"Acquisition: rejected reading {value} of sensor {role}")
+                    continue
+
+                with self._lock:
+                    if role in self._sensors:
+                        sample = self._samples[role] = Sample(filtered, timestamp, value)
+                        published.append((role, sample))
+
+        for future in not_done:
+            for role, _ in futures[future]:
+                self._errors[role] = self._errors.get(role, 0) + 1
+                self._logger.warn(f"Acquisition: reading sensor {role} timed out")
+
+        for role, sample in published:
+            for listener in list(self._listeners):
+                try:
+                    listener(role, sample)
+                except Exception as ex:
+                    self._logger.warn(f"Acquisition: sample listener failed: {ex}")
@@ -0,0 +1,135 @@
+from math import pi
+
+
+# Ziegler–Nichols style rules, (Kp / Ku, Ti / Pu, Td / Pu)
+TUNING_RULES = dict(
+    classic=(0.6, 0.5, 0.125),
+    some_overshoot=(0.33, 0.5, 0.33),
+    no_overshoot=(0.2, 0.5, 0.33),
+)
+
+
+class RelayAutotune:
+    """Åström–Hägglund relay experiment to find the ultimate gain and period of a zone.
+
+    The heater is switched between ``output_high`` and ``output_low`` around ``setpoint``
+    with a hysteresis band, which makes the chamber oscillate at its ultimate period ``Pu``.
+    From the measured oscillation amplitude ``a`` and the relay amplitude ``d`` the ultimate
+    gain is ``Ku = 4d / (pi * a)``, the hysteresis only keeps sensor noise from chattering the
+    relay. ``update()`` is called with every temperature and returns the output to apply until
+    the experiment is done, failed or cancelled.
+    """
+
+    def __init__(
+        self,
+        setpoint,
+        output_high=100.0,
+        output_low=0.0,
+        hysteresis=0.5,
+        cycles=5,
+        max_overshoot=15.0,
+        timeout=7200.0,
+        rule="classic",
+    ):
+        self.setpoint = setpoint
+        self.output_high = output_high
+        self.output_low = output_low
+        self.hysteresis = hysteresis
+        self.cycles = max(int(cycles), 2)
+        self.max_overshoot = max_overshoot
+        self.timeout = timeout
+        self.rule = rule if rule in TUNING_RULES else "classic"
+
+        self.state = "running"
+        self.message = None
+        self._output = output_high
+        self._start = None
+        self._switches = []  # timestamps of the high to low switches
+        self._peaks = []  # (max, min) of every full cycle
+        self._high = None
+        self._low = None
+        self._result = None
+
+    def is_running(self) -> bool:
+        return self.state == "running"
+
+    def update(self, temperature, timestamp):
+        if not self.is_running():
+            return self.output_low
+        if self._start is None:
+            self._start = timestamp
+
+        if temperature is None:
+            return self._fail("no chamber temperature")
+        if temperature > self.setpoint + self.max_overshoot:
+            return self._fail(f"temperature {temperature} exceeded the setpoint by more than {self.max_overshoot}")
+        if timestamp - self._start > self.timeout:
+            return self._fail(f"no stable oscillation after {self.timeout}s")
+
+        self._high = temperature if self._high is None else max(self._high, temperature)
+        self._low = temperature if self._low is None else min(self._low, temperature)
+
+        if self._output == self.output_high and temperature > self.setpoint + self.hysteresis:
+            self._output = self.output_low
+            self._switches.append(timestamp)
+            if len(self._switches) > 1:
+                # a full cycle ends on every high to low switch, the first one is the warm up
+                self._peaks.append((self._high, self._low))
+            self._high = self._low = temperature
+            if len(self._peaks) >= self.cycles:
+                self._finish()
+        elif self._output == self.output_low and temperature < self.setpoint - self.hysteresis:
+            self._output = self.output_high
+
+        return self._output if self.is_running() else self.output_low
+
+    def cancel(self, message="cancelled") -> None:
+        if self.is_running():
+            self.state = "cancelled"
+            self.message = message
+
+    def get_result(self):
+        return self._result
+
+    def get_status(self):
+        return dict(
+            state=self.state,
+            message=self.message,
+            setpoint=self.setpoint,
+            cycles=len(self._peaks),
+            target_cycles=self.cycles,
+            result=self._result,
+        )
+
+    def _fail(self, message):
+        self.state = "failed"
+        self.message = message
+        return self.output_low
+
+    def _finish(self):
+        # skip the first cycle, it still carries the heat up from below the setpoint
+        peaks = self._peaks[1:]
+        periods = [b - a for a, b in zip(self._switches, self._switches[1:])][1:]
+        amplitude = sum(high - low for high, low in peaks) / len(peaks) / 2
+        period = sum(periods) / len(periods)
+        if amplitude <= 0 or period <= 0:
+            self._fail("the chamber did not oscillate")
+            return
+
+        relay = (self.output_high - self.output_low) / 2
+        ku = 4 * relay / (pi * amplitude)
+        kp_ratio, ti_ratio, td_ratio = TUNING_RULES[self.rule]
+        kp = kp_ratio * ku
+        ti = ti_ratio * period
+        td = td_ratio * period
+        self._result = dict(
+            ku=ku,
+            pu=period,
+            amplitude=amplitude,
+            rule=self.rule,
+            kp=kp,
+            ki=kp / ti,
+            kd=kp * td,
+        )
+        self.state = "done"
+        self.message = f"Ku={ku:.3f}, Pu={period:.1f}s"
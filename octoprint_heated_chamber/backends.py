@@ -0,0 +1,49 @@
+from importlib import import_module
+
+
+# backend -> device kind -> "module:class", a module and its library are imported on first use.
+# The hardware constructors of a kind share their arguments:
+#   relay(logger, pin, relay_mode, heaterPWMMode), fan(logger, pin, frequency, idle_power),
+#   servo(logger, pin, idle_opening), tachometer(logger, pin, **tach)
+# plus the backend options. Simulated devices take the plant instead of a pin.
+DEVICE_BACKENDS = dict(
+    pigpio=dict(
+        relay="heater:RelayHeater",
+        fan="fan:softwarePwmFan",
+        hardware_fan="fan:hardwarePwmFan",
+        servo="servo:servoVentilation",
+        tachometer="tachometer:PigpioTachometer",
+    ),
+    gpiod=dict(
+        relay="gpiochip:GpiodRelayHeater",
+        tachometer="gpiochip:GpiodTachometer",
+    ),
+    sysfs_pwm=dict(
+        fan="pwmchip:SysfsPwmFan",
+        hardware_fan="pwmchip:SysfsPwmFan",
+        servo="pwmchip:SysfsPwmServo",
+    ),
+    simulated=dict(
+        relay="simulation:SimulatedHeater",
+        fan="simulation:SimulatedFan",
+        hardware_fan="simulation:SimulatedFan",
+        servo="simulation:SimulatedServo",
+        tachometer="tachometer:SimulatedTachometer",
+    ),
+)
+
+
+def list_backends(kind):
+    return [backend for backend, kinds in DEVICE_BACKENDS.items() if kind in kinds]
+
+
+def get_device_class(backend, kind):
+    path = DEVICE_BACKENDS.get(backend, {}).get(kind)
+    if path is None:
+        raise ValueError(f"Backend {backend} has no {kind} device, available: {', '.join(list_backends(kind))}")
+    module, name = path.split(":")
+    return getattr(import_module(f"octoprint_heated_chamber.{module}"), name)
+
+
+def create_device(backend, kind, *args, **kwargs):
+    return get_device_class(backend, kind)(*args, **kwargs)
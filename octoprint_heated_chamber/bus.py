@@ -0,0 +1,93 @@
+import threading
+import time
+
+
+class PigpioBus:
+    """A pooled, reference counted connection to the pigpio daemon shared by all actuators.
+
+    pigpio is imported on the first ``acquire()``, hosts that use other backends don't need it.
+    Devices take its constants from ``pigpio``.
+    """
+
+    pigpio = None
+
+    def __init__(self, logger):
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._pi = None
+        self._refcount = 0
+        self._latency = {}
+
+    def acquire(self):
+        with self._lock:
+            if self.pigpio is None:
+                import pigpio
+
+                self.pigpio = pigpio
+            if self._pi is None or not self._pi.connected:
+                self._pi = self.pigpio.pi()
+                if not self._pi.connected:
+                    self._logger.error("Error connectiong to pigpio")
+                else:
+                    self._logger.debug("Connected to pigpio daemon")
+            self._refcount += 1
+            return self
+
+    def release(self):
+        with self._lock:
+            if self._refcount == 0:
+                return
+            self._refcount -= 1
+            if self._refcount == 0 and self._pi is not None:
+                self._pi.stop()
+                self._pi = None
+                self._logger.debug("Disconnected from pigpio daemon")
+
+    @property
+    def connected(self) -> bool:
+        return self._pi is not None and bool(self._pi.connected)
+
+    def refcount(self) -> int:
+        return self._refcount
+
+    def call(self, method, *args):
+        """Run a pigpio call on the shared connection and record its round-trip time"""
+        start = time.monotonic()
+        try:
+            return getattr(self._pi, method)(*args)
+        finally:
+            self._record(method, time.monotonic() - start)
+
+    def _record(self, method, elapsed):
+        stats = self._latency.get(method)
+        if stats is None:
+            stats = self._latency[method] = [0, 0.0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+        stats[3] = elapsed
+
+    def get_latency_stats(self):
+        """Per pigpio call round-trip latency in milliseconds"""
+        return {
+            method: dict(
+                count=count,
+                avg_ms=total / count * 1000.0,
+                max_ms=maximum * 1000.0,
+                last_ms=last * 1000.0,
+            )
+            for method, (count, total, maximum, last) in list(self._latency.items())
+        }
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus(logger):
+    """Return the process wide pigpio bus, acquired once for the caller"""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = PigpioBus(logger)
+    return _bus.acquire()
@@ -0,0 +1,482 @@
+import math
+
+from octoprint.util import dict_merge
+
+from octoprint_heated_chamber.autotune import TUNING_RULES
+from octoprint_heated_chamber.backends import list_backends
+from octoprint_heated_chamber.heater import RelayMode
+from octoprint_heated_chamber.i2c import I2C_SENSORS
+from octoprint_heated_chamber.zone import ZONE_DEFAULTS, ZONE_HEATER_DEFAULTS, ZONE_SENSOR_DEFAULTS
+
+
+def _number(minimum=None, maximum=None, exclusive=False):
+    def convert(value):
+        if value is None or isinstance(value, bool):
+            raise ValueError(f"expected a number, got {value!r}")
+        value = float(value)
+        if math.isnan(value) or math.isinf(value):
+            raise ValueError(f"expected a finite number, got {value}")
+        if minimum is not None and (value <= minimum if exclusive else value < minimum):
+            raise ValueError(f"{value} is below {'or at ' if exclusive else ''}the minimum of {minimum}")
+        if maximum is not None and value > maximum:
+            raise ValueError(f"{value} is above the maximum of {maximum}")
+        return value
+
+    return convert
+
+
+def _integer(minimum=None, maximum=None):
+    number = _number(minimum, maximum)
+
+    def convert(value):
+        value = number(value)
+        if value != int(value):
+            raise ValueError(f"expected a whole number, got {value}")
+        return int(value)
+
+    return convert
+
+
+def _optional(convert):
+    # an empty field in the settings dialog means not connected
+    return lambda value: None if value is None or value == "" else convert(value)
+
+
+def _flag(value) -> bool:
+    # config.yaml and API clients may store true/false instead of 1/0
+    if isinstance(value, bool):
+        return value
+    return bool(_integer(0, 1)(value))
+
+
+def _text(value) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"expected a text, got {value!r}")
+    return value
+
+
+def _choice(*options):
+    def convert(value):
+        if value not in options:
+            raise ValueError(f"{value!r} is not one of {', '.join(map(str, options))}")
+        return value
+
+    return convert
+
+
+def _backend(kind):
+    def convert(value):
+        # the simulation replaces every backend on its own, it isn't chosen per device
+        return _choice(*[backend for backend in list_backends(kind) if backend != "simulated"])(value)
+
+    return convert
+
+
+class _List:
+    """A list of sections, parsed into a tuple"""
+
+    def __init__(self, section):
+        self.section = section
+
+    def parse(self, value, path):
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(f"{path}: expected a list, got {value!r}")
+        return tuple(self.section.parse(entry, f"{path}[{index}].") for index, entry in enumerate(value))
+
+
+class ConfigSection:
+    """An immutable, validated part of the configuration.
+
+    ``FIELDS`` maps each slot to its key in the settings (a tuple is a nested path) and a
+    converter, a converter may also be another section. ``parse()`` raises ValueError
+    naming the offending key.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+    @classmethod
+    def parse(cls, data, path=""):
+        if not isinstance(data, dict):
+            raise ValueError(f"{path.rstrip('.') or 'settings'}: expected a section, got {data!r}")
+        values = {}
+        for name, key, convert in cls.FIELDS:
+            keys = key if isinstance(key, tuple) else (key,)
+            label = path + ".".join(keys)
+            value = data
+            try:
+                for part in keys:
+                    value = value[part]
+            except (KeyError, TypeError):
+                raise ValueError(f"{label}: missing")
+            if isinstance(convert, _List):
+                values[name] = convert.parse(value, label)
+                continue
+            if isinstance(convert, type) and issubclass(convert, ConfigSection):
+                values[name] = convert.parse(value, label + ".")
+                continue
+            try:
+                values[name] = convert(value)
+            except (TypeError, ValueError) as ex:
+                raise ValueError(f"{label}: {ex}")
+        section = cls(**values)
+        section.check(path)
+        return section
+
+    def check(self, path) -> None:
+        """Checks across fields, raise ValueError"""
+
+
+class FilterConfig(ConfigSection):
+    __slots__ = ("type", "window", "alpha", "process_noise", "measurement_noise", "max_rate")
+    FIELDS = (
+        ("type", "type", _choice("none", "median", "ema", "kalman")),
+        ("window", "window", _integer(1)),
+        ("alpha", "alpha", _number(0, 1, exclusive=True)),
+        ("process_noise", "process_noise", _number(0)),
+        ("measurement_noise", "measurement_noise", _number(0, exclusive=True)),
+        ("max_rate", "max_rate", _number(0)),
+    )
+
+
+class I2cConfig(ConfigSection):
+    __slots__ = ("bus", "address")
+    FIELDS = (
+        ("bus", "bus", _integer(0)),
+        # empty is the chip's default address
+        ("address", "address", _optional(_integer(0x03, 0x77))),
+    )
+
+
+class ThermistorConfig(ConfigSection):
+    __slots__ = (
+        "channel", "supply_voltage", "series_resistance", "nominal_resistance", "nominal_temperature", "beta",
+    )
+    FIELDS = (
+        ("channel", "channel", _integer(0, 3)),
+        ("supply_voltage", "supply_voltage", _number(0, 5.5, exclusive=True)),
+        ("series_resistance", "series_resistance", _number(0, exclusive=True)),
+        ("nominal_resistance", "nominal_resistance", _number(0, exclusive=True)),
+        ("nominal_temperature", "nominal_temperature", _number(-273.15, exclusive=True)),
+        ("beta", "beta", _number(0, exclusive=True)),
+    )
+
+
+class SensorConfig(ConfigSection):
+    __slots__ = ("type", "frequency", "device_id", "backend", "bulk_conversion", "i2c", "thermistor", "filter")
+    FIELDS = (
+        ("type", "type", _choice("ds18b20", *I2C_SENSORS)),
+        ("frequency", "frequency", _number(0, exclusive=True)),
+        ("device_id", "device_id", _optional(_text)),
+        ("backend", "backend", _choice("owfs", "sysfs")),
+        ("bulk_conversion", "bulk_conversion", _flag),
+        ("i2c", "i2c", I2cConfig),
+        ("thermistor", "thermistor", ThermistorConfig),
+        ("filter", "filter", FilterConfig),
+    )
+
+    def check(self, path):
+        if self.type == "ds18b20" and not self.device_id:
+            raise ValueError(f"{path}device_id: missing, a ds18b20 needs its device id")
+
+
+class TachConfig(ConfigSection):
+    __slots__ = ("enabled", "pin", "pulses_per_revolution", "min_rpm", "window", "backend")
+    FIELDS = (
+        ("enabled", "enabled", _flag),
+        ("pin", "pin", _optional(_integer(0))),
+        ("pulses_per_revolution", "pulses_per_revolution", _integer(1)),
+        ("min_rpm", "min_rpm", _number(0)),
+        ("window", "window", _number(0, exclusive=True)),
+        ("backend", "backend", _backend("tachometer")),
+    )
+
+
+class FanConfig(ConfigSection):
+    __slots__ = ("pin", "frequency", "idle_power", "hardware_pwm", "backend", "tach")
+    FIELDS = (
+        ("pin", "pin", _optional(_integer(0))),
+        ("frequency", "frequency", _integer(1)),
+        ("idle_power", "idle_power", _number(0, 100)),
+        ("hardware_pwm", "hardware_PWM_enabled", _flag),
+        ("backend", "backend", _text),
+        ("tach", "tach", TachConfig),
+    )
+
+    def check(self, path):
+        kind = "hardware_fan" if self.hardware_pwm else "fan"
+        try:
+            _backend(kind)(self.backend)
+        except ValueError as ex:
+            raise ValueError(f"{path}backend: {ex}")
+
+
+class RelayConfig(ConfigSection):
+    __slots__ = ("pin", "relay_mode", "backend")
+    FIELDS = (
+        ("pin", "pin", _integer(0)),
+        ("relay_mode", "relay_mode", lambda value: RelayMode(_integer(0, 1)(value))),
+        ("backend", "backend", _backend("relay")),
+    )
+
+
+class TimeProportionalConfig(ConfigSection):
+    __slots__ = ("enabled", "window", "min_on", "min_off")
+    FIELDS = (
+        ("enabled", "enabled", _flag),
+        ("window", "window", _number(0, exclusive=True)),
+        ("min_on", "min_on", _number(0)),
+        ("min_off", "min_off", _number(0)),
+    )
+
+    def check(self, path):
+        if self.enabled and self.min_on + self.min_off >= self.window:
+            raise ValueError(f"{path}min_on and min_off must leave room in the window of {self.window}s")
+
+
+class ServoConfig(ConfigSection):
+    __slots__ = ("pin", "close_opening", "idle_opening", "open_opening", "backend")
+    FIELDS = (
+        ("pin", "pin", _optional(_integer(0))),
+        ("close_opening", "close_opening", _integer(0, 2500)),
+        ("idle_opening", "idle_opening", _number(0, 2500)),
+        ("open_opening", "open_opening", _integer(0, 2500)),
+        ("backend", "backend", _backend("servo")),
+    )
+
+
+class PidBand(ConfigSection):
+    __slots__ = ("max_temperature", "kp", "ki", "kd")
+    FIELDS = (
+        ("max_temperature", "max_temperature", _number()),
+        ("kp", "kp", _number()),
+        ("ki", "ki", _number()),
+        ("kd", "kd", _number()),
+    )
+
+
+class PidConfig(ConfigSection):
+    __slots__ = ("kp", "ki", "kd", "sample_time", "output_min", "output_max", "schedule")
+    FIELDS = (
+        ("kp", "kp", _number()),
+        ("ki", "ki", _number()),
+        ("kd", "kd", _number()),
+        ("sample_time", "sample_time", _optional(_number(0))),
+        ("output_min", "output_min", _number(-100, 100)),
+        ("output_max", "output_max", _number(-100, 100)),
+        ("schedule", "schedule", _List(PidBand)),
+    )
+
+    def check(self, path):
+        if self.output_min >= self.output_max:
+            raise ValueError(f"{path}output_min must be below output_max")
+
+    def gains(self):
+        return (self.kp, self.ki, self.kd)
+
+
+class FeedforwardConfig(ConfigSection):
+    __slots__ = ("enabled", "ambient_gain", "bed_gain", "max_output", "bed_max_age")
+    FIELDS = (
+        ("enabled", "enabled", _flag),
+        ("ambient_gain", "ambient_gain", _number(0)),
+        ("bed_gain", "bed_gain", _number(0)),
+        ("max_output", "max_output", _number(0, 100)),
+        ("bed_max_age", "bed_max_age", _number(0, exclusive=True)),
+    )
+
+
+class ProtectionConfig(ConfigSection):
+    __slots__ = (
+        "enabled", "max_temperature", "watch_period", "watch_increase",
+        "hold_band", "hold_period", "frozen_period", "frozen_power",
+    )
+    FIELDS = (
+        ("enabled", "enabled", _flag),
+        ("max_temperature", "max_temperature", _number(0, exclusive=True)),
+        ("watch_period", "watch_period", _number(0, exclusive=True)),
+        ("watch_increase", "watch_increase", _number(0)),
+        ("hold_band", "hold_band", _number(0, exclusive=True)),
+        ("hold_period", "hold_period", _number(0, exclusive=True)),
+        ("frozen_period", "frozen_period", _number(0, exclusive=True)),
+        ("frozen_power", "frozen_power", _number(0, 100)),
+    )
+
+
+class AutotuneConfig(ConfigSection):
+    __slots__ = ("hysteresis", "cycles", "max_overshoot", "timeout", "rule")
+    FIELDS = (
+        ("hysteresis", "hysteresis", _number(0)),
+        ("cycles", "cycles", _integer(2)),
+        ("max_overshoot", "max_overshoot", _number(0, exclusive=True)),
+        ("timeout", "timeout", _number(0, exclusive=True)),
+        ("rule", "rule", _choice(*TUNING_RULES)),
+    )
+
+
+class SimulationConfig(ConfigSection):
+    __slots__ = ("enabled", "ambient_temperature", "heater_power", "heat_capacity", "heat_loss", "time_scale")
+    FIELDS = (
+        ("enabled", "enabled", _flag),
+        ("ambient_temperature", "ambient_temperature", _number()),
+        ("heater_power", "heater_power", _number(0)),
+        ("heat_capacity", "heat_capacity", _number(0, exclusive=True)),
+        ("heat_loss", "heat_loss", _number(0, exclusive=True)),
+        ("time_scale", "time_scale", _number(0, exclusive=True)),
+    )
+
+
+class GpioConfig(ConfigSection):
+    __slots__ = ("gpiod_chip", "pwm_chip")
+    FIELDS = (
+        ("gpiod_chip", "gpiod_chip", _text),
+        ("pwm_chip", "pwm_chip", _integer(0)),
+    )
+
+
+class ZoneConfig(ConfigSection):
+    """One entry of the ``zones`` setting, see ``zone.ZONE_DEFAULTS``"""
+
+    __slots__ = (
+        "index", "name", "sensors", "heaters", "heater_pwm_mode", "time_proportional", "temperature_threshold",
+        "pid", "pid_cooling", "heaterfan", "coolerfan", "servo",
+    )
+    FIELDS = (
+        # position in the ``zones`` setting, zones skipped at load leave gaps
+        ("index", "index", _integer(0)),
+        ("name", "name", _text),
+        ("sensors", "sensors", _List(SensorConfig)),
+        ("heaters", "heaters", _List(RelayConfig)),
+        ("heater_pwm_mode", "heaterPWMMode", _flag),
+        ("time_proportional", "time_proportional", TimeProportionalConfig),
+        ("temperature_threshold", "temperature_threshold", _number(0)),
+        ("pid", "pid", PidConfig),
+        ("pid_cooling", "pid_cooling", PidConfig),
+        ("heaterfan", "heaterfan", FanConfig),
+        ("coolerfan", "coolerfan", FanConfig),
+        ("servo", "servo", ServoConfig),
+    )
+
+    def check(self, path):
+        if not self.sensors or not self.heaters:
+            raise ValueError(f"{path.rstrip('.')}: zone {self.name} needs at least one sensor and one heater")
+
+
+class ChamberConfig(ConfigSection):
+    """Snapshot of all plugin settings, built once per settings change.
+
+    The plugin swaps the whole object when the settings change, so a control tick that
+    took a reference always sees consistent values. ``zones`` holds the ZoneConfig of the
+    additional zones, the main chamber is configured by the top level sections.
+    """
+
+    __slots__ = (
+        "frequency", "temperature_threshold", "control_mode", "pid", "pid_cooling",
+        "heaterfan", "coolerfan", "heater", "heater_pwm_mode", "time_proportional", "servo",
+        "temperature_sensor", "temperature_sensor_amb", "feedforward", "protection", "autotune",
+        "history_size", "timing_log_interval", "simulation", "gpio", "zones",
+    )
+    FIELDS = (
+        ("frequency", "frequency", _number(0, exclusive=True)),
+        ("temperature_threshold", "temperature_threshold", _number(0)),
+        ("control_mode", ("control", "mode"), _choice("timer", "sample")),
+        ("pid", "pid", PidConfig),
+        ("pid_cooling", "pid_cooling", PidConfig),
+        ("heaterfan", "heaterfan", FanConfig),
+        ("coolerfan", "coolerfan", FanConfig),
+        ("heater", ("heater", "relay"), RelayConfig),
+        ("heater_pwm_mode", ("heater", "relay", "heaterPWMMode"), _flag),
+        ("time_proportional", ("heater", "time_proportional"), TimeProportionalConfig),
+        ("servo", ("ServoVentilation", "output"), ServoConfig),
+        ("temperature_sensor", "temperature_sensor", SensorConfig),
+        ("temperature_sensor_amb", "temperature_sensor_amb", SensorConfig),
+        ("feedforward", "feedforward", FeedforwardConfig),
+        ("protection", "protection", ProtectionConfig),
+        ("autotune", "autotune", AutotuneConfig),
+        ("history_size", ("history", "size"), _integer(1)),
+        ("timing_log_interval", ("timing", "log_interval"), _number(0)),
+        ("simulation", "simulation", SimulationConfig),
+        ("gpio", "gpio", GpioConfig),
+        ("zones", "zones", _List(ZoneConfig)),
+    )
+
+    @classmethod
+    def from_settings(cls, data, skipped=None):
+        """Validate the merged settings ``data``, zone entries are completed from the zone defaults.
+
+        An invalid zone raises ValueError, unless a ``skipped`` list is given: then the zone is
+        left out and its error appended.
+        """
+        data = dict(data)
+        # the main chamber keeps its sensors and fans in the older nested layout
+        for key in ("temperature_sensor", "temperature_sensor_amb"):
+            section = data.get(key) or {}
+            i2c = section.get("i2c") or {}
+            sensor = dict(
+                section.get("ds18b20") or {},
+                type=section.get("type"),
+                i2c=i2c,
+                thermistor=section.get("thermistor"),
+                filter=section.get("filter"),
+            )
+            # the I2C sensors have their own read period, the ds18b20 one is at least 0.75 s
+            if sensor["type"] != "ds18b20" and "frequency" in i2c:
+                sensor["frequency"] = i2c["frequency"]
+            data[key] = sensor
+        for key in ("heaterfan", "coolerfan"):
+            section = data.get(key) or {}
+            data[key] = dict(section.get("pwm") or {}, tach=section.get("tach"))
+
+        zones = []
+        for index, zone in enumerate(data.get("zones") or [], start=1):
+            zone = dict_merge(ZONE_DEFAULTS, zone)
+            zone["index"] = index - 1
+            if not zone["name"]:
+                zone["name"] = f"zone{index}"
+            zone["sensors"] = [dict_merge(ZONE_SENSOR_DEFAULTS, sensor) for sensor in zone["sensors"] or []]
+            zone["heaters"] = [dict_merge(ZONE_HEATER_DEFAULTS, heater) for heater in zone["heaters"] or []]
+            # zone fans have no enabled switch, the pin alone says whether a tachometer is there
+            for role in ("heaterfan", "coolerfan"):
+                zone[role]["tach"] = dict(zone[role]["tach"], enabled=1)
+            if skipped is not None:
+                try:
+                    ZoneConfig.parse(zone, f"zones[{index - 1}].")
+                except ValueError as ex:
+                    skipped.append(str(ex))
+                    continue
+            zones.append(zone)
+        data["zones"] = zones
+        return cls.parse(data)
+
+    def check(self, path):
+        names = ["chamber"] + [zone.name for zone in self.zones]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"zones: the names {', '.join(duplicates)} are used more than once")
+        if self.heater_pwm_mode and self.heater.backend == "gpiod":
+            raise ValueError("heater.relay.backend: gpiod can't PWM a heater")
+        for zone in self.zones:
+            if zone.heater_pwm_mode and any(heater.backend == "gpiod" for heater in zone.heaters):
+                raise ValueError(f"zones: gpiod can't PWM the heaters of zone {zone.name}")
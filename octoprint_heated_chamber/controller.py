@@ -0,0 +1,91 @@
+from simple_pid import PID
+
+
+class ScheduledPID(PID):
+    """A simple_pid PID whose gains follow the temperature band its input is in.
+
+    ``schedule`` is a list of bands, ``dict(max_temperature, kp, ki, kd)``. The first band
+    whose ``max_temperature`` is at or above the input supplies the gains, above all bands
+    the default gains apply. The integral is clamped to the output limits, which is the
+    anti-windup of simple_pid.
+    """
+
+    def __init__(self, kp, ki, kd, **kwargs):
+        super().__init__(kp, ki, kd, **kwargs)
+        self._gains = (kp, ki, kd)
+        self._schedule = []
+        self.limits = self.output_limits
+
+    def configure(self, gains, output_limits, schedule=(), sample_time=None) -> None:
+        self._gains = tuple(gains)
+        self._schedule = sorted(
+            (float(band["max_temperature"]), (float(band["kp"]), float(band["ki"]), float(band["kd"])))
+            for band in schedule
+        )
+        self.tunings = self._gains
+        self.limits = tuple(output_limits)
+        self.output_limits = output_limits
+        self.sample_time = sample_time
+
+    def offset_limits(self, offset) -> None:
+        """Keep the output plus ``offset`` within the configured limits.
+
+        With a feedforward added to the output, the PID alone has to be able to go below 0 to
+        cancel it above the target.
+        """
+        low, high = self.limits
+        self.output_limits = (
+            None if low is None else low - offset,
+            None if high is None else high - offset,
+        )
+
+    def gains_for(self, value):
+        for max_temperature, gains in self._schedule:
+            if value <= max_temperature:
+                return gains
+        return self._gains
+
+    def transfer(self, value, last_output) -> None:
+        """Take over from ``last_output`` without a bump, the next output continues from it"""
+        self.set_auto_mode(False)
+        self.tunings = self.gains_for(value)
+        # the first call after the reset has no derivative, so P and I alone make the output
+        integral = last_output - self.Kp * (self.setpoint - value)
+        low, high = self.output_limits
+        # at a limit any integral beyond it gives the same output, don't start wound up
+        if high is not None and last_output >= high:
+            integral = max(integral, min(0.0, high))
+        elif low is not None and last_output <= low:
+            integral = min(integral, max(0.0, low))
+        self.set_auto_mode(True, integral)
+
+    def __call__(self, input_, dt=None):
+        if input_ is not None:
+            self.tunings = self.gains_for(input_)
+        return super().__call__(input_, dt=dt)
+
+
+class Feedforward:
+    """Open loop share of the heating output, added to the heating PID.
+
+    ``ambient_gain`` is the output in percent per degree the target is above ambient, what
+    the heater needs to hold the chamber against the losses to the room. ``bed_gain`` is
+    taken off per degree a powered bed is above the chamber, the bed heats the chamber too.
+    The result is limited to ``0 - max_output``.
+    """
+
+    def __init__(self, ambient_gain=1.5, bed_gain=0.1, max_output=50.0):
+        self.ambient_gain = ambient_gain
+        self.bed_gain = bed_gain
+        self.max_output = max_output
+
+    def compute(self, target_temperature, ambient_temperature, chamber_temperature, bed=None):
+        """``bed`` is the ``(actual, target)`` of the last printer report, or None"""
+        if not target_temperature or ambient_temperature is None:
+            return 0.0
+        output = self.ambient_gain * max(target_temperature - ambient_temperature, 0.0)
+        if bed is not None and chamber_temperature is not None:
+            actual, target = bed
+            if actual is not None and target:
+                output -= self.bed_gain * max(actual - chamber_temperature, 0.0)
+        return min(max(output, 0.0), self.max_output)
@@ -0,0 +1,148 @@
+import glob
+import os
+import re
+import threading
+import time
+
+from octoprint.util import RepeatedTimer
+
+from octoprint_heated_chamber.temperature import OWFS_BASE_DIR, SYSFS_BASE_DIR
+
+
+# family code, ``.`` on OWFS or ``-`` in sysfs, 48 bit serial, OWFS may append the CRC
+DEVICE_ID = re.compile(r"^([0-9A-Fa-f]{2})[.-][0-9A-Fa-f]{12}(?:\.?[0-9A-Fa-f]{2})?$")
+
+FAMILIES = {
+    "10": "DS18S20",
+    "22": "DS1822",
+    "28": "DS18B20",
+    "3B": "DS1825",
+    "42": "DS28EA00",
+}
+
+
+class OneWireDiscovery:
+    """Keeps the device list of a 1-wire backend so API calls never search the bus.
+
+    Listing the OWFS root makes owfs search the bus, which is slow and gets in the way of
+    temperature conversions. The list is refreshed in the background every
+    ``refresh_interval`` seconds, or as soon as a cheap change marker moves: the kernel's
+    own slave list in sysfs, the mount's mtime on OWFS. ``poll_interval`` is how often the
+    marker is looked at.
+    """
+
+    def __init__(self, logger, backend="owfs", base_dir=None, refresh_interval=300.0, poll_interval=5.0):
+        self._logger = logger
+        self._backend = backend
+        self._base_dir = base_dir or (SYSFS_BASE_DIR if backend == "sysfs" else OWFS_BASE_DIR)
+        self._refresh_interval = refresh_interval
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._marker = None
+        self._refreshed = None
+        self._timer = None
+
+    def start(self) -> None:
+        if self._timer is not None:
+            return
+        self._timer = RepeatedTimer(self._poll_interval, self._poll, run_first=True, daemon=True)
+        self._timer.start()
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def invalidate(self) -> None:
+        """Search the bus again on the next poll"""
+        self._refreshed = None
+
+    def get_devices(self, family=None):
+        """The devices seen so far, with ``present`` False for those gone since"""
+        with self._lock:
+            devices = [dict(device) for device in self._devices.values()]
+        if family is not None:
+            devices = [device for device in devices if device["family"] == family.upper()]
+        return sorted(devices, key=lambda device: device["id"])
+
+    def note_reading(self, device_id, temperature) -> None:
+        """Record a reading the acquisition made anyway, the discovery never converts itself"""
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is not None:
+                device["temperature"] = temperature
+                device["read"] = time.time()
+
+    def _poll(self):
+        try:
+            if (
+                self._refreshed is None
+                or self._read_marker() != self._marker
+                or time.monotonic() - self._refreshed >= self._refresh_interval
+            ):
+                self.refresh()
+        except Exception as ex:
+            self._logger.warn(f"Discovery: polling the {self._backend} 1-wire bus failed: {ex}")
+
+    def _read_marker(self):
+        if self._backend == "sysfs":
+            # the kernel searches the bus on its own, its slave lists are plain reads
+            slaves = []
+            for path in sorted(glob.glob(os.path.join(self._base_dir, "w1_bus_master*", "w1_master_slaves"))):
+                with open(path, "r") as f:
+                    slaves.append(f.read())
+            return tuple(slaves)
+        try:
+            return os.stat(self._base_dir).st_mtime_ns
+        except OSError:
+            # not mounted (yet)
+            return None
+
+    def refresh(self) -> None:
+        """Search the bus and update the device list, the poll calls it when needed"""
+        # taken first, a change during the search triggers another one
+        self._marker = self._read_marker()
+        now = time.time()
+        found = {}
+        for path in os.listdir(self._base_dir) if os.path.isdir(self._base_dir) else ():
+            match = DEVICE_ID.match(path)
+            if match is not None:
+                found[path] = match.group(1).upper()
+
+        # on OWFS the last conversion can be read back without starting one
+        latest = {}
+        if self._backend != "sysfs":
+            for device_id, family in found.items():
+                if family in FAMILIES:
+                    latest[device_id] = self._read_latest(device_id)
+
+        with self._lock:
+            for device_id, family in found.items():
+                device = self._devices.get(device_id)
+                if device is None:
+                    device = self._devices[device_id] = dict(
+                        id=device_id,
+                        family=family,
+                        type=FAMILIES.get(family),
+                        temperature=None,
+                        read=None,
+                    )
+                    self._logger.info(f"Discovery: found 1-wire device {device_id}")
+                device["present"] = True
+                device["last_seen"] = now
+                if latest.get(device_id) is not None:
+                    device["temperature"] = latest[device_id]
+                    device["read"] = now
+            for device_id, device in self._devices.items():
+                if device_id not in found and device["present"]:
+                    device["present"] = False
+                    self._logger.info(f"Discovery: 1-wire device {device_id} is gone")
+        self._refreshed = time.monotonic()
+
+    def _read_latest(self, device_id):
+        try:
+            with open(os.path.join(self._base_dir, device_id, "latesttemp"), "r") as f:
+                return float(f.read())
+        except (OSError, ValueError):
+            return None
@@ -1,4 +1,4 @@
-import pigpio
+from octoprint_heated_chamber.bus import get_bus
 
 
 class Fan:
@@ -8,16 +8,27 @@ class Fan:
     def get_power(self) -> float:
         pass
 
+    def get_resolution(self) -> float:
+        # smallest power step the PWM can represent
+        return 1.0
+
     def destroy(self) -> None:
         pass
 
 
 class DummyFan(Fan):
-    def __init__(self, logger):
+    def __init__(self, logger, idle_power=0):
         self._logger = logger
         self._power = 0
+        self._idle_power = idle_power
         pass
 
+    def get_idle_power(self) -> int:
+        return self._idle_power
+
+    def idle(self):
+        self.set_power(self._idle_power)
+
     def set_power(self, power) -> None:
         self._power = power
         self._logger.debug(f"Set power to {self._power}")
@@ -35,20 +46,18 @@ class softwarePwmFan(Fan):
         self._logger = logger
         self._frequency = pwm_frequency
         self._pin = pwm_pin
-        self._piSpwm = pigpio.pi()
+        self._bus = get_bus(logger)
         self._idle_power = idle_power
         #self._heaterPWMMode = heaterPWMMode
 
-        if not self._piSpwm.connected:
-            self._logger.error("Error connectiong to pigpio")
-        self._piSpwm.set_mode(self._pin, pigpio.OUTPUT) 
-        self._piSpwm.set_PWM_frequency(self._pin,  self._frequency)
-        self._piSpwm.set_PWM_range(self._pin, 100)
+        self._bus.call("set_mode", self._pin, self._bus.pigpio.OUTPUT)
+        self._bus.call("set_PWM_frequency", self._pin, self._frequency)
+        self._bus.call("set_PWM_range", self._pin, 100)
 
         self.set_power(self._idle_power)
 
     def destroy(self):
-        self._piSpwm.stop()
+        self._bus.release()
 
     def get_max_power(self) -> int:
         return 100
@@ -65,9 +74,7 @@ class softwarePwmFan(Fan):
 
         self._power = power
         self._logger.debug(f"Set power to {self._power}")
-        self._piSpwm.set_PWM_dutycycle(
-            self._pin, self._power
-        )
+        self._bus.call("set_PWM_dutycycle", self._pin, self._power)
 
     def get_power(self):
         return self._power
@@ -80,16 +87,13 @@ class hardwarePwmFan(Fan):
         self._logger = logger
         self._frequency = pwm_frequency
         self._pin = pwm_pin
-        self._piHpwm = pigpio.pi()
+        self._bus = get_bus(logger)
         self._idle_power = idle_power
 
-        if not self._piHpwm.connected:
-            self._logger.error("Error connectiong to pigpio")
-
         self.set_power(self._idle_power)
 
     def destroy(self):
-        self._piHpwm.stop()
+        self._bus.release()
 
     def get_max_power(self) -> int:
         return 100
@@ -106,10 +110,13 @@ class hardwarePwmFan(Fan):
 
         self._power = power
         self._logger.debug(f"Fan power to {self._power}")
-        self._piHpwm.hardware_PWM(
-            self._pin, self._frequency, self._pwm_duty_cycle(self._power)
+        self._bus.call(
+            "hardware_PWM", self._pin, self._frequency, self._pwm_duty_cycle(self._power)
         )
 
+    def get_resolution(self) -> float:
+        return 100 / 1000000
+
     def _pwm_duty_cycle(self, power):
         return int(power / 100 * 1000000)
 
@@ -0,0 +1,135 @@
+import math
+from collections import deque
+
+
+class SignalFilter:
+    """Rejects invalid readings and smooths the rest, one instance per sensor.
+
+    ``update()`` returns the filtered value, or None when the reading was rejected. Readings
+    are rejected when they are not finite or change faster than ``max_rate`` degrees per
+    second compared with the last accepted one. After
+    ``max_rejections`` rejections in a row the reading is taken as a real step and the
+    filter restarts from it. All state is rolling, each update is O(1) for a given window.
+    """
+
+    def __init__(self, max_rate=None, max_rejections=3):
+        self._max_rate = max_rate
+        self._max_rejections = max_rejections
+        self._last_value = None
+        self._last_timestamp = None
+        self._rejections = 0
+
+    def reset(self) -> None:
+        self._last_value = None
+        self._last_timestamp = None
+        self._rejections = 0
+
+    def update(self, value, timestamp):
+        if value is None or not math.isfinite(value):
+            return None
+
+        if self._is_outlier(value, timestamp):
+            self._rejections += 1
+            if self._rejections <= self._max_rejections:
+                return None
+            # the change persisted, follow it
+            self.reset()
+
+        self._rejections = 0
+        self._last_value = value
+        self._last_timestamp = timestamp
+        return self._filter(value, timestamp)
+
+    def _is_outlier(self, value, timestamp):
+        if self._max_rate is None or self._last_value is None:
+            return False
+        elapsed = max(timestamp - self._last_timestamp, 1e-3)
+        return abs(value - self._last_value) / elapsed > self._max_rate
+
+    def _filter(self, value, timestamp):
+        return value
+
+
+class MedianFilter(SignalFilter):
+    """Median of the last ``window`` accepted readings"""
+
+    def __init__(self, window=5, **kwargs):
+        super().__init__(**kwargs)
+        self._window = deque(maxlen=max(int(window), 1))
+
+    def reset(self) -> None:
+        super().reset()
+        self._window.clear()
+
+    def _filter(self, value, timestamp):
+        self._window.append(value)
+        ordered = sorted(self._window)
+        middle = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[middle]
+        return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class EmaFilter(SignalFilter):
+    """Exponential moving average, ``alpha`` is the weight of the newest reading"""
+
+    def __init__(self, alpha=0.3, **kwargs):
+        super().__init__(**kwargs)
+        self._alpha = min(max(float(alpha), 0.0), 1.0)
+        self._value = None
+
+    def reset(self) -> None:
+        super().reset()
+        self._value = None
+
+    def _filter(self, value, timestamp):
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self._alpha * (value - self._value)
+        return self._value
+
+
+class KalmanFilter(SignalFilter):
+    """A scalar Kalman filter for a slowly drifting temperature.
+
+    ``process_noise`` is the variance the temperature drifts per second,
+    ``measurement_noise`` the variance of a single reading.
+    """
+
+    def __init__(self, process_noise=0.01, measurement_noise=0.1, **kwargs):
+        super().__init__(**kwargs)
+        self._process_noise = process_noise
+        self._measurement_noise = measurement_noise
+        self._estimate = None
+        self._variance = None
+        self._timestamp = None
+
+    def reset(self) -> None:
+        super().reset()
+        self._estimate = None
+
+    def _filter(self, value, timestamp):
+        if self._estimate is None:
+            self._estimate = value
+            self._variance = self._measurement_noise
+        else:
+            self._variance += self._process_noise * max(timestamp - self._timestamp, 0.0)
+            gain = self._variance / (self._variance + self._measurement_noise)
+            self._estimate += gain * (value - self._estimate)
+            self._variance *= 1 - gain
+        self._timestamp = timestamp
+        return self._estimate
+
+
+def create_filter(filter_type, window=5, alpha=0.3, process_noise=0.01, measurement_noise=0.1, max_rate=None):
+    """Build the filter configured in the settings, ``none`` still rejects invalid readings"""
+    if max_rate is not None and max_rate <= 0:
+        max_rate = None
+    if filter_type == "median":
+        return MedianFilter(window, max_rate=max_rate)
+    if filter_type == "ema":
+        return EmaFilter(alpha, max_rate=max_rate)
+    if filter_type == "kalman":
+        return KalmanFilter(process_noise, measurement_noise, max_rate=max_rate)
+    return SignalFilter(max_rate=max_rate)
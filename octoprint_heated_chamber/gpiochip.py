@@ -0,0 +1,86 @@
+import threading
+
+from octoprint_heated_chamber.heater import Heater, RelayMode
+from octoprint_heated_chamber.tachometer import Tachometer
+
+
+CONSUMER = "heated-chamber"
+
+
+def _request_line(chip, pin, **settings):
+    # libgpiod 2.x, imported here so only hosts using the chardev backend need it
+    import gpiod
+
+    return gpiod.request_lines(chip, consumer=CONSUMER, config={pin: gpiod.LineSettings(**settings)})
+
+
+class GpiodRelayHeater(Heater):
+    """A relay on a GPIO line of the Linux GPIO character device, without a daemon in between"""
+
+    def __init__(self, logger, pin, relay_mode, heaterPWMMode, chip="/dev/gpiochip0") -> None:
+        super().__init__(logger)
+        if heaterPWMMode:
+            raise ValueError("The gpiod backend can't PWM a heater, use the time proportional relay instead")
+        from gpiod.line import Direction, Value
+
+        self._pin = pin
+        self._active = Value.ACTIVE
+        self._inactive = Value.INACTIVE
+        self._on = False
+        # the line polarity takes care of active low relays
+        self._request = _request_line(
+            chip,
+            pin,
+            direction=Direction.OUTPUT,
+            active_low=relay_mode != RelayMode.ACTIVE_HIGH,
+            output_value=Value.INACTIVE,
+        )
+
+    def turn_on(self) -> None:
+        self._request.set_value(self._pin, self._active)
+        self._on = True
+        self._logger.debug("Heater turned on")
+
+    def turn_off(self) -> None:
+        self._request.set_value(self._pin, self._inactive)
+        self._on = False
+        self._logger.debug("Heater turned off")
+
+    def state(self) -> bool:
+        return self._on
+
+    def destroy(self) -> None:
+        self._request.release()
+
+
+class GpiodTachometer(Tachometer):
+    """Counts the falling edges of the tach line from the kernel's edge event queue"""
+
+    def __init__(self, logger, pin, chip="/dev/gpiochip0", **kwargs):
+        super().__init__(logger, **kwargs)
+        from gpiod.line import Bias, Direction, Edge
+
+        self._pin = pin
+        # tach outputs are open collector
+        self._request = _request_line(
+            chip, pin, direction=Direction.INPUT, bias=Bias.PULL_UP, edge_detection=Edge.FALLING
+        )
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heated-chamber-tach-{pin}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self._request.wait_edge_events(0.5):
+                    for _ in self._request.read_edge_events():
+                        self._on_edge()
+            except Exception as ex:
+                if not self._stopped.is_set():
+                    self._logger.warn(f"Tachometer: reading edge events of line {self._pin} failed: {ex}")
+                return
+
+    def destroy(self) -> None:
+        self._stopped.set()
+        self._thread.join(timeout=1.0)
+        self._request.release()
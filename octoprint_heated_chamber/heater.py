@@ -1,4 +1,9 @@
-import pigpio
+import threading
+import time
+
+from octoprint.util import RepeatedTimer
+
+from octoprint_heated_chamber.bus import get_bus
 
 from enum import Enum
 
@@ -24,6 +29,10 @@ class Heater:
     def state(self) -> bool:
         pass
 
+    def get_resolution(self) -> float:
+        # PWM range is 0-100
+        return 1.0
+
     def toggle(self) -> None:
         if self.state():
             self.turn_off()
@@ -39,6 +48,8 @@ class RelayHeater(Heater):
             self._pin = pin
             self._relay_mode = relay_mode
             self._heaterPWMMode = heaterPWMMode
+            self._on = False
+            self._power = 0
 
             if relay_mode == RelayMode.ACTIVE_HIGH:
                 self._on_value = 1
@@ -47,22 +58,20 @@ class RelayHeater(Heater):
                 self._on_value = 0
                 self._off_value = 1
 
-            self._pi = pigpio.pi()
-            if not self._pi.connected:
-                self._logger.error("Error connectiong to pigpio")
+            self._bus = get_bus(logger)
 
-            self._pi.set_mode(self._pin, pigpio.OUTPUT)
-            #self._pi.set_pull_up_down(self._pin, pigpio.PUD_UP)
+            self._bus.call("set_mode", self._pin, self._bus.pigpio.OUTPUT)
+            #self._bus.call("set_pull_up_down", self._pin, pigpio.PUD_UP)
             
             if self._heaterPWMMode:
-                self._pi.set_PWM_frequency(self._pin,  200)
-            self._pi.set_PWM_range(self._pin, 100)
+                self._bus.call("set_PWM_frequency", self._pin, 200)
+            self._bus.call("set_PWM_range", self._pin, 100)
         except Exception as ex:
             self._logger.warn(f"Heater Init Exception: {ex}")
 
     def turn_on(self) -> None:
         try:
-            self._pi.write(self._pin, self._on_value)
+            self._bus.call("write", self._pin, self._on_value)
             self._on = True
             self._logger.debug("Heater turned on")
         except Exception as ex:
@@ -71,7 +80,7 @@ class RelayHeater(Heater):
 
     def turn_off(self) -> None:
         try:
-            self._pi.write(self._pin, self._off_value)
+            self._bus.call("write", self._pin, self._off_value)
             self._on = False
             self._logger.debug("Heater turned off")
         except Exception as ex:
@@ -81,7 +90,7 @@ class RelayHeater(Heater):
         return self._on
 
     def destroy(self) -> None:
-        self._pi.stop()
+        self._bus.release()
 
     def set_power(self, power):
         try:
@@ -90,12 +99,142 @@ class RelayHeater(Heater):
 
             self._power = power
             self._logger.debug(f"Set power to {self._power}")
-            self._pi.set_PWM_dutycycle(
-                self._pin, self._power
-            )
+            self._bus.call("set_PWM_dutycycle", self._pin, self._power)
         except Exception as ex:
             self._logger.warn(f"Heater SetPower Exception: {ex}")
 
 
     def get_power(self):
-        return self._power
\ No newline at end of file
+        return self._power
+
+
+class HeaterGroup(Heater):
+    """Several heaters of one zone switched together, e.g. one on each side of the chamber"""
+
+    def __init__(self, logger, heaters) -> None:
+        super().__init__(logger)
+        self._heaters = list(heaters)
+
+    def turn_on(self) -> None:
+        for heater in self._heaters:
+            heater.turn_on()
+
+    def turn_off(self) -> None:
+        for heater in self._heaters:
+            heater.turn_off()
+
+    def state(self) -> bool:
+        return any(heater.state() for heater in self._heaters)
+
+    def set_power(self, power):
+        for heater in self._heaters:
+            heater.set_power(power)
+
+    def get_power(self):
+        return max((heater.get_power() for heater in self._heaters), default=0)
+
+    def get_resolution(self) -> float:
+        return max((heater.get_resolution() for heater in self._heaters), default=1.0)
+
+    def destroy(self) -> None:
+        for heater in self._heaters:
+            heater.destroy()
+
+
+class TimeProportionalHeater(Heater):
+    """Turns a power of 0 - 100 into on/off windows of a relay heater.
+
+    Every ``window`` seconds the relay is switched on for ``power`` percent of the window.
+    Pulses shorter than ``min_on`` are carried over to the following windows instead of
+    being dropped, and an off time shorter than ``min_off`` keeps the relay on for the whole
+    window, so the relay never chatters. The relay is serviced by its own timer every
+    ``interval`` seconds, independent of the control loop. A power of 0 switches the relay
+    off immediately.
+    """
+
+    def __init__(self, logger, heater, window=10.0, min_on=1.0, min_off=1.0, interval=0.1, clock=time.monotonic):
+        super().__init__(logger)
+        self._heater = heater
+        self._window = max(float(window), interval)
+        self._min_on = float(min_on)
+        self._min_off = float(min_off)
+        self._interval = interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._power = 0
+        self._carry = 0.0
+        self._window_start = None
+        self._on_time = 0.0
+        self._destroyed = False
+
+        self._heater.turn_off()
+        self._timer = RepeatedTimer(self._interval, self._service, daemon=True)
+        self._timer.start()
+
+    def turn_on(self) -> None:
+        self.set_power(100)
+
+    def turn_off(self) -> None:
+        self.set_power(0)
+
+    def state(self) -> bool:
+        return self._heater.state()
+
+    def set_power(self, power):
+        with self._lock:
+            self._power = min(max(power, 0), 100)
+            if self._power == 0:
+                self._carry = 0.0
+                self._on_time = 0.0
+                if self._heater.state():
+                    self._heater.turn_off()
+
+    def get_power(self):
+        return self._power
+
+    def get_resolution(self) -> float:
+        # one service interval of the window
+        return 100 * self._interval / self._window
+
+    def destroy(self) -> None:
+        self._timer.cancel()
+        # a service already running finishes before the relay goes off, the next one does nothing
+        with self._lock:
+            self._destroyed = True
+            self._heater.turn_off()
+            self._heater.destroy()
+
+    def _service(self):
+        # runs on the timer thread, an exception would end it with the relay left as it was
+        try:
+            with self._lock:
+                if self._destroyed:
+                    return
+                now = self._clock()
+                if self._window_start is None or now - self._window_start >= self._window:
+                    self._window_start = now
+                    self._on_time = self._next_on_time()
+                on = now - self._window_start < self._on_time
+                if on != self._heater.state():
+                    if on:
+                        self._heater.turn_on()
+                    else:
+                        self._heater.turn_off()
+        except Exception as ex:
+            self._logger.warn(f"TimeProportionalHeater: servicing the relay failed, switching it off: {ex}")
+            try:
+                self._heater.turn_off()
+            except Exception as ex:
+                self._logger.error(f"TimeProportionalHeater: switching the relay off failed: {ex}")
+
+    def _next_on_time(self):
+        self._carry = min(self._carry + self._power / 100 * self._window, 2 * self._window)
+        on_time = min(self._carry, self._window)
+        if on_time < self._min_on:
+            # too short to switch, collect it for a later window
+            on_time = 0.0
+        elif self._window - on_time < self._min_off:
+            on_time = self._window
+        # rounding up to a full window is paid back by the next ones
+        self._carry -= on_time
+        return on_time
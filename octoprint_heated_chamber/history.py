@@ -0,0 +1,90 @@
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+CHANNELS = (
+    "chamber",
+    "ambient",
+    "chamber_raw",
+    "ambient_raw",
+    "target",
+    "pid_output",
+    "heater",
+    "heaterfan",
+    "coolerfan",
+    "vent",
+    "heaterfan_rpm",
+    "coolerfan_rpm",
+)
+
+NAN = float("nan")
+
+
+class _Ordered:
+    """Chronological read-only view over the ring buffer timestamps, used for bisecting"""
+
+    def __init__(self, history):
+        self._history = history
+
+    def __getitem__(self, i):
+        return self._history._timestamps[self._history._physical(i)]
+
+
+class TemperatureHistory:
+    """A fixed-size ring buffer of control loop samples.
+
+    Every channel is a preallocated ``array`` of 32 bit floats next to one array of 64 bit
+    timestamps, so memory stays constant at ``size * (8 + 4 * len(channels))`` bytes,
+    about 4 MB for 24 hours at 1 Hz with the default channels. Missing values are stored as NaN.
+    """
+
+    def __init__(self, size=86400, channels=CHANNELS):
+        self._size = max(int(size), 1)
+        self._channels = tuple(channels)
+        self._timestamps = array("d", [0.0]) * self._size
+        self._values = {name: array("f", [NAN]) * self._size for name in self._channels}
+        self._lock = threading.Lock()
+        self._next = 0
+        self._count = 0
+
+    def get_channels(self):
+        return self._channels
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, **values) -> None:
+        with self._lock:
+            index = self._next
+            self._timestamps[index] = timestamp
+            for name, column in self._values.items():
+                value = values.get(name)
+                column[index] = NAN if value is None else float(value)
+            self._next = (index + 1) % self._size
+            if self._count < self._size:
+                self._count += 1
+
+    def _physical(self, i):
+        # i-th oldest entry
+        return (self._next - self._count + i) % self._size
+
+    def get_range(self, start=None, end=None, channels=None):
+        """All samples with ``start <= timestamp <= end`` as ``dict(timestamps=[...], <channel>=[...])``"""
+        if channels is None:
+            channels = self._channels
+        else:
+            channels = [name for name in channels if name in self._values]
+
+        with self._lock:
+            ordered = _Ordered(self)
+            lo = 0 if start is None else bisect_left(ordered, start, 0, self._count)
+            hi = self._count if end is None else bisect_right(ordered, end, lo, self._count)
+            indices = [self._physical(i) for i in range(lo, hi)]
+
+            result = dict(timestamps=[self._timestamps[i] for i in indices])
+            for name in channels:
+                column = self._values[name]
+                result[name] = [None if math.isnan(column[i]) else round(column[i], 3) for i in indices]
+        return result
@@ -0,0 +1,281 @@
+import math
+import struct
+import threading
+import time
+
+from octoprint_heated_chamber.temperature import TemperatureSensor
+
+
+class I2cBus:
+    """An I2C adapter ``/dev/i2c-<number>`` shared by all sensors on it.
+
+    smbus2 is imported and the adapter opened on first use, so only hosts with I2C sensors
+    need it and a missing one is a read error. Hold ``lock`` around a transaction, the
+    sensors are read from the acquisition's worker threads.
+    """
+
+    def __init__(self, logger, number):
+        self._logger = logger
+        self.number = number
+        self.lock = threading.Lock()
+        self._smbus = None
+
+    @property
+    def smbus(self):
+        if self._smbus is None:
+            from smbus2 import SMBus
+
+            self._smbus = SMBus(self.number)
+        return self._smbus
+
+
+_i2c_buses = {}
+_i2c_buses_lock = threading.Lock()
+
+
+def get_i2c_bus(logger, number):
+    with _i2c_buses_lock:
+        bus = _i2c_buses.get(number)
+        if bus is None:
+            bus = _i2c_buses[number] = I2cBus(logger, number)
+        return bus
+
+
+class I2cSensor(TemperatureSensor):
+    """A temperature sensor on an I2C bus, all sensors of a class on a bus are read as one batch.
+
+    A chip that can't be set up when the sensor is created, e.g. not connected yet, is set
+    up again by the following reads, until then every read fails.
+    """
+
+    DEFAULT_ADDRESS = None
+
+    def __init__(self, logger, update_frequency, bus=1, address=None):
+        self._logger = logger
+        self._update_frequency = update_frequency
+        self._bus = get_i2c_bus(logger, bus)
+        self._address = self.DEFAULT_ADDRESS if address is None else address
+        self.batch_key = self._bus
+        self._ready = False
+        self._logger.info(
+            f"{type(self).__name__} initiated with update_frequency={self._update_frequency}, bus={bus}, address={self._address:#04x}"
+        )
+        try:
+            with self._bus.lock:
+                self._prepare(self._bus.smbus)
+        except Exception as ex:
+            self._logger.warn(f"{type(self).__name__} {self._address:#04x}: setup failed, retrying on read: {ex}")
+
+    def get_update_frequency(self) -> float:
+        return self._update_frequency
+
+    def get_temperature(self):
+        value = type(self).read_many([self])[0]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    @classmethod
+    def read_many(cls, sensors):
+        # one lock for the batch, the transactions follow each other without other traffic in between
+        bus = sensors[0]._bus
+        values = []
+        with bus.lock:
+            for sensor in sensors:
+                try:
+                    sensor._prepare(bus.smbus)
+                    values.append(sensor._read(bus.smbus))
+                except Exception as ex:
+                    values.append(ex)
+        return values
+
+    def _prepare(self, smbus) -> None:
+        if not self._ready:
+            self._setup(smbus)
+            self._ready = True
+
+    def _setup(self, smbus) -> None:
+        pass
+
+    def _read(self, smbus):
+        raise NotImplementedError
+
+
+class Bme280(I2cSensor):
+    """Bosch BME280 or BMP280, measuring the temperature only, continuously in normal mode.
+
+    A conversion takes about 2.3 ms and runs on its own, a read is a single register read.
+    """
+
+    DEFAULT_ADDRESS = 0x76
+    CHIP_IDS = (0x60, 0x58)
+
+    def _setup(self, smbus):
+        chip_id = smbus.read_byte_data(self._address, 0xD0)
+        if chip_id not in self.CHIP_IDS:
+            raise ValueError(f"No BME280 at {self._address:#04x}, chip id {chip_id:#04x}")
+        self._dig_t1, self._dig_t2, self._dig_t3 = struct.unpack(
+            "<Hhh", bytes(smbus.read_i2c_block_data(self._address, 0x88, 6))
+        )
+        # humidity and pressure skipped, temperature oversampling x1, no IIR filter, 0.5 ms standby
+        smbus.write_byte_data(self._address, 0xF2, 0x00)
+        smbus.write_byte_data(self._address, 0xF5, 0x00)
+        smbus.write_byte_data(self._address, 0xF4, 0x23)
+
+    def _read(self, smbus):
+        msb, lsb, xlsb = smbus.read_i2c_block_data(self._address, 0xFA, 3)
+        adc = (msb << 12) | (lsb << 4) | (xlsb >> 4)
+        if adc == 0x80000:
+            # no conversion finished yet
+            return None
+        # floating point compensation of the datasheet
+        var1 = (adc / 16384.0 - self._dig_t1 / 1024.0) * self._dig_t2
+        var2 = (adc / 131072.0 - self._dig_t1 / 8192.0) ** 2 * self._dig_t3
+        return (var1 + var2) / 5120.0
+
+
+def _sht_crc(data) -> int:
+    """Sensirion CRC8, polynomial 0x31, initial value 0xFF"""
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+class Sht3x(I2cSensor):
+    """Sensirion SHT30/31/35 in periodic mode at 10 measurements per second, high repeatability.
+
+    A read fetches the latest measurement instead of waiting up to 15 ms for a single shot.
+    """
+
+    DEFAULT_ADDRESS = 0x44
+
+    def _command(self, smbus, command):
+        from smbus2 import i2c_msg
+
+        smbus.i2c_rdwr(i2c_msg.write(self._address, [command >> 8, command & 0xFF]))
+
+    def _setup(self, smbus):
+        try:
+            # stop a periodic mode left running, the sensor ignores other commands in it
+            self._command(smbus, 0x3093)
+        except OSError:
+            pass
+        time.sleep(0.001)
+        self._command(smbus, 0x2737)
+
+    def _read(self, smbus):
+        from smbus2 import i2c_msg
+
+        try:
+            self._command(smbus, 0xE000)
+        except OSError:
+            # NACK: nothing measured since the previous fetch
+            self._logger.debug(f"Sht3x {self._address:#04x}: no new measurement")
+            return None
+        read = i2c_msg.read(self._address, 6)
+        smbus.i2c_rdwr(read)
+        data = bytes(list(read))
+        if _sht_crc(data[0:2]) != data[2]:
+            self._logger.debug(f"Sht3x {self._address:#04x}: CRC mismatch in {data.hex()}")
+            return None
+        return -45.0 + 175.0 * ((data[0] << 8) | data[1]) / 65535.0
+
+
+class Ads1115Thermistor(I2cSensor):
+    """An NTC thermistor read through one single ended channel of a TI ADS1115.
+
+    The thermistor goes from the channel to ground, ``series_resistance`` from the channel to
+    ``supply_voltage``. Single shot conversions at 860 samples per second take about 1.2 ms.
+    ``read_many`` starts one conversion on every chip of the batch and waits only once.
+    """
+
+    DEFAULT_ADDRESS = 0x48
+    # PGA +-4.096 V
+    FULL_SCALE = 4.096
+    CONVERSION_TIME = 0.0015
+
+    def __init__(
+        self,
+        logger,
+        update_frequency,
+        bus=1,
+        address=None,
+        channel=0,
+        supply_voltage=3.3,
+        series_resistance=10000.0,
+        nominal_resistance=100000.0,
+        nominal_temperature=25.0,
+        beta=3950.0,
+    ):
+        self._channel = channel
+        self._supply_voltage = supply_voltage
+        self._series_resistance = series_resistance
+        self._nominal_resistance = nominal_resistance
+        self._nominal_temperature = nominal_temperature + 273.15
+        self._beta = beta
+        # start a single shot, input AINx against GND, +-4.096 V, 860 SPS, comparator off
+        self._config = (1 << 15) | ((0b100 + channel) << 12) | (0b001 << 9) | (1 << 8) | (0b111 << 5) | 0b11
+        super().__init__(logger, update_frequency, bus, address)
+
+    def _start(self, smbus):
+        smbus.write_i2c_block_data(self._address, 0x01, [self._config >> 8, self._config & 0xFF])
+
+    def _finish(self, smbus):
+        for _ in range(5):
+            status = smbus.read_i2c_block_data(self._address, 0x01, 2)
+            if status[0] & 0x80:
+                break
+            time.sleep(0.0005)
+        else:
+            raise TimeoutError(f"Ads1115 {self._address:#04x}: conversion of channel {self._channel} not done")
+        raw = struct.unpack(">h", bytes(smbus.read_i2c_block_data(self._address, 0x00, 2)))[0]
+        return self._temperature(raw * self.FULL_SCALE / 32768.0)
+
+    def _temperature(self, voltage):
+        if voltage <= 0.0 or voltage >= self._supply_voltage:
+            # shorted or not connected
+            self._logger.debug(f"Ads1115 {self._address:#04x}: channel {self._channel} at {voltage:.3f} V")
+            return None
+        resistance = self._series_resistance * voltage / (self._supply_voltage - voltage)
+        inverse = 1.0 / self._nominal_temperature + math.log(resistance / self._nominal_resistance) / self._beta
+        return 1.0 / inverse - 273.15
+
+    def _read(self, smbus):
+        self._start(smbus)
+        time.sleep(self.CONVERSION_TIME)
+        return self._finish(smbus)
+
+    @classmethod
+    def read_many(cls, sensors):
+        bus = sensors[0]._bus
+        values = [None] * len(sensors)
+        # the channels of a chip are multiplexed, every round converts one channel per chip
+        queues = {}
+        for index, sensor in enumerate(sensors):
+            queues.setdefault(sensor._address, []).append(index)
+        with bus.lock:
+            while queues:
+                started = []
+                for address in list(queues):
+                    index = queues[address].pop(0)
+                    if not queues[address]:
+                        del queues[address]
+                    try:
+                        sensors[index]._prepare(bus.smbus)
+                        sensors[index]._start(bus.smbus)
+                        started.append(index)
+                    except Exception as ex:
+                        values[index] = ex
+                time.sleep(cls.CONVERSION_TIME)
+                for index in started:
+                    try:
+                        values[index] = sensors[index]._finish(bus.smbus)
+                    except Exception as ex:
+                        values[index] = ex
+        return values
+
+
+I2C_SENSORS = dict(bme280=Bme280, sht3x=Sht3x, ads1115=Ads1115Thermistor)
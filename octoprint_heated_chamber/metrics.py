@@ -0,0 +1,84 @@
+import math
+
+
+def _format_value(value) -> str:
+    if isinstance(value, int):
+        return str(int(value))
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Metrics:
+    """In process gauges, counters and histograms in the Prometheus text format.
+
+    The control loop and the acquisition update values in memory, ``render()`` only formats
+    what is there, so a scrape never touches the hardware or waits for the control lock.
+    Counters are set to the totals the subsystems keep anyway, histograms are the
+    ``timing.Histogram`` objects they observe into.
+    """
+
+    def __init__(self, prefix="heated_chamber"):
+        self._prefix = prefix
+        self._families = {}
+
+    def gauge(self, name, help_text) -> None:
+        self._declare(name, "gauge", help_text)
+
+    def counter(self, name, help_text) -> None:
+        self._declare(name, "counter", help_text)
+
+    def histogram(self, name, help_text) -> None:
+        self._declare(name, "histogram", help_text)
+
+    def _declare(self, name, kind, help_text):
+        self._families[name] = (kind, help_text, {})
+
+    def set(self, name, value, **labels) -> None:
+        """Set a gauge or counter total, or attach a histogram, a None value removes the series"""
+        values = self._families[name][2]
+        key = tuple(sorted(labels.items()))
+        if value is None:
+            values.pop(key, None)
+        else:
+            values[key] = value
+
+    def clear(self) -> None:
+        """Forget all series, e.g. after the zones changed"""
+        for _, _, values in self._families.values():
+            values.clear()
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, values) in list(self._families.items()):
+            name = f"{self._prefix}_{name}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in list(values.items()):
+                if kind == "histogram":
+                    lines.extend(self._render_histogram(name, labels, value))
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+    def _render_histogram(self, name, labels, histogram):
+        stats = histogram.to_dict()
+        cumulative = 0
+        for bound, count in stats["buckets_ms"].items():
+            cumulative += count
+            le = "+Inf" if bound == "+Inf" else _format_value(float(bound) / 1000.0)
+            yield f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}"
+        yield f"{name}_sum{_format_labels(labels)} {_format_value(stats['avg_ms'] * stats['count'] / 1000.0)}"
+        yield f"{name}_count{_format_labels(labels)} {stats['count']}"
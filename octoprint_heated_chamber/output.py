@@ -0,0 +1,85 @@
+import time
+
+
+class CoalescingOutput:
+    """Sits between the control logic and a fan, heater or servo and drops redundant writes.
+
+    Values are quantized to the device resolution before they are compared with the last
+    issued write, so a write only reaches the device when the hardware would actually change.
+    A write is only remembered once the device reports it, the drivers log and swallow their
+    errors, and a turn off is only dropped while the device reports it off. The servo opening
+    is read back from the pigpio daemon, so for it the last written value is trusted instead.
+    Anything that isn't a write is passed through to the wrapped device.
+    """
+
+    # getters answered from the driver's own state, ``get_open`` would be a daemon round trip
+    READBACK = dict(state="state", power="get_power")
+
+    def __init__(self, logger, device, name=None):
+        self._logger = logger
+        self._device = device
+        self._name = name or type(device).__name__
+        get_resolution = getattr(device, "get_resolution", None)
+        self._resolution = get_resolution() if get_resolution is not None else 1.0
+        self._last = None
+        self._issued = 0
+        self._suppressed = 0
+        self._write_seconds = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self._device, name)
+
+    def get_device(self):
+        return self._device
+
+    def _quantize(self, value):
+        steps = round(value / self._resolution)
+        return round(steps * self._resolution, 6) if self._resolution < 1 else int(steps * self._resolution)
+
+    def _in_effect(self, key, value) -> bool:
+        read = getattr(self._device, self.READBACK[key], None) if key in self.READBACK else None
+        return read is None or read() == value
+
+    def _write(self, key, value, write, force):
+        if not force and self._last == (key, value) and self._in_effect(key, value):
+            self._suppressed += 1
+            return
+        start = time.monotonic()
+        write()
+        self._write_seconds += time.monotonic() - start
+        self._issued += 1
+        # a write that didn't take is repeated by the next call
+        self._last = (key, value) if self._in_effect(key, value) else None
+
+    def set_power(self, power, force=False) -> None:
+        power = self._quantize(power)
+        self._write("power", power, lambda: self._device.set_power(power), force)
+
+    def set_open(self, opening, force=False) -> None:
+        opening = self._quantize(opening)
+        self._write("open", opening, lambda: self._device.set_open(opening), force)
+
+    def turn_on(self, force=False) -> None:
+        self._write("state", True, self._device.turn_on, force)
+
+    def turn_off(self, force=False) -> None:
+        # a relay switched on behind our back fails the read back, so this isn't dropped
+        self._write("state", False, self._device.turn_off, force)
+
+    def idle(self, force=False) -> None:
+        if hasattr(self._device, "get_idle_opening"):
+            self.set_open(self._device.get_idle_opening(), force)
+        else:
+            self.set_power(self._device.get_idle_power(), force)
+
+    def get_write_seconds(self) -> float:
+        return self._write_seconds
+
+    def get_stats(self):
+        return dict(
+            name=self._name,
+            issued=self._issued,
+            suppressed=self._suppressed,
+            resolution=self._resolution,
+            write_seconds=self._write_seconds,
+        )
@@ -0,0 +1,117 @@
+class _SensorState:
+    def __init__(self):
+        self.setpoint = None
+        self.reached = False
+        self.watch_start = None
+        self.watch_temperature = None
+        self.below_since = None
+        self.last_raw = None
+        self.changed_at = None
+
+
+class ThermalProtection:
+    """Thermal runaway protection of one zone, modelled on the firmware checks.
+
+    ``update()`` is fed with every sample of the zone sensors, so it keeps working when the
+    control loop is stuck. It faults when
+
+    - a reading is above ``max_temperature``
+    - the heater is on while far below the target, and the temperature did not rise by
+      ``watch_increase`` within ``watch_period`` seconds
+    - after the target was reached, the temperature stays more than ``hold_band`` below it
+      for ``hold_period`` seconds with the heater on
+    - the raw reading doesn't change for ``frozen_period`` seconds while the heater runs at
+      ``frozen_power`` percent or more
+
+    A fault is latched until ``clear()``, the caller keeps the heater off meanwhile.
+    """
+
+    def __init__(
+        self,
+        max_temperature=90.0,
+        watch_period=600.0,
+        watch_increase=1.0,
+        hold_band=5.0,
+        hold_period=300.0,
+        frozen_period=600.0,
+        frozen_power=50.0,
+    ):
+        self.configure(
+            max_temperature, watch_period, watch_increase, hold_band, hold_period, frozen_period, frozen_power
+        )
+        self.fault = None
+        self._sensors = {}
+
+    def configure(
+        self, max_temperature, watch_period, watch_increase, hold_band, hold_period, frozen_period, frozen_power
+    ) -> None:
+        self.max_temperature = max_temperature
+        self.watch_period = watch_period
+        self.watch_increase = watch_increase
+        self.hold_band = hold_band
+        self.hold_period = hold_period
+        self.frozen_period = frozen_period
+        self.frozen_power = frozen_power
+
+    def clear(self) -> None:
+        self.fault = None
+        self._sensors = {}
+
+    def update(self, role, temperature, raw, timestamp, target_temperature, heater_power):
+        """Check one sample, return the latched fault or None"""
+        if self.fault is None:
+            state = self._sensors.get(role)
+            if state is None:
+                state = self._sensors[role] = _SensorState()
+            fault = self._check(
+                state, temperature, raw, timestamp, target_temperature or 0, heater_power > 0, heater_power
+            )
+            if fault is not None:
+                self.fault = f"{role}: {fault}"
+        return self.fault
+
+    def _check(self, state, temperature, raw, timestamp, target, heating, heater_power):
+        reading = temperature if raw is None else max(temperature, raw)
+        if reading > self.max_temperature:
+            return f"{reading} above the maximum of {self.max_temperature}"
+
+        if target != state.setpoint:
+            # a new target restarts the heat up
+            state.setpoint = target
+            state.reached = False
+            state.watch_start = None
+            state.below_since = None
+        if target and temperature >= target - self.hold_band:
+            state.reached = True
+
+        # heating watch, only while still far from the target
+        if heating and target and not state.reached:
+            if state.watch_start is None:
+                state.watch_start = timestamp
+                state.watch_temperature = temperature
+            elif timestamp - state.watch_start >= self.watch_period:
+                rise = temperature - state.watch_temperature
+                if rise < self.watch_increase:
+                    return f"heating rose only {rise:.2f} in {self.watch_period}s, expected {self.watch_increase}"
+                state.watch_start = timestamp
+                state.watch_temperature = temperature
+        else:
+            state.watch_start = None
+
+        # hold band around a reached target
+        if heating and target and state.reached and temperature < target - self.hold_band:
+            if state.below_since is None:
+                state.below_since = timestamp
+            elif timestamp - state.below_since >= self.hold_period:
+                return f"{temperature} more than {self.hold_band} below the target {target} for {self.hold_period}s"
+        else:
+            state.below_since = None
+
+        # frozen sensor
+        value = temperature if raw is None else raw
+        if value != state.last_raw or state.changed_at is None:
+            state.last_raw = value
+            state.changed_at = timestamp
+        elif heater_power >= self.frozen_power and timestamp - state.changed_at >= self.frozen_period:
+            return f"reading stuck at {value} for {self.frozen_period}s with the heater at {heater_power}%"
+        return None
@@ -0,0 +1,111 @@
+import os
+
+from octoprint_heated_chamber.fan import Fan
+from octoprint_heated_chamber.servo import Servo
+
+
+class SysfsPwmChannel:
+    """One channel of a kernel PWM chip under ``/sys/class/pwm``, period and duty in nanoseconds.
+
+    The sysfs files are kept open, a duty change is a single write.
+    """
+
+    def __init__(self, logger, chip, channel, base_dir="/sys/class/pwm"):
+        self._logger = logger
+        chip_dir = os.path.join(base_dir, f"pwmchip{chip}")
+        self._dir = os.path.join(chip_dir, f"pwm{channel}")
+        if not os.path.isdir(self._dir):
+            with open(os.path.join(chip_dir, "export"), "w") as export:
+                export.write(str(channel))
+        self._period = 0
+        self._duty_file = None
+
+    def _write(self, name, value):
+        with open(os.path.join(self._dir, name), "w") as attribute:
+            attribute.write(str(value))
+
+    def configure(self, period_ns) -> None:
+        # the duty cycle must never exceed the period, not even between two writes
+        self._write("duty_cycle", 0)
+        self._write("period", int(period_ns))
+        self._period = int(period_ns)
+        self._write("enable", 1)
+        self._duty_file = open(os.path.join(self._dir, "duty_cycle"), "w")
+
+    def set_duty(self, duty_ns) -> None:
+        self._duty_file.seek(0)
+        self._duty_file.write(str(min(max(int(duty_ns), 0), self._period)))
+        self._duty_file.flush()
+
+    def close(self) -> None:
+        if self._duty_file is not None:
+            self._duty_file.close()
+            self._duty_file = None
+        try:
+            self._write("enable", 0)
+        except OSError as ex:
+            self._logger.warn(f"PWM channel {self._dir} could not be disabled: {ex}")
+
+
+class SysfsPwmFan(Fan):
+    """A fan on a kernel PWM channel, e.g. the Raspberry Pi's pwm-2chan overlay. ``pin`` is the channel"""
+
+    def __init__(self, logger, pin, frequency, idle_power, chip=0):
+        self._logger = logger
+        self._idle_power = idle_power
+        self._period = 1e9 / frequency
+        self._channel = SysfsPwmChannel(logger, chip, pin)
+        self._channel.configure(self._period)
+        self.set_power(self._idle_power)
+
+    def destroy(self):
+        self._channel.close()
+
+    def get_idle_power(self) -> int:
+        return self._idle_power
+
+    def idle(self):
+        self.set_power(self._idle_power)
+
+    def set_power(self, power):
+        self._power = power
+        self._logger.debug(f"Fan power to {self._power}")
+        self._channel.set_duty(self._period * power / 100)
+
+    def get_resolution(self) -> float:
+        # one nanosecond of the period
+        return 100 / self._period
+
+    def get_power(self):
+        return self._power
+
+
+class SysfsPwmServo(Servo):
+    """A vent servo on a kernel PWM channel at 50 Hz, openings are pulse widths in microseconds"""
+
+    PERIOD_NS = 20000000
+
+    def __init__(self, logger, pin, idle_opening, chip=0):
+        self._logger = logger
+        self._idle_opening = idle_opening
+        self._opening = None
+        self._channel = SysfsPwmChannel(logger, chip, pin)
+        self._channel.configure(self.PERIOD_NS)
+        self.set_open(self._idle_opening)
+
+    def destroy(self):
+        self._channel.close()
+
+    def get_idle_opening(self) -> int:
+        return self._idle_opening
+
+    def idle(self):
+        self.set_open(self._idle_opening)
+
+    def set_open(self, opening):
+        self._opening = opening
+        self._logger.debug(f"Set opening to {self._opening}")
+        self._channel.set_duty(opening * 1000)
+
+    def get_open(self):
+        return self._opening
@@ -1,4 +1,4 @@
-import pigpio
+from octoprint_heated_chamber.bus import get_bus
 
 
 class Servo:
@@ -8,16 +8,27 @@ class Servo:
     def get_open(self) -> float:
         pass
 
+    def get_resolution(self) -> float:
+        # pulsewidth step in microseconds
+        return 1.0
+
     def destroy(self) -> None:
         pass
 
 
 class DummyServo(Servo):
-    def __init__(self, logger):
+    def __init__(self, logger, idle_opening=0):
         self._logger = logger
         self._opening = 0
+        self._idle_opening = idle_opening
         pass
 
+    def get_idle_opening(self) -> int:
+        return self._idle_opening
+
+    def idle(self):
+        self.set_open(self._idle_opening)
+
     def set_open(self, opening) -> None:
         self._opening = opening
         self._logger.debug(f"Set opening to {self._opening}")
@@ -36,16 +47,14 @@ class servoVentilation(Servo):
         try:
             self._logger = logger
             self._pin = servo_pin
-            self._piServo = pigpio.pi()
+            self._bus = get_bus(logger)
             self.irisPos = None
 
             self._idle_opening = idle_opening
             #self._lastOpening = None
             #self._heaterPWMMode = heaterPWMMode
 
-            if not self._piServo.connected:
-                self._logger.error("Error connectiong to pigpio")
-            self._piServo.set_mode(self._pin, pigpio.OUTPUT) 
+            self._bus.call("set_mode", self._pin, self._bus.pigpio.OUTPUT)
 
             self.set_open(self._idle_opening)
         except Exception as ex:
@@ -53,7 +62,7 @@ class servoVentilation(Servo):
 
 
     def destroy(self):
-        self._piServo.stop()
+        self._bus.release()
 
     def get_max_opening(self) -> int:
         return 100
@@ -71,9 +80,7 @@ class servoVentilation(Servo):
 
             self._opening = opening
             self._logger.debug(f"Set opening to {self._opening}")
-            self._piServo.set_servo_pulsewidth(
-                self._pin, self._opening
-            )
+            self._bus.call("set_servo_pulsewidth", self._pin, self._opening)
             #self._lastOpening = self._opening
             #self._piServo.set_servo_pulsewidth(
             #    self._pin, 0
@@ -82,6 +89,6 @@ class servoVentilation(Servo):
             self._logger.warn(f"Servo SetOpening Exception: {ex}")
 
     def get_open(self):
-        currentServopulses = _piServo.get_servo_pulsewidth(self._pin)
+        currentServopulses = self._bus.call("get_servo_pulsewidth", self._pin)
         return currentServopulses
         #return self._lastOpening
\ No newline at end of file
@@ -0,0 +1,202 @@
+import threading
+import time
+
+from octoprint_heated_chamber.fan import Fan
+from octoprint_heated_chamber.heater import Heater
+from octoprint_heated_chamber.servo import Servo
+from octoprint_heated_chamber.temperature import TemperatureSensor
+
+
+class ThermalPlant:
+    """A lumped-capacitance model of the chamber, used instead of the real hardware.
+
+    Two thermal masses are simulated: the heater element and the chamber air with its walls.
+    The heater fan increases the transfer from the element into the chamber, the vent opening
+    and the cooler fan increase the loss from the chamber to the room.
+    """
+
+    def __init__(
+        self,
+        ambient_temperature=22.0,
+        heater_power=300.0,
+        heat_capacity=20000.0,
+        heat_loss=5.0,
+        element_heat_capacity=400.0,
+        element_transfer=3.0,
+        heaterfan_transfer=12.0,
+        vent_loss=15.0,
+        coolerfan_loss=25.0,
+        time_scale=1.0,
+        clock=time.monotonic,
+    ):
+        self.ambient_temperature = ambient_temperature
+        self.heater_power = heater_power
+        self.heat_capacity = heat_capacity
+        self.heat_loss = heat_loss
+        self.element_heat_capacity = element_heat_capacity
+        self.element_transfer = element_transfer
+        self.heaterfan_transfer = heaterfan_transfer
+        self.vent_loss = vent_loss
+        self.coolerfan_loss = coolerfan_loss
+        self.time_scale = time_scale
+
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last = clock()
+        self._chamber_temperature = ambient_temperature
+        self._element_temperature = ambient_temperature
+
+        # inputs, all 0.0 - 1.0
+        self._heater = 0.0
+        self._heaterfan = 0.0
+        self._coolerfan = 0.0
+        self._vent = 0.0
+
+    def set_input(self, name, value) -> None:
+        with self._lock:
+            self._advance()
+            setattr(self, f"_{name}", min(max(float(value), 0.0), 1.0))
+
+    def get_input(self, name) -> float:
+        return getattr(self, f"_{name}")
+
+    def get_chamber_temperature(self) -> float:
+        with self._lock:
+            self._advance()
+            return self._chamber_temperature
+
+    def get_element_temperature(self) -> float:
+        with self._lock:
+            self._advance()
+            return self._element_temperature
+
+    def step(self, seconds) -> None:
+        """Integrate ``seconds`` of simulated time, independent of the clock"""
+        with self._lock:
+            self._integrate(seconds)
+
+    def _advance(self):
+        now = self._clock()
+        elapsed = (now - self._last) * self.time_scale
+        self._last = now
+        if elapsed > 0:
+            self._integrate(elapsed)
+
+    def _integrate(self, seconds):
+        # explicit Euler with small enough steps for the element time constant
+        while seconds > 0:
+            dt = min(seconds, 0.5)
+            seconds -= dt
+
+            transfer = (self.element_transfer + self.heaterfan_transfer * self._heaterfan) * (
+                self._element_temperature - self._chamber_temperature
+            )
+            loss = (
+                self.heat_loss + self.vent_loss * self._vent + self.coolerfan_loss * self._coolerfan
+            ) * (self._chamber_temperature - self.ambient_temperature)
+
+            self._element_temperature += (self.heater_power * self._heater - transfer) * dt / self.element_heat_capacity
+            self._chamber_temperature += (transfer - loss) * dt / self.heat_capacity
+
+
+class SimulatedFan(Fan):
+    def __init__(self, logger, plant, role, idle_power):
+        self._logger = logger
+        self._plant = plant
+        self._role = role
+        self._idle_power = idle_power
+        self.set_power(self._idle_power)
+
+    def get_max_power(self) -> int:
+        return 100
+
+    def get_idle_power(self) -> int:
+        return self._idle_power
+
+    def idle(self):
+        self.set_power(self._idle_power)
+
+    def set_power(self, power):
+        self._power = power
+        self._logger.debug(f"Simulated {self._role} power to {self._power}")
+        self._plant.set_input(self._role, power / 100.0)
+
+    def get_power(self):
+        return self._power
+
+
+class SimulatedHeater(Heater):
+    def __init__(self, logger, plant, heaterPWMMode):
+        super().__init__(logger)
+        self._plant = plant
+        self._heaterPWMMode = heaterPWMMode
+        self._on = False
+        self._power = 0
+
+    def turn_on(self) -> None:
+        self._on = True
+        self._plant.set_input("heater", 1.0)
+        self._logger.debug("Simulated heater turned on")
+
+    def turn_off(self) -> None:
+        self._on = False
+        self._plant.set_input("heater", 0.0)
+        self._logger.debug("Simulated heater turned off")
+
+    def state(self) -> bool:
+        return self._on
+
+    def set_power(self, power):
+        self._power = power
+        self._on = power > 0
+        self._plant.set_input("heater", power / 100.0)
+
+    def get_power(self):
+        return self._power
+
+
+class SimulatedServo(Servo):
+    """A vent servo, ``close_opening`` and ``open_opening`` are the pulsewidths of the end positions"""
+
+    def __init__(self, logger, plant, idle_opening, close_opening, open_opening):
+        self._logger = logger
+        self._plant = plant
+        self._idle_opening = idle_opening
+        self._close_opening = close_opening
+        self._open_opening = open_opening
+        self.set_open(self._idle_opening)
+
+    def get_idle_opening(self) -> int:
+        return self._idle_opening
+
+    def idle(self):
+        self.set_open(self._idle_opening)
+
+    def set_open(self, opening):
+        self._opening = opening
+        span = self._open_opening - self._close_opening
+        self._plant.set_input("vent", (opening - self._close_opening) / span if span else 0.0)
+
+    def get_open(self):
+        return self._opening
+
+
+class SimulatedDs18b20(TemperatureSensor):
+    """Reads the simulated chamber, or the room for the ambient role, with DS18B20 resolution"""
+
+    def __init__(self, logger, plant, update_frequency, role):
+        self._logger = logger
+        self._plant = plant
+        self._update_frequency = update_frequency
+        self._role = role
+
+    def get_update_frequency(self) -> float:
+        return self._update_frequency
+
+    def get_temperature(self):
+        if self._role == "ambient":
+            temperature = self._plant.ambient_temperature
+        else:
+            temperature = self._plant.get_chamber_temperature()
+        # 12 bit conversion, 1/16 degree steps
+        return round(temperature * 16) / 16
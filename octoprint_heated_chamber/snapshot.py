@@ -0,0 +1,20 @@
+import time
+from collections import namedtuple
+
+
+class ChamberSnapshot(namedtuple("ChamberSnapshot", ["value", "target", "timestamp", "stale"])):
+    """The last good chamber sample, published by the control loop as a single immutable object.
+
+    Replacing the plugin attribute holding it is atomic, so readers on other threads
+    (e.g. the comm thread) always see a consistent value/target/timestamp triple without locking.
+    """
+
+    __slots__ = ()
+
+    def age(self, now=None) -> float:
+        if now is None:
+            now = time.monotonic()
+        return now - self.timestamp
+
+    def is_stale(self, max_age, now=None) -> bool:
+        return self.stale or self.age(now) > max_age
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import deque
+
+from octoprint_heated_chamber.bus import get_bus
+
+
+class Tachometer:
+    """Fan speed from the pulses of its tach wire, counted on a sliding window.
+
+    ``update(power)`` is called once per control tick with the commanded fan power and
+    returns whether the fan is stalled: it was driven for at least a full window and turns
+    slower than ``min_rpm``.
+    """
+
+    def __init__(self, logger, pulses_per_revolution=2, window=3.0, min_rpm=300, clock=time.monotonic):
+        self._logger = logger
+        self._pulses_per_revolution = pulses_per_revolution
+        self._window = window
+        self._min_rpm = min_rpm
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._edges = deque()
+        self._started = clock()
+        self._driven_since = None
+        self.stalled = False
+
+    def _on_edge(self, *args):
+        now = self._clock()
+        with self._lock:
+            self._edges.append(now)
+            self._evict(now)
+
+    def _evict(self, now):
+        while self._edges and now - self._edges[0] > self._window:
+            self._edges.popleft()
+
+    def get_rpm(self) -> float:
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            pulses = len(self._edges)
+        elapsed = min(self._window, now - self._started)
+        if elapsed <= 0:
+            return 0.0
+        return pulses / elapsed * 60.0 / self._pulses_per_revolution
+
+    def update(self, power) -> bool:
+        now = self._clock()
+        if power <= 0:
+            self._driven_since = None
+            self.stalled = False
+            return False
+        if self._driven_since is None:
+            # give the fan a full window to spin up
+            self._driven_since = now
+        stalled = now - self._driven_since >= self._window and self.get_rpm() < self._min_rpm
+        if stalled != self.stalled:
+            if stalled:
+                self._logger.error(f"Fan stalled: {self.get_rpm():.0f} rpm at {power}% power")
+            else:
+                self._logger.info("Fan running again")
+        self.stalled = stalled
+        return stalled
+
+    def destroy(self) -> None:
+        pass
+
+
+class PigpioTachometer(Tachometer):
+    """Counts the falling edges of the tach pin with a pigpio callback, no polling"""
+
+    def __init__(self, logger, pin, **kwargs):
+        super().__init__(logger, **kwargs)
+        self._pin = pin
+        self._bus = get_bus(logger)
+        self._bus.call("set_mode", self._pin, self._bus.pigpio.INPUT)
+        # tach outputs are open collector
+        self._bus.call("set_pull_up_down", self._pin, self._bus.pigpio.PUD_UP)
+        self._callback = self._bus.call("callback", self._pin, self._bus.pigpio.FALLING_EDGE, self._on_edge)
+
+    def destroy(self) -> None:
+        self._callback.cancel()
+        self._bus.release()
+
+
+class SimulatedTachometer(Tachometer):
+    """Reports the speed a simulated fan would turn at, ``max_rpm`` at full power"""
+
+    def __init__(self, logger, plant, role, max_rpm=3000, **kwargs):
+        super().__init__(logger, **kwargs)
+        self._plant = plant
+        self._role = role
+        self._max_rpm = max_rpm
+
+    def get_rpm(self) -> float:
+        return self._plant.get_input(self._role) * self._max_rpm
@@ -1,102 +1,192 @@
 import random
 import glob
+import os
+import threading
 import time
 from os.path import basename
-from octoprint.util import RepeatedTimer
-import threading
+
+
+OWFS_BASE_DIR = "/mnt/1wire/"
+SYSFS_BASE_DIR = "/sys/bus/w1/devices/"
+
+# DS18B20 12 bit conversion time
+CONVERSION_TIME = 0.75
+# value of the scratchpad after power-on, before the first conversion
+POWER_ON_TEMPERATURE = 85.0
+# what OWFS and some w1 drivers report for a probe that didn't answer
+READ_ERROR_TEMPERATURE = -1.0
 
 
 class TemperatureSensor:
+    # sensors of one class with the same batch key, e.g. their I2C bus, are read by one read_many()
+    batch_key = None
+
     def get_temperature(self) -> float:
         pass
 
+    @classmethod
+    def read_many(cls, sensors):
+        """Read ``sensors`` of this class in one go, in order, a failed read is returned as its exception"""
+        values = []
+        for sensor in sensors:
+            try:
+                values.append(sensor.get_temperature())
+            except Exception as ex:
+                values.append(ex)
+        return values
+
 
 class DummyTemperatureSensor(TemperatureSensor):
+    def get_update_frequency(self) -> float:
+        return 1.0
+
     def get_temperature(self) -> float:
-        random.uniform(15.0, 70.0)
+        return random.uniform(15.0, 70.0)
+
+
+class OneWireBus:
+    """A 1-wire bus master able to start a conversion on all its DS18B20 at once"""
+
+    def __init__(self, logger, backend, base_dir=None):
+        self._logger = logger
+        self._backend = backend
+        self._base_dir = base_dir or (SYSFS_BASE_DIR if backend == "sysfs" else OWFS_BASE_DIR)
+        self._lock = threading.Lock()
+
+    def get_backend(self) -> str:
+        return self._backend
+
+    def get_base_dir(self) -> str:
+        return self._base_dir
+
+    def convert(self) -> None:
+        """Trigger a simultaneous conversion and block until the results can be read"""
+        with self._lock:
+            if self._backend == "sysfs":
+                triggers = glob.glob(os.path.join(self._base_dir, "w1_bus_master*", "therm_bulk_read"))
+                for trigger in triggers:
+                    with open(trigger, "w") as f:
+                        f.write("trigger\n")
+                time.sleep(CONVERSION_TIME)
+                # -1 means at least one probe is still converting
+                for trigger in triggers:
+                    for _ in range(10):
+                        with open(trigger, "r") as f:
+                            if f.read().strip() != "-1":
+                                break
+                        time.sleep(0.05)
+            else:
+                with open(os.path.join(self._base_dir, "simultaneous", "temperature"), "w") as f:
+                    f.write("1")
+                time.sleep(CONVERSION_TIME)
+
+
+_onewire_buses = {}
+_onewire_buses_lock = threading.Lock()
+
+
+def get_onewire_bus(logger, backend):
+    with _onewire_buses_lock:
+        bus = _onewire_buses.get(backend)
+        if bus is None:
+            bus = _onewire_buses[backend] = OneWireBus(logger, backend)
+        return bus
+
+
+def _crc8(data) -> int:
+    """Dallas/Maxim 1-wire CRC8"""
+    crc = 0
+    for byte in data:
+        for _ in range(8):
+            mix = (crc ^ byte) & 0x01
+            crc >>= 1
+            if mix:
+                crc ^= 0x8C
+            byte >>= 1
+    return crc
+
+
+def parse_w1_slave(content):
+    """Parse the kernel w1_slave output, return the temperature or None if the read is not valid.
+
+    The first line holds the 9 scratchpad bytes and the kernel CRC verdict, the second
+    line the converted value, e.g.::
+
+        72 01 4b 46 7f ff 0e 10 57 : crc=57 YES
+        72 01 4b 46 7f ff 0e 10 57 t=23125
+    """
+    lines = content.strip().splitlines()
+    if len(lines) < 2 or not lines[0].strip().endswith("YES"):
+        return None
+
+    try:
+        scratchpad = bytes(int(value, 16) for value in lines[0].split(":")[0].split())
+    except ValueError:
+        return None
+    # an all-zero scratchpad passes the CRC but means nobody answered on the bus
+    if len(scratchpad) != 9 or not any(scratchpad) or _crc8(scratchpad[:8]) != scratchpad[8]:
+        return None
+
+    position = lines[1].find("t=")
+    if position == -1:
+        return None
+    return int(lines[1][position + 2 :]) / 1000.0
 
 
 class Ds18b20(TemperatureSensor):
-    def __init__(self, logger, update_frequency, device_id):
+    """A DS18B20 read through OWFS or the kernel w1 sysfs, sampled by the SensorAcquisition"""
+
+    def __init__(self, logger, update_frequency, device_id, backend="owfs", bulk_conversion=False, base_dir=None):
         self._logger = logger
         self._update_frequency = update_frequency
         self._device_id = device_id
-        
-        self._tempSens_event_object = threading.Event()
-
-        self._running = False
-        self._temperature = None
-        self._device_file = f"/mnt/1wire/{device_id}/temperature"
-        self._timer = RepeatedTimer(
-            self._update_frequency, self._loop, condition=self.is_running, daemon=True
-        )
+        self._backend = backend
+
+        # with a bulk conversion the bus triggers all probes and we only read back the result
+        self.conversion_bus = get_onewire_bus(logger, backend) if bulk_conversion else None
+
+        if base_dir is None:
+            base_dir = SYSFS_BASE_DIR if backend == "sysfs" else OWFS_BASE_DIR
+        if backend == "sysfs":
+            self._device_file = os.path.join(base_dir, device_id, "w1_slave")
+        elif bulk_conversion:
+            self._device_file = os.path.join(base_dir, device_id, "latesttemp")
+        else:
+            self._device_file = os.path.join(base_dir, device_id, "temperature")
 
         self._logger.info(
-            f"Ds18b20 initiated with update_frequency={self._update_frequency}, device_id={self._device_id}"
+            f"Ds18b20 initiated with update_frequency={self._update_frequency}, device_id={self._device_id}, backend={self._backend}, bulk_conversion={bulk_conversion}"
         )
 
-    def is_running(self) -> bool:
-        return self._timer.is_alive()
+    def get_update_frequency(self) -> float:
+        return self._update_frequency
 
     def get_temperature(self):
-        try:
-            self._event_set = self._tempSens_event_object.wait(5)
-            if self._event_set: # and self._temperature is float:
-                return self._temperature
-            else:                    
+        # exactly one read of the device per sample
+        raw = self._read_temp_raw()
+        if not raw:
+            return None
+
+        if self._backend == "sysfs":
+            temperature = parse_w1_slave(raw)
+            if temperature is None:
+                self._logger.debug(f"Ds18b20 {self._device_id}: invalid w1_slave read {raw!r}")
                 return None
-            #temp_transmit = None
-            #self._logger.debug("get_temperature() 1 temp_transmit %s", temp_transmit)
-            #temp_transmit = self._temperature
-            #self._logger.debug("get_temperature() 2 temp_transmit %s", temp_transmit)
-            #self._logger.debug("get_temperature() 3 self._temperature %s", self._temperature)
-
-            #self._temperature = None
-            #self._logger.debug("get_temperature() 4 temp_transmit %s", temp_transmit)
-            #self._logger.debug("get_temperature() 5 self._temperature %s", self._temperature)
-            #return temp_transmit
-        except Exception as e:
-            self._logger.warn("get_temperature() X Ds18b20 sensor get_temp %s", e)
-            return -1
-
-    def start(self) -> None:
-        self._running = True
-        self._timer.start()
-        self._logger.debug("Tempsensor start() Ds18b20 sensor started")
-
-    def stop(self) -> None:
-        self._timer.cancel()
-        self._running = False
-        self._logger.debug("Tempsesnor Stop() Ds18b20 sensor stopped")
+        else:
+            temperature = float(raw)
+
+        if temperature in (POWER_ON_TEMPERATURE, READ_ERROR_TEMPERATURE):
+            self._logger.debug(f"Ds18b20 {self._device_id}: rejected power-on or error value {temperature}")
+            return None
+        return temperature
 
     def _read_temp_raw(self):
-        lines = ""
-        f = open(self._device_file, "r")
-        lines = f.readline()
-        f.close()
-        return lines
-
-    def _loop(self):
-        self._tempSens_event_object.clear()
-        self._temperature = None
-        try:
-            if self._running and self._read_temp_raw() is not None:
-                self._temperature = float(self._read_temp_raw())
-                self._tempSens_event_object.set()
-                #self._logger.debug("Tempsensor Loop 1: Raw temperature: %s", self._temperature)
-            else: 
-                #self._logger.debug("Tempsensor Loop 2: Tempsensor stopped running: %s", self._temperature)
-                self._temperature=None
-        except Exception as e:
-            self._logger.warn("Tempsensor Loop X: Ds18b20 sensor loop Exception %s", e)
-
-            
-
-        
-
-
-def list_ds18b20_devices():
-    base_dir = "/mnt/1wire/"
+        with open(self._device_file, "r") as f:
+            return f.read()
+
+
+def list_ds18b20_devices(backend="owfs"):
+    base_dir = SYSFS_BASE_DIR if backend == "sysfs" else OWFS_BASE_DIR
     folders = glob.glob(base_dir + "28*")
     device_names = list(map(lambda path: basename(path), folders))
 
@@ -0,0 +1,125 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# upper bucket bounds in milliseconds, the last bucket catches everything above
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Histogram:
+    """A fixed bucket latency histogram, constant memory and O(log buckets) per observation"""
+
+    def __init__(self, bounds_ms=BUCKET_BOUNDS_MS):
+        self._bounds_ms = tuple(bounds_ms)
+        self._counts = [0] * (len(self._bounds_ms) + 1)
+        self._count = 0
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+
+    def observe(self, seconds) -> None:
+        value_ms = seconds * 1000.0
+        self._counts[bisect_left(self._bounds_ms, value_ms)] += 1
+        self._count += 1
+        self._sum_ms += value_ms
+        self._max_ms = max(self._max_ms, value_ms)
+
+    def get_count(self) -> int:
+        return self._count
+
+    def to_dict(self):
+        buckets = dict(zip([str(bound) for bound in self._bounds_ms] + ["+Inf"], self._counts))
+        return dict(
+            count=self._count,
+            avg_ms=self._sum_ms / self._count if self._count else 0.0,
+            max_ms=self._max_ms,
+            buckets_ms=buckets,
+        )
+
+
+class LoopTiming:
+    """Per tick timing of the control loop.
+
+    Records how late each tick started compared with its schedule, the time spent in
+    sensor reads, PID computation and actuator writes, the total tick duration and the
+    number of ticks that took longer than the loop period.
+    """
+
+    PHASES = ("lateness", "sensor", "pid", "actuator", "total")
+
+    def __init__(self, logger, log_interval=300.0):
+        self._logger = logger
+        self._log_interval = log_interval
+        self._histograms = {phase: Histogram() for phase in self.PHASES}
+        self._overruns = 0
+        self._last_end = None
+        self._last_log = time.monotonic()
+        self._tick_start = None
+        self._period = None
+        self._phase_seconds = {}
+
+    def set_log_interval(self, log_interval) -> None:
+        self._log_interval = log_interval
+
+    def begin_tick(self, period, scheduled=None) -> None:
+        """Start timing a tick, by default it was due ``period`` seconds after the previous one ended"""
+        now = time.monotonic()
+        if scheduled is None and self._last_end is not None and period:
+            scheduled = self._last_end + period
+        if scheduled is not None:
+            self._histograms["lateness"].observe(max(now - scheduled, 0.0))
+        self._tick_start = now
+        self._period = period
+        self._phase_seconds = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - start)
+
+    def add(self, name, seconds) -> None:
+        self._phase_seconds[name] = self._phase_seconds.get(name, 0.0) + seconds
+
+    def end_tick(self) -> None:
+        if self._tick_start is None:
+            return
+        now = time.monotonic()
+        total = now - self._tick_start
+        for name, seconds in self._phase_seconds.items():
+            histogram = self._histograms.get(name)
+            if histogram is not None:
+                histogram.observe(seconds)
+        self._histograms["total"].observe(total)
+        if self._period and total > self._period:
+            self._overruns += 1
+            self._logger.warn(f"LOOP: tick took {total:.3f}s, longer than the period of {self._period}s")
+        self._last_end = now
+        self._tick_start = None
+
+        if self._log_interval and now - self._last_log >= self._log_interval:
+            self._last_log = now
+            self.log_summary()
+
+    def log_summary(self) -> None:
+        summary = ", ".join(
+            f"{phase}: avg={histogram['avg_ms']:.1f}ms max={histogram['max_ms']:.1f}ms"
+            for phase, histogram in ((phase, self._histograms[phase].to_dict()) for phase in self.PHASES)
+        )
+        self._logger.info(
+            f"LOOP timing over {self._histograms['total'].get_count()} ticks, overruns={self._overruns}: {summary}"
+        )
+
+    def get_histogram(self, phase):
+        return self._histograms[phase]
+
+    def get_overruns(self) -> int:
+        return self._overruns
+
+    def get_stats(self):
+        return dict(
+            overruns=self._overruns,
+            phases={phase: histogram.to_dict() for phase, histogram in self._histograms.items()},
+        )
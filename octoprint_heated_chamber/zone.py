@@ -0,0 +1,342 @@
+# keys of one entry of the ``zones`` setting, a fan or vent without a pin is left out
+ZONE_DEFAULTS = dict(
+    name=None,
+    sensors=[],
+    heaters=[],
+    heaterPWMMode=0,
+    time_proportional=dict(enabled=0, window=10.0, min_on=1.0, min_off=1.0),
+    temperature_threshold=2.5,
+    pid=dict(kp=5, ki=0.02, kd=-0.05, sample_time=10, output_min=0, output_max=100, schedule=[]),
+    pid_cooling=dict(kp=5, ki=0.02, kd=-0.05, sample_time=10, output_min=-100, output_max=0, schedule=[]),
+    heaterfan=dict(
+        pin=None, frequency=25000, idle_power=15, hardware_PWM_enabled=0, backend="pigpio",
+        tach=dict(pin=None, pulses_per_revolution=2, min_rpm=300, window=3.0, backend="pigpio"),
+    ),
+    coolerfan=dict(
+        pin=None, frequency=25000, idle_power=15, hardware_PWM_enabled=0, backend="pigpio",
+        tach=dict(pin=None, pulses_per_revolution=2, min_rpm=300, window=3.0, backend="pigpio"),
+    ),
+    servo=dict(pin=None, close_opening=2500, idle_opening=1500, open_opening=700, backend="pigpio"),
+)
+
+# keys of one entry of a zone's ``sensors``
+ZONE_SENSOR_DEFAULTS = dict(
+    type="ds18b20",
+    device_id=None,
+    frequency=1.0,
+    backend="owfs",
+    bulk_conversion=0,
+    i2c=dict(bus=1, address=None),
+    thermistor=dict(
+        channel=0, supply_voltage=3.3, series_resistance=10000, nominal_resistance=100000, nominal_temperature=25,
+        beta=3950,
+    ),
+    filter=dict(type="none", window=5, alpha=0.3, process_noise=0.01, measurement_noise=0.1, max_rate=2.0),
+)
+
+# keys of one entry of a zone's ``heaters``
+ZONE_HEATER_DEFAULTS = dict(pin=None, relay_mode=0, backend="pigpio")
+
+
+class ChamberZone:
+    """A part of the chamber with its own sensors, heater, fans, vent and controllers.
+
+    All zones are evaluated from the same control tick. The zone temperature is the mean
+    of its sensor roles in the SensorAcquisition. Zones without a heater fan, cooler fan
+    or vent get dummy outputs, so the control logic is the same for every zone.
+
+    Heating and cooling each have their own PID. Only the one of the current mode runs,
+    on a mode switch it takes over from the actuator's current output without a bump.
+    """
+
+    def __init__(self, logger, name, sensor_roles):
+        self._logger = logger
+        self.name = name
+        self.sensor_roles = tuple(sensor_roles)
+
+        self.heater = None
+        self.heaterfan = None
+        self.coolerfan = None
+        self.servo = None
+        self.heaterfan_tach = None
+        self.coolerfan_tach = None
+        self.heating_pid = None
+        self.cooling_pid = None
+        self.plant = None
+        self.protection = None
+
+        self.heater_pwm_mode = False
+        self.temperature_threshold = 2.5
+        self.heaterfan_idle_power = 0
+        self.coolerfan_idle_power = 0
+        self.servo_idle_opening = None
+        self.servo_close_opening = None
+        self.servo_open_opening = None
+
+        self.target_temperature = 0
+        self.current_temperature = None
+        self.ventilation_state = None
+        self.pid_output = None
+        self.feedforward = 0.0
+        self._mode = None
+
+    def get_outputs(self):
+        return [
+            output
+            for output in (self.heaterfan, self.coolerfan, self.heater, self.servo)
+            if output is not None
+        ]
+
+    def get_pid_components(self):
+        """``(p, i, d)`` of the PID of the current mode, None while no PID runs"""
+        if self._mode is None:
+            return None
+        pid = self.heating_pid if self._mode == "heating" else self.cooling_pid
+        return pid.components if pid is not None else None
+
+    def get_rpm(self, role):
+        tach = getattr(self, f"{role}_tach")
+        return tach.get_rpm() if tach is not None else None
+
+    def check_fans(self) -> bool:
+        """Update the stall state of both fans, True when the heater fan stalled"""
+        if self.coolerfan_tach is not None:
+            self.coolerfan_tach.update(self.coolerfan.get_power())
+        if self.heaterfan_tach is not None:
+            return self.heaterfan_tach.update(self.heaterfan.get_power())
+        return False
+
+    def protect(self, role, sample) -> bool:
+        """Feed a sample of one of the zone sensors to the runaway protection.
+
+        Called on the acquisition thread without the control lock, so it still acts while the
+        control tick is stuck. The heater is forced off while a fault is latched, True is
+        returned for the sample that raised it. A tick running meanwhile switches it off again
+        once it is done, see ``_enforce_protection``.
+        """
+        protection = self.protection
+        heater = self.heater
+        if protection is None or heater is None:
+            return False
+        latched = protection.fault is not None
+        fault = protection.update(
+            role, sample.value, sample.raw, sample.timestamp, self.target_temperature, self.get_heater_power()
+        )
+        if fault is None:
+            return False
+        self.heater_off(force=True)
+        return not latched
+
+    def set_target_temperature(self, target_temperature) -> None:
+        self.target_temperature = target_temperature
+        # before bring-up finished the setpoint is applied when the PIDs are set up, the cooling
+        # PID works above ambient and gets its setpoint every tick
+        if target_temperature is not None and self.heating_pid is not None:
+            self.heating_pid.setpoint = target_temperature
+
+    def read_temperature(self, acquisition, sample=None):
+        """Mean of the zone sensors, a fresh ``sample`` replaces the reading of the first one"""
+        values = []
+        for index, role in enumerate(self.sensor_roles):
+            if index == 0 and sample is not None:
+                value = sample.value
+            else:
+                value = acquisition.get_temperature(role)
+            if value is not None:
+                values.append(value)
+        self.current_temperature = sum(values) / len(values) if values else None
+        return self.current_temperature
+
+    def get_heater_power(self):
+        if self.heater_pwm_mode:
+            return self.heater.get_power()
+        return 100 if self.heater.state() else 0
+
+    def _openings(self):
+        return dict(
+            close=self.servo_close_opening,
+            open=self.servo_open_opening,
+            idle=self.servo_idle_opening,
+        )
+
+    def get_vent_opening(self):
+        return self._openings().get(self.ventilation_state)
+
+    def set_ventilation(self, state) -> None:
+        if self.ventilation_state != state:
+            self.servo.set_open(self._openings()[state])
+            self.ventilation_state = state
+
+    def _enforce_protection(self) -> None:
+        # the fault is set before protect() switches the heater off, so checking it after
+        # the tick's own writes catches a fault latched while the tick ran
+        if self.protection is not None and self.protection.fault is not None:
+            self.heater_off(force=True)
+            self.pid_output = None
+
+    def heater_off(self, force=False) -> None:
+        if self.heater is None:
+            return
+        if not self.heater_pwm_mode:  ## Relay controlled Heater
+            self.heater.turn_off(force=force)
+        else:  ## PWM cotntroled Heater
+            self.heater.set_power(0, force=force)
+
+    def tick(self, ambient_temperature, print_in_progress, pid_dt, timing, feedforward=0.0) -> None:
+        """One pass of the heating, cooling and idle logic with the last read temperature.
+
+        ``feedforward`` is added to the heating PID output.
+        """
+        self.feedforward = feedforward
+        target_temperature = self.target_temperature
+        current_temperature = self.current_temperature
+        self.pid_output = None
+
+        if target_temperature is not None:
+            #### HEATERFAN Control Logic ####
+            if target_temperature > 40:
+                new_value = self._control("heating", current_temperature, pid_dt, timing)
+                self.pid_output = new_value
+                self.coolerfan.set_power(0)
+                ## close Iris
+                self.set_ventilation("close")
+                # HeaterFan: Min to Idle, above idle Fanspeed is set by PID result, 0No Heater Fan Off
+                if 0 < new_value < self.heaterfan_idle_power:
+                    self.heaterfan.set_power(self.heaterfan_idle_power)
+                elif new_value > self.heaterfan_idle_power:
+                    self.heaterfan.set_power(new_value)
+                else:
+                    self.heaterfan.set_power(0)
+
+                #### HEATER Control Logic ####
+                if not self.heater_pwm_mode:
+                    if not self.heater.state() and current_temperature < (
+                        target_temperature - self.temperature_threshold
+                    ):
+                        self.heater.turn_on()
+                    elif self.heater.state() and current_temperature >= target_temperature:
+                        self.heater.turn_off()
+                else:
+                    ### PWM Heater Control ###
+                    self.heater.set_power(new_value)
+
+            #### COOLERFAN Control Logic ####
+            elif print_in_progress and target_temperature <= 25:
+                # input and setpoint above ambient, the absolute target would never call for cooling
+                self.cooling_pid.setpoint = target_temperature - ambient_temperature
+                new_value = self._control("cooling", current_temperature - ambient_temperature, pid_dt, timing)
+                self.pid_output = new_value
+                self._logger.debug(f"_loop {self.name} Cooling new_value= {new_value}")
+                # the heater may still be on from heating mode, a time proportional one between pulses
+                if self.heater.state() or self.heater.get_power() > 0:
+                    self.heater_off()
+
+                self.set_ventilation("open")
+
+                # Cooling PID Values are negative (-100 to 0)
+                if new_value < 0:
+                    coolingValue = abs(new_value)
+                    if 0 < coolingValue < self.coolerfan_idle_power:
+                        self.coolerfan.set_power(self.coolerfan_idle_power)
+                    elif coolingValue > self.coolerfan_idle_power:
+                        self.coolerfan.set_power(coolingValue)
+                else:
+                    self.coolerfan.set_power(0)
+
+            else:
+                self._mode = None
+                if self.heaterfan.get_power() > 0:
+                    if current_temperature > 50:  ### Safe Cooling Down Heater element ###
+                        self.heaterfan.set_power(self.heaterfan_idle_power)
+                    else:
+                        self.heaterfan.set_power(0)
+
+                if not self.heater_pwm_mode:  ## Relay controlled Heater
+                    if self.heater.state():
+                        self.heater.turn_off()
+                else:
+                    if self.heater.get_power() > 0:
+                        self.heater.set_power(0)
+
+                if self.coolerfan.get_power() > 0:
+                    self.coolerfan.set_power(0)
+
+                self.set_ventilation("idle")
+
+        #### disable control logic  and shutting down devices
+        else:
+            self._mode = None
+            self.heater_off()
+
+            ## cool down chamber and heater ##
+            if current_temperature > (ambient_temperature + 30.0):  ## let heaterfan running to cool down element before switch off heater fan
+                self.heaterfan.set_power(20)
+                self.set_ventilation("open")
+                self.coolerfan.set_power(20)
+            elif current_temperature <= (ambient_temperature + 10.0):
+                self.heaterfan.set_power(0)
+                self.set_ventilation("idle")
+                self.coolerfan.set_power(0)
+            else:
+                self.heaterfan.set_power(0)
+
+        self._enforce_protection()
+
+        if (
+            self.heater.state()
+            or self.ventilation_state != "idle"
+            or self.coolerfan.get_power() > 0
+            or self.heaterfan.get_power() > 0
+        ):
+            self._logger.info(
+                f"LOOP {self.name}: Heater State:{self.heater.state()}, HeaterFan Power={self.heaterfan.get_power()}, ServoVentialtion State={self.ventilation_state}, Cooling Fan Power={self.coolerfan.get_power()}"
+            )
+
+    def _control(self, mode, value, pid_dt, timing):
+        pid = self.heating_pid if mode == "heating" else self.cooling_pid
+        feedforward = self.feedforward if mode == "heating" else 0.0
+        with timing.phase("pid"):
+            pid.offset_limits(feedforward)
+            if self._mode != mode:
+                # continue from what the actuators do right now instead of the other PID's state
+                if mode == "heating":
+                    last_output = self.heater.get_power() if self.heater_pwm_mode else self.heaterfan.get_power()
+                else:
+                    last_output = -self.coolerfan.get_power()
+                pid.transfer(value, last_output - feedforward)
+                self._mode = mode
+            return pid(value, dt=pid_dt) + feedforward
+
+    def apply_relay(self, output) -> None:
+        """Drive the zone from a relay experiment instead of the PID, see RelayAutotune"""
+        self._mode = None
+        self.pid_output = output
+        self.coolerfan.set_power(0)
+        self.set_ventilation("close")
+        self.heaterfan.set_power(max(output, self.heaterfan_idle_power))
+        if self.heater_pwm_mode:
+            self.heater.set_power(output)
+        elif output > 0:
+            self.heater.turn_on()
+        else:
+            self.heater.turn_off()
+        self._enforce_protection()
+
+    def destroy(self) -> None:
+        """Switch everything off and release the devices"""
+        for fan in (self.heaterfan, self.coolerfan):
+            if fan is not None:
+                fan.set_power(0, force=True)
+                fan.destroy()
+        if self.heater is not None:
+            self.heater_off(force=True)
+            self.heater.destroy()
+        if self.servo is not None:
+            self.servo.idle()
+            self.servo.destroy()
+        for tach in (self.heaterfan_tach, self.coolerfan_tach):
+            if tach is not None:
+                tach.destroy()
+        self.heaterfan_tach = self.coolerfan_tach = None
+        self.heaterfan = self.coolerfan = self.heater = self.servo = None
+        self.heating_pid = self.cooling_pid = None
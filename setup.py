@@ -34,9 +34,7 @@ plugin_license = "AGPLv3"
 
 # Any additional requirements besides OctoPrint should be listed here
 plugin_requires = [
-    "pigpio>=1.78",
     "simple-pid>=2.0.0",
-    "RPi.GPIO>=0.6.5"
 ]
 
 ### --------------------------------------------------------------------------------------------------------------------
@@ -65,7 +63,11 @@ plugin_ignored_packages = []
 #     additional_setup_parameters = {"dependency_links": ["https://github.com/someUser/someRepo/archive/master.zip#egg=someDependency-dev"]}
 # "python_requires": ">=3,<4" blocks installation on Python 2 systems, to prevent confused users and provide a helpful error.
 # Remove it if you would like to support Python 2 as well as 3 (not recommended).
-additional_setup_parameters = {"python_requires": ">=3,<4"}
+additional_setup_parameters = {
+    "python_requires": ">=3,<4",
+    # optional sensor and GPIO backends, the plugin imports them on first use
+    "extras_require": {"pigpio": ["pigpio>=1.78"], "i2c": ["smbus2>=0.4"], "gpiod": ["gpiod>=2.0"]},
+}
 
 ########################################################################################################################
 
@@ -0,0 +1,57 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from octoprint_heated_chamber.acquisition import SensorAcquisition
+from octoprint_heated_chamber.temperature import TemperatureSensor
+
+
+class HungSensor(TemperatureSensor):
+    def __init__(self):
+        self.release = threading.Event()
+        self.reads = 0
+
+    def get_temperature(self):
+        self.reads += 1
+        self.release.wait(5)
+        return 30.0
+
+
+class Sensor(TemperatureSensor):
+    def get_temperature(self):
+        return 25.0
+
+
+def make_acquisition():
+    acquisition = SensorAcquisition(logging.getLogger(__name__), read_timeout=0.05)
+    acquisition._executor = ThreadPoolExecutor(max_workers=2)
+    return acquisition
+
+
+def test_hung_read_is_not_queued_again():
+    acquisition = make_acquisition()
+    hung = HungSensor()
+    acquisition.add_sensor("chamber", hung, 0.1)
+    acquisition.add_sensor("ambient", Sensor(), 0.1)
+    for _ in range(3):
+        acquisition._next_due = dict.fromkeys(acquisition._next_due, 0.0)
+        acquisition._tick()
+        assert acquisition.get_sample("ambient").value == 25.0
+    assert hung.reads == 1
+    assert acquisition.get_errors()["chamber"] == 1
+
+    hung.release.set()
+    acquisition._executor.shutdown(wait=True)
+    assert not acquisition._in_flight
+
+
+def test_failed_read_counts_as_error():
+    class Broken(TemperatureSensor):
+        def get_temperature(self):
+            raise OSError("gone")
+
+    acquisition = make_acquisition()
+    acquisition.add_sensor("chamber", Broken(), 0.1)
+    acquisition._tick()
+    assert acquisition.get_sample("chamber") is None
+    assert acquisition.get_errors()["chamber"] == 1
@@ -0,0 +1,74 @@
+import logging
+
+import pytest
+from octoprint.util import dict_merge
+
+from octoprint_heated_chamber import HeatedChamberPlugin
+from octoprint_heated_chamber.config import ChamberConfig
+
+from test_settings import Settings
+
+
+def settings(**overrides):
+    return dict_merge(HeatedChamberPlugin().get_settings_defaults(), overrides)
+
+
+def test_defaults_are_valid():
+    config = ChamberConfig.from_settings(settings())
+    assert config.temperature_sensor.type == "ds18b20"
+    assert config.zones == ()
+
+
+def test_config_is_immutable():
+    config = ChamberConfig.from_settings(settings())
+    with pytest.raises(AttributeError):
+        config.frequency = 1
+
+
+def test_values_the_older_settings_accepted():
+    config = ChamberConfig.from_settings(
+        settings(heater=dict(relay=dict(heaterPWMMode=True)), ServoVentilation=dict(output=dict(idle_opening=1500.5)))
+    )
+    assert config.heater_pwm_mode is True
+    assert config.servo.idle_opening == 1500.5
+
+
+@pytest.mark.parametrize(
+    "overrides, message",
+    [
+        (dict(pid=dict(output_min=100, output_max=0)), "pid.output_min must be below output_max"),
+        (dict(heater=dict(relay=dict(pin=None))), "heater.relay.pin: expected a number, got None"),
+        (dict(frequency=0), "frequency: 0.0 is below or at the minimum of 0"),
+        (dict(temperature_sensor=dict(type="lm75")), "temperature_sensor.type:"),
+        (dict(temperature_sensor=dict(ds18b20=dict(device_id=""))), "temperature_sensor.device_id: missing"),
+        (dict(zones=[dict(name="chamber", sensors=[dict(device_id="28-1")], heaters=[dict(pin=5)])]), "chamber"),
+        (dict(zones=[dict(sensors=[dict()], heaters=[dict(pin=5)])]), "zones[0].sensors[0].device_id: missing"),
+    ],
+)
+def test_invalid_settings_are_rejected(overrides, message):
+    with pytest.raises(ValueError) as error:
+        ChamberConfig.from_settings(settings(**overrides))
+    assert message in str(error.value)
+
+
+def test_invalid_zones_can_be_skipped():
+    skipped = []
+    config = ChamberConfig.from_settings(
+        settings(
+            zones=[
+                dict(sensors=[dict()], heaters=[dict(pin=5)]),
+                dict(name="left", sensors=[dict(device_id="28-1")], heaters=[dict(pin=6)]),
+            ]
+        ),
+        skipped,
+    )
+    assert [(zone.index, zone.name) for zone in config.zones] == [(1, "left")]
+    assert len(skipped) == 1
+
+
+def test_invalid_settings_at_startup_are_not_replaced_by_the_defaults():
+    plugin = HeatedChamberPlugin()
+    plugin._logger = logging.getLogger(__name__)
+    plugin._settings = Settings(dict(heater=dict(relay=dict(pin="five"))))
+    with pytest.raises(ValueError):
+        plugin._load_config()
@@ -0,0 +1,15 @@
+import logging
+
+from octoprint_heated_chamber.discovery import OneWireDiscovery
+
+
+def test_ids_with_and_without_crc_are_listed(tmp_path):
+    for name in ("28-0000057065d7", "28-AA8DB8471401E5", "28.AA8DB8471402.E6", "bus.0", "28-bad"):
+        (tmp_path / name).mkdir()
+    discovery = OneWireDiscovery(logging.getLogger(__name__), backend="owfs", base_dir=str(tmp_path))
+    discovery.refresh()
+    assert [device["id"] for device in discovery.get_devices(family="28")] == [
+        "28-0000057065d7",
+        "28-AA8DB8471401E5",
+        "28.AA8DB8471402.E6",
+    ]
@@ -0,0 +1,43 @@
+import logging
+
+from octoprint_heated_chamber.heater import TimeProportionalHeater
+
+
+class Relay:
+    def __init__(self):
+        self.on = False
+
+    def turn_on(self):
+        self.on = True
+
+    def turn_off(self):
+        self.on = False
+
+    def state(self):
+        return self.on
+
+    def destroy(self):
+        pass
+
+
+def test_service_error_switches_the_relay_off():
+    relay = Relay()
+    heater = TimeProportionalHeater(logging.getLogger(__name__), relay, interval=60, clock=lambda: 0.0)
+    try:
+        heater.set_power(100)
+        heater._service()
+        assert relay.on
+        relay.state = lambda: 1 / 0
+        heater._service()
+        assert not relay.on
+    finally:
+        heater.destroy()
+
+
+def test_no_service_after_destroy():
+    relay = Relay()
+    heater = TimeProportionalHeater(logging.getLogger(__name__), relay, interval=60, clock=lambda: 0.0)
+    heater.set_power(100)
+    heater.destroy()
+    heater._service()
+    assert not relay.on
@@ -0,0 +1,73 @@
+import logging
+import struct
+
+import pytest
+
+from octoprint_heated_chamber.i2c import Ads1115Thermistor, Bme280, _sht_crc, get_i2c_bus
+
+
+class Adapter:
+    """Registers of a BME280 at 0x76 and an ADS1115 at 0x48 with 3.0 V on its inputs"""
+
+    def __init__(self):
+        self.connected = True
+        self.ads_config = 0
+
+    def read_byte_data(self, address, register):
+        self._check()
+        return 0x60
+
+    def write_byte_data(self, address, register, value):
+        self._check()
+
+    def read_i2c_block_data(self, address, register, length):
+        self._check()
+        if address == 0x76:
+            if register == 0x88:
+                return list(struct.pack("<Hhh", 27504, 26435, -1000))
+            adc = 519888
+            return [adc >> 12, (adc >> 4) & 0xFF, (adc & 0x0F) << 4]
+        if register == 0x01:
+            return [0x80, 0]
+        return list(struct.pack(">h", int(3.0 / 4.096 * 32768)))
+
+    def write_i2c_block_data(self, address, register, data):
+        self._check()
+        self.ads_config = (data[0] << 8) | data[1]
+
+    def _check(self):
+        if not self.connected:
+            raise OSError(121, "Remote I/O error")
+
+
+@pytest.fixture
+def adapter():
+    bus = get_i2c_bus(logging.getLogger(__name__), 99)
+    bus._smbus = adapter = Adapter()
+    yield adapter
+    bus._smbus = None
+
+
+def test_bme280_compensation(adapter):
+    # the example of the datasheet
+    sensor = Bme280(logging.getLogger(__name__), 0.5, 99)
+    assert sensor.get_temperature() == pytest.approx(25.08, abs=0.01)
+
+
+def test_sht3x_crc():
+    assert _sht_crc(b"\xbe\xef") == 0x92
+
+
+def test_thermistor_at_nominal_resistance(adapter):
+    # 100k against 10k from 3.3 V gives 3.0 V
+    sensors = [Ads1115Thermistor(logging.getLogger(__name__), 0.5, 99, channel=channel) for channel in (0, 1)]
+    assert Ads1115Thermistor.read_many(sensors) == [pytest.approx(25.0, abs=0.1)] * 2
+
+
+def test_missing_chip_is_a_read_error_until_it_answers(adapter):
+    adapter.connected = False
+    sensor = Bme280(logging.getLogger(__name__), 0.5, 99)
+    with pytest.raises(OSError):
+        sensor.get_temperature()
+    adapter.connected = True
+    assert sensor.get_temperature() == pytest.approx(25.08, abs=0.01)
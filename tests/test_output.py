@@ -0,0 +1,104 @@
+import logging
+
+from octoprint_heated_chamber.output import CoalescingOutput
+
+
+class FlakyRelay:
+    """Logs and swallows write errors like RelayHeater"""
+
+    def __init__(self):
+        self.on = False
+        self.fail = False
+        self.writes = 0
+
+    def turn_on(self):
+        self.writes += 1
+        if not self.fail:
+            self.on = True
+
+    def turn_off(self):
+        self.writes += 1
+        if not self.fail:
+            self.on = False
+
+    def state(self):
+        return self.on
+
+
+class Fan:
+    def __init__(self):
+        self.power = None
+        self.writes = 0
+
+    def get_resolution(self):
+        return 0.5
+
+    def set_power(self, power):
+        self.writes += 1
+        self.power = power
+
+    def get_power(self):
+        return self.power
+
+
+def test_redundant_writes_are_dropped():
+    fan = Fan()
+    output = CoalescingOutput(logging.getLogger(__name__), fan)
+    output.set_power(40.1)
+    output.set_power(39.9)
+    assert fan.writes == 1
+    assert fan.power == 40.0
+    output.set_power(41)
+    assert fan.writes == 2
+
+
+def test_turn_off_is_only_dropped_while_the_relay_is_off():
+    relay = FlakyRelay()
+    output = CoalescingOutput(logging.getLogger(__name__), relay)
+    output.turn_on()
+    relay.fail = True
+    output.turn_off()
+    assert relay.state()
+    relay.fail = False
+    output.turn_off()
+    assert not relay.state()
+    output.turn_off()
+    assert relay.writes == 3
+    # switched on behind our back
+    relay.on = True
+    output.turn_off()
+    assert not relay.state()
+    output.turn_off(force=True)
+    assert relay.writes == 5
+
+
+class Servo:
+    def __init__(self):
+        self.writes = 0
+        self.reads = 0
+
+    def set_open(self, opening):
+        self.writes += 1
+
+    def get_open(self):
+        self.reads += 1
+
+
+def test_servo_opening_is_not_read_back():
+    servo = Servo()
+    output = CoalescingOutput(logging.getLogger(__name__), servo)
+    output.set_open(1500)
+    output.set_open(1500)
+    assert (servo.writes, servo.reads) == (1, 0)
+
+
+def test_failed_turn_on_is_retried():
+    relay = FlakyRelay()
+    relay.fail = True
+    output = CoalescingOutput(logging.getLogger(__name__), relay)
+    output.turn_on()
+    relay.fail = False
+    output.turn_on()
+    assert relay.state()
+    output.turn_on()
+    assert relay.writes == 2
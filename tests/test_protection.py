@@ -0,0 +1,49 @@
+import logging
+
+from octoprint_heated_chamber.acquisition import Sample
+from octoprint_heated_chamber.protection import ThermalProtection
+from octoprint_heated_chamber.timing import LoopTiming
+
+from test_zone import make_zone
+
+
+def test_fault_stays_latched_until_cleared():
+    protection = ThermalProtection(max_temperature=90)
+    assert protection.update("chamber", 95, 95, 0, 60, 100) is not None
+    # a good reading doesn't clear it
+    assert protection.update("chamber", 50, 50, 1, 60, 100) is not None
+    protection.clear()
+    assert protection.fault is None
+    assert protection.update("chamber", 50, 50, 2, 60, 100) is None
+
+
+def test_frozen_reading_latches_the_heater_off():
+    zone = make_zone()
+    zone.protection = ThermalProtection(frozen_period=60, frozen_power=50)
+    zone.set_target_temperature(60)
+    zone.heater.turn_on()
+    assert not zone.protect("chamber", Sample(55, 0, 55))
+    assert zone.protect("chamber", Sample(55, 60, 55))
+    assert not zone.heater.state()
+    # already latched, reported once
+    assert not zone.protect("chamber", Sample(55, 61, 55))
+
+
+def test_tick_keeps_a_latched_heater_off():
+    zone = make_zone()
+    zone.protection = ThermalProtection(max_temperature=90)
+    zone.set_target_temperature(60)
+    zone.current_temperature = 30
+    turn_on = zone.heater.turn_on
+
+    def latch_while_ticking(force=False):
+        # the acquisition thread latches a fault right before the tick's heater write
+        zone.protect("chamber", Sample(95, 0, 95))
+        turn_on(force)
+
+    zone.heater.turn_on = latch_while_ticking
+    zone.heater.turn_off()
+    zone.tick(22, True, 1.0, LoopTiming(logging.getLogger(__name__)))
+    assert zone.protection.fault is not None
+    assert not zone.heater.state()
+    assert zone.pid_output is None
@@ -0,0 +1,34 @@
+import logging
+
+import pytest
+
+from octoprint_heated_chamber.filters import create_filter
+from octoprint_heated_chamber.temperature import Ds18b20, parse_w1_slave
+
+
+def ds18b20(tmp_path, content):
+    (tmp_path / "28-0000057065d7").mkdir()
+    (tmp_path / "28-0000057065d7" / "temperature").write_text(content)
+    return Ds18b20(logging.getLogger(__name__), 1.0, "28-0000057065d7", base_dir=str(tmp_path))
+
+
+@pytest.mark.parametrize("content, expected", [("23.5", 23.5), ("85", None), ("-1", None)])
+def test_ds18b20_rejects_power_on_and_error_values(tmp_path, content, expected):
+    assert ds18b20(tmp_path, content).get_temperature() == expected
+
+
+def test_filters_accept_85_from_other_sensors():
+    assert create_filter("none").update(85.0, 0.0) == 85.0
+
+
+def test_filter_rejects_spikes_until_they_persist():
+    signal_filter = create_filter("none", max_rate=2.0)
+    assert signal_filter.update(40.0, 0.0) == 40.0
+    assert [signal_filter.update(60.0, t) for t in (1.0, 2.0, 3.0, 4.0)] == [None, None, None, 60.0]
+
+
+def test_w1_slave_crc():
+    valid = "72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n72 01 4b 46 7f ff 0e 10 57 t=23125\n"
+    assert parse_w1_slave(valid) == 23.125
+    assert parse_w1_slave(valid.replace("0e 10 57 :", "0e 11 57 :")) is None
+    assert parse_w1_slave("00 00 00 00 00 00 00 00 00 : crc=00 YES\n00 00 00 00 00 00 00 00 00 t=0\n") is None
@@ -0,0 +1,38 @@
+import logging
+
+from octoprint_heated_chamber import HeatedChamberPlugin
+
+
+class Settings:
+    def __init__(self, stored):
+        self.stored = stored
+
+    def get_all_data(self, merged=True):
+        return self.stored
+
+    def set(self, path, value):
+        section = self.stored
+        for key in path[:-1]:
+            section = section.setdefault(key, {})
+        section[path[-1]] = value
+
+
+def migrate(stored, current):
+    plugin = HeatedChamberPlugin()
+    plugin._logger = logging.getLogger(__name__)
+    plugin._settings = Settings(stored)
+    plugin.on_settings_migrate(plugin.get_settings_version(), current)
+    return stored
+
+
+def test_swapped_gains_are_kept():
+    assert migrate(dict(pid=dict(kp=4, ki=0.1, kd=2.0)), 1)["pid"] == dict(kp=4, ki=2.0, kd=0.1)
+
+
+def test_missing_gain_takes_the_default():
+    assert migrate(dict(pid=dict(ki=0.1)), None)["pid"] == dict(ki=-0.05, kd=0.1)
+
+
+def test_fresh_and_migrated_settings_are_left_alone():
+    assert migrate({}, None) == {}
+    assert migrate(dict(pid=dict(ki=0.1, kd=2.0)), 2)["pid"] == dict(ki=0.1, kd=2.0)
@@ -0,0 +1,74 @@
+import logging
+
+from octoprint_heated_chamber.controller import ScheduledPID
+from octoprint_heated_chamber.timing import LoopTiming
+from octoprint_heated_chamber.zone import ChamberZone
+
+
+class Output:
+    def __init__(self):
+        self.power = 0
+        self.on = False
+        self.opening = None
+
+    def set_power(self, power, force=False):
+        self.power = power
+
+    def get_power(self):
+        return self.power
+
+    def turn_on(self, force=False):
+        self.on = True
+
+    def turn_off(self, force=False):
+        self.on = False
+
+    def state(self):
+        return self.on
+
+    def set_open(self, opening, force=False):
+        self.opening = opening
+
+
+def make_zone():
+    zone = ChamberZone(logging.getLogger(__name__), "chamber", ["chamber"])
+    zone.heater, zone.heaterfan, zone.coolerfan, zone.servo = Output(), Output(), Output(), Output()
+    zone.heating_pid = ScheduledPID(5, 0.02, -0.05, sample_time=None)
+    zone.heating_pid.configure((5, 0.02, -0.05), (0, 100))
+    zone.cooling_pid = ScheduledPID(5, 0.02, -0.05, sample_time=None)
+    zone.cooling_pid.configure((5, 0.02, -0.05), (-100, 0))
+    return zone
+
+
+def test_cooling_pid_works_above_ambient():
+    zone = make_zone()
+    zone.set_target_temperature(25)
+    zone.current_temperature = 45
+    zone.tick(22, True, 1.0, LoopTiming(logging.getLogger(__name__)))
+    assert zone.cooling_pid.setpoint == 3
+    assert zone.pid_output < 0
+    assert zone.coolerfan.get_power() > 0
+    assert zone.ventilation_state == "open"
+
+
+def test_heating_pid_keeps_the_absolute_target():
+    zone = make_zone()
+    zone.set_target_temperature(60)
+    zone.current_temperature = 30
+    zone.tick(22, True, 1.0, LoopTiming(logging.getLogger(__name__)))
+    assert zone.heating_pid.setpoint == 60
+    assert zone.pid_output > 0
+    assert zone.heater.state()
+
+
+def test_feedback_cancels_the_feedforward_above_the_target():
+    zone = make_zone()
+    zone.heater_pwm_mode = True
+    zone.set_target_temperature(60)
+    zone.current_temperature = 75
+    zone.tick(22, True, 1.0, LoopTiming(logging.getLogger(__name__)), feedforward=50.0)
+    assert zone.heater.get_power() == 0
+    assert zone.heating_pid.limits == (0, 100)
+    zone.current_temperature = 40
+    zone.tick(22, True, 1.0, LoopTiming(logging.getLogger(__name__)), feedforward=50.0)
+    assert zone.heater.get_power() == 100